@@ -12,6 +12,7 @@ https://docs.djangoproject.com/en/4.2/ref/settings/
 
 from pathlib import Path
 from dotenv import load_dotenv
+from django.core.exceptions import ImproperlyConfigured
 import os
 
 load_dotenv()
@@ -170,11 +171,82 @@ else:
     ).split(',')
 
 CORS_ALLOW_CREDENTIALS = True
+# paginated endpoints report their total in a header
+CORS_EXPOSE_HEADERS = ['X-Total-Count']
 
 # Media files for uploaded CSVs
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Hash uploads while they stream in (used for de-duplication)
+FILE_UPLOAD_HANDLERS = [
+    'equipment_api.upload_handlers.ContentHashUploadHandler',
+    'django.core.files.uploadhandler.MemoryFileUploadHandler',
+    'django.core.files.uploadhandler.TemporaryFileUploadHandler',
+]
+
+# Non-numeric measurement cells: reject the file, drop the rows or impute
+CSV_BAD_VALUE_POLICY = os.getenv('CSV_BAD_VALUE_POLICY', 'reject')
+
+# CSV parser: auto (pyarrow when installed, else pandas C), pyarrow, c or inferred
+CSV_ENGINE = os.getenv('CSV_ENGINE', 'auto')
+
+# Background ingestion: in-process worker threads (0 = external worker only)
+INGESTION_WORKERS = int(os.getenv('INGESTION_WORKERS', '2'))
+
+# Running jobs without a progress report for this many seconds are requeued
+INGESTION_JOB_TIMEOUT = int(os.getenv('INGESTION_JOB_TIMEOUT', '900'))
+
+# Columnar (Parquet) copy of record columns for analytics, needs pyarrow
+COLUMNAR_STORE_ENABLED = os.getenv('COLUMNAR_STORE', 'True') == 'True'
+COLUMNAR_STORE_ROOT = MEDIA_ROOT / 'columnar'
+
+# Derived analytics (health, charts, validation, predictions, alerts) are
+# cached under keys that include the dataset and threshold versions, so
+# nothing is invalidated explicitly; stale entries age out least recently
+# used first. locmem is per process, file is shared by workers on a host.
+ANALYTICS_CACHE_BACKEND = os.getenv('ANALYTICS_CACHE_BACKEND', 'locmem')
+ANALYTICS_CACHE_BACKENDS = {
+    'locmem': 'django.core.cache.backends.locmem.LocMemCache',
+    'file': 'equipment_api.cache_backends.LRUFileBasedCache',
+}
+if ANALYTICS_CACHE_BACKEND not in ANALYTICS_CACHE_BACKENDS:
+    raise ImproperlyConfigured(
+        f"ANALYTICS_CACHE_BACKEND must be one of: {', '.join(ANALYTICS_CACHE_BACKENDS)}, "
+        f"got {ANALYTICS_CACHE_BACKEND!r}"
+    )
+ANALYTICS_CACHE_MAX_ITEM_BYTES = int(os.getenv('ANALYTICS_CACHE_MAX_ITEM_BYTES', str(8 * 1024 * 1024)))
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'analytics': {
+        'BACKEND': ANALYTICS_CACHE_BACKENDS[ANALYTICS_CACHE_BACKEND],
+        'LOCATION': os.getenv('ANALYTICS_CACHE_LOCATION') or (
+            str(BASE_DIR / 'analytics_cache') if ANALYTICS_CACHE_BACKEND == 'file' else 'analytics'
+        ),
+        'TIMEOUT': int(os.getenv('ANALYTICS_CACHE_TIMEOUT', '86400')),
+        'OPTIONS': {
+            'MAX_ENTRIES': int(os.getenv('ANALYTICS_CACHE_MAX_ENTRIES', '256')),
+            'CULL_FREQUENCY': 4,
+        },
+    },
+}
+
+# Retention: datasets kept per user / per (user, plant), 0 = unlimited;
+# overridden by RetentionPolicy rows. Purged every RETENTION_INTERVAL seconds
+# by the one server or worker process per host holding RETENTION_LOCK_FILE
+# (0 = only via cron: manage.py purge_datasets)
+RETENTION_KEEP_PER_USER = int(os.getenv('RETENTION_KEEP_PER_USER', '20'))
+RETENTION_KEEP_PER_PLANT = int(os.getenv('RETENTION_KEEP_PER_PLANT', '0'))
+RETENTION_INTERVAL = int(os.getenv('RETENTION_INTERVAL', '300'))
+RETENTION_LOCK_FILE = os.getenv('RETENTION_LOCK_FILE', str(BASE_DIR / 'retention.lock'))
+RETENTION_BATCH_DATASETS = 20
+RETENTION_BATCH_ROWS = 50000
+
+# Batch upload: parser processes, one file per core by default
+BATCH_UPLOAD_WORKERS = int(os.getenv('BATCH_UPLOAD_WORKERS', '0')) or os.cpu_count()
+
 import os
 
 # Email Configuration
@@ -1,15 +1,29 @@
 from django.contrib import admin
-from .models import EquipmentDataset, EquipmentRecord
+from .models import EquipmentDataset, EquipmentRecord, IngestionSpan, RetentionPolicy
+from .services.profiling import IngestionProfiler
+
+
+class IngestionSpanInline(admin.TabularInline):
+    """Per-phase ingestion timings of a dataset"""
+    model = IngestionSpan
+    fields = ['phase', 'wall_ms', 'calls', 'rows', 'bytes', 'memory_delta_mb', 'job', 'created_at']
+    readonly_fields = fields
+    extra = 0
+    can_delete = False
+    
+    def has_add_permission(self, request, obj=None):
+        return False
 
 
 @admin.register(EquipmentDataset)
 class EquipmentDatasetAdmin(admin.ModelAdmin):
     """Admin interface for equipment datasets"""
     list_display = ['filename', 'user', 'uploaded_at', 'total_equipment', 'avg_temperature']
-    list_filter = ['uploaded_at', 'user']
+    list_filter = ['uploaded_at', 'user', 'marked_for_purge']
     search_fields = ['filename', 'user__username']
     readonly_fields = ['uploaded_at', 'total_equipment', 'avg_flowrate', 'avg_pressure', 'avg_temperature']
     date_hierarchy = 'uploaded_at'
+    inlines = [IngestionSpanInline]
     
     def get_queryset(self, request):
         qs = super().get_queryset(request)
@@ -26,3 +40,34 @@ class EquipmentRecordAdmin(admin.ModelAdmin):
     def get_queryset(self, request):
         qs = super().get_queryset(request)
         return qs.select_related('dataset', 'dataset__user')
+
+
+@admin.register(RetentionPolicy)
+class RetentionPolicyAdmin(admin.ModelAdmin):
+    """Admin interface for per-user / per-plant retention"""
+    list_display = ['user', 'plant', 'keep_latest']
+    list_filter = ['plant']
+    search_fields = ['user__username', 'plant']
+
+
+@admin.register(IngestionSpan)
+class IngestionSpanAdmin(admin.ModelAdmin):
+    """Ingestion phase timings, with a per-phase latency histogram"""
+    list_display = ['phase', 'wall_ms', 'calls', 'rows', 'bytes', 'memory_delta_mb', 'dataset', 'job', 'created_at']
+    list_filter = ['phase', 'created_at']
+    search_fields = ['dataset__filename', 'job__filename']
+    date_hierarchy = 'created_at'
+    
+    def get_queryset(self, request):
+        qs = super().get_queryset(request)
+        return qs.select_related('dataset', 'job')
+    
+    def changelist_view(self, request, extra_context=None):
+        response = super().changelist_view(request, extra_context=extra_context)
+        try:
+            # histogram over the filtered spans shown in the list
+            spans = response.context_data['cl'].queryset
+        except (AttributeError, KeyError):
+            return response
+        response.context_data['histogram'] = IngestionProfiler.histogram(spans)
+        return response
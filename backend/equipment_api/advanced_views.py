@@ -1,17 +1,30 @@
 """Advanced feature API views"""
+import math
+import time
 from rest_framework import status
-from rest_framework.decorators import api_view
+from rest_framework.decorators import api_view, permission_classes
 from rest_framework.response import Response
+from rest_framework.permissions import IsAdminUser
+from django.conf import settings
 from django.shortcuts import get_object_or_404
+from django.db.models import Q
 from .models import (
-    EquipmentDataset, EquipmentThreshold, DataComparison,
-    SharedDataset, ScheduledReport, DataValidationReport
+    EquipmentDataset, EquipmentThreshold, AlertRule, DataComparison,
+    SharedDataset, ScheduledReport, DataValidationReport, IngestionSpan
 )
 from .services.alert_service import AlertService
+from .services.analytics_cache import AnalyticsCache
 from .services.comparison_service import ComparisonService
 from .services.validation_service import ValidationService
 from .services.prediction_service import PredictionService
+from .services.forecast_service import ForecastService
 from .services.email_service import EmailService
+from .services.batch_ingestion import BatchIngestionPipeline
+from .services.retention_service import RetentionService
+from .services.profiling import IngestionProfiler
+from .services.csv_processor import CSVProcessor
+from .services.rules import RuleSyntaxError, parse_rule
+from .upload_handlers import get_content_digests
 
 
 @api_view(['POST'])
@@ -23,6 +36,14 @@ def set_thresholds(request):
     warning_threshold = request.data.get('warning_threshold')
     critical_threshold = request.data.get('critical_threshold')
     
+    if parameter not in dict(EquipmentThreshold._meta.get_field('parameter').choices):
+        return Response({'error': f'Unknown parameter: {parameter}'}, status=status.HTTP_400_BAD_REQUEST)
+    
+    # limits before the change, so only records they could flip are re-checked
+    previous = EquipmentThreshold.objects.filter(user=request.user, parameter=parameter).values(
+        'min_value', 'max_value', 'warning_threshold', 'critical_threshold'
+    ).first()
+    
     threshold, created = EquipmentThreshold.objects.update_or_create(
         user=request.user,
         parameter=parameter,
@@ -33,6 +54,7 @@ def set_thresholds(request):
             'critical_threshold': critical_threshold
         }
     )
+    reevaluated = AlertService.reevaluate(request.user, parameter, previous)
     
     return Response({
         'id': threshold.id,
@@ -41,7 +63,8 @@ def set_thresholds(request):
         'max_value': threshold.max_value,
         'warning_threshold': threshold.warning_threshold,
         'critical_threshold': threshold.critical_threshold,
-        'created': created
+        'created': created,
+        'records_reclassified': reevaluated
     })
 
 
@@ -61,19 +84,71 @@ def get_thresholds(request):
     return Response(data)
 
 
+def _rule_data(rule):
+    compiled = parse_rule(rule.expression)
+    return {
+        'id': rule.id,
+        'expression': rule.expression,
+        'level': compiled.level,
+        'message': compiled.message,
+        'columns': list(compiled.identifiers),
+        'enabled': rule.enabled
+    }
+
+
+@api_view(['GET', 'POST'])
+def alert_rules(request):
+    """List or add alert/root cause rule expressions (syntax in services/rules.py)"""
+    if request.method == 'GET':
+        return Response([_rule_data(rule) for rule in AlertRule.objects.filter(user=request.user)])
+    
+    expression = (request.data.get('expression') or '').strip()
+    try:
+        compiled = parse_rule(expression)
+    except RuleSyntaxError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    
+    unknown = sorted(set(compiled.identifiers) - AlertService.known_columns(request.user))
+    if unknown:
+        return Response(
+            {'error': f"Unknown column: {', '.join(unknown)}"},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    
+    rule = AlertRule.objects.create(
+        user=request.user,
+        expression=expression,
+        enabled=bool(request.data.get('enabled', True))
+    )
+    data = _rule_data(rule)
+    # a rule can read any column, so every dataset is re-checked (vectorized)
+    data['records_reclassified'] = AlertService.recheck_user(request.user)
+    return Response(data, status=status.HTTP_201_CREATED)
+
+
+@api_view(['DELETE'])
+def delete_alert_rule(request, rule_id):
+    """Remove a rule expression"""
+    rule = get_object_or_404(AlertRule, id=rule_id, user=request.user)
+    rule.delete()
+    return Response({'records_reclassified': AlertService.recheck_user(request.user)})
+
+
 @api_view(['GET'])
 def get_alerts(request, dataset_id):
     """Get alerts for a specific dataset"""
-    dataset = get_object_or_404(EquipmentDataset, id=dataset_id, user=request.user)
+    dataset = get_object_or_404(EquipmentDataset, id=dataset_id, user=request.user, is_ready=True)
     
-    # Check alerts
-    alerts = AlertService.check_alerts(dataset, request.user)
-    summary = AlertService.get_alert_summary(dataset)
+    def compute():
+        # Check alerts
+        alerts = AlertService.check_alerts(dataset, request.user)
+        summary = AlertService.get_alert_summary(dataset)
+        return {
+            'alerts': alerts,
+            'summary': summary
+        }
     
-    return Response({
-        'alerts': alerts,
-        'summary': summary
-    })
+    return Response(AnalyticsCache.get_or_compute('alerts', dataset, compute, user=request.user))
 
 
 @api_view(['POST'])
@@ -82,8 +157,8 @@ def compare_datasets(request):
     dataset1_id = request.data.get('dataset1_id')
     dataset2_id = request.data.get('dataset2_id')
     
-    dataset1 = get_object_or_404(EquipmentDataset, id=dataset1_id, user=request.user)
-    dataset2 = get_object_or_404(EquipmentDataset, id=dataset2_id, user=request.user)
+    dataset1 = get_object_or_404(EquipmentDataset, id=dataset1_id, user=request.user, is_ready=True)
+    dataset2 = get_object_or_404(EquipmentDataset, id=dataset2_id, user=request.user, is_ready=True)
     
     comparison_result = ComparisonService.compare_datasets(dataset1, dataset2, request.user)
     significant_changes = ComparisonService.get_significant_changes(comparison_result)
@@ -112,43 +187,81 @@ def get_comparisons(request):
 @api_view(['GET'])
 def validate_dataset(request, dataset_id):
     """Get data quality validation report"""
-    dataset = get_object_or_404(EquipmentDataset, id=dataset_id, user=request.user)
+    dataset = get_object_or_404(EquipmentDataset, id=dataset_id, user=request.user, is_ready=True)
     
-    # Generate or get validation report
-    report = ValidationService.validate_dataset(dataset)
+    def compute():
+        # Generate or get validation report
+        report = ValidationService.validate_dataset(dataset)
+        if not report:
+            return None
+        return {
+            'total_records': report.total_records,
+            'missing_values': report.missing_values,
+            'duplicate_records': report.duplicate_records,
+            'outliers_count': report.outliers_count,
+            'quality_score': report.quality_score,
+            'details': report.validation_details
+        }
     
-    if not report:
+    result = AnalyticsCache.get_or_compute('validation', dataset, compute)
+    if not result:
         return Response({'error': 'No data to validate'}, status=status.HTTP_400_BAD_REQUEST)
     
-    return Response({
-        'total_records': report.total_records,
-        'missing_values': report.missing_values,
-        'duplicate_records': report.duplicate_records,
-        'outliers_count': report.outliers_count,
-        'quality_score': report.quality_score,
-        'details': report.validation_details
-    })
+    return Response(result)
 
 
 @api_view(['GET'])
 def get_predictions(request, dataset_id):
     """Get trend predictions for a dataset"""
-    dataset = get_object_or_404(EquipmentDataset, id=dataset_id, user=request.user)
+    dataset = get_object_or_404(EquipmentDataset, id=dataset_id, user=request.user, is_ready=True)
     
-    # Generate predictions
-    predictions = PredictionService.predict_trends(dataset)
-    maintenance_alerts = PredictionService.get_maintenance_alerts(dataset)
+    def compute():
+        # Generate predictions
+        predictions = PredictionService.predict_trends(dataset)
+        maintenance_alerts = PredictionService.get_maintenance_alerts(dataset)
+        return {
+            'predictions': predictions,
+            'maintenance_alerts': maintenance_alerts
+        }
     
-    return Response({
-        'predictions': predictions,
-        'maintenance_alerts': maintenance_alerts
-    })
+    return Response(AnalyticsCache.get_or_compute('predictions', dataset, compute))
+
+
+@api_view(['GET'])
+def get_forecasts(request):
+    """
+    Per-equipment trend forecasts across all of the user's uploads
+    Query params: parameter (comma separated), horizon_days, equipment,
+    plant, unit, section
+    """
+    params = request.query_params
+    try:
+        horizon_days = float(params.get('horizon_days') or ForecastService.HORIZON_DAYS)
+    except ValueError:
+        horizon_days = math.nan
+    if not math.isfinite(horizon_days):
+        return Response({'error': 'horizon_days must be a number'}, status=status.HTTP_400_BAD_REQUEST)
+    
+    try:
+        forecasts = ForecastService.forecast(
+            request.user,
+            parameters=[value for value in params.get('parameter', '').split(',') if value] or None,
+            horizon_days=horizon_days,
+            plant=params.get('plant'),
+            unit=params.get('unit'),
+            section=params.get('section'),
+            equipment=params.get('equipment')
+        )
+    except ValueError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    
+    return Response({'forecasts': forecasts})
 
 
 @api_view(['POST'])
 def share_dataset(request, dataset_id):
     """Share dataset with another user"""
-    dataset = get_object_or_404(EquipmentDataset, id=dataset_id, user=request.user)
+    dataset = get_object_or_404(EquipmentDataset, id=dataset_id, user=request.user, is_ready=True)
     username = request.data.get('username')
     can_edit = request.data.get('can_edit', False)
     
@@ -176,7 +289,7 @@ def share_dataset(request, dataset_id):
 @api_view(['GET'])
 def get_shared_datasets(request):
     """Get datasets shared with current user"""
-    shared = SharedDataset.objects.filter(shared_with=request.user)
+    shared = SharedDataset.objects.filter(shared_with=request.user, dataset__is_ready=True)
     data = [{
         'id': s.dataset.id,
         'filename': s.dataset.filename,
@@ -199,7 +312,7 @@ def schedule_report(request):
     
     dataset = None
     if dataset_id:
-        dataset = get_object_or_404(EquipmentDataset, id=dataset_id, user=request.user)
+        dataset = get_object_or_404(EquipmentDataset, id=dataset_id, user=request.user, is_ready=True)
     
     scheduled = ScheduledReport.objects.create(
         user=request.user,
@@ -222,7 +335,7 @@ def schedule_report(request):
 def send_report_email(request, dataset_id):
     """Send dataset report via email"""
     try:
-        dataset = get_object_or_404(EquipmentDataset, id=dataset_id, user=request.user)
+        dataset = get_object_or_404(EquipmentDataset, id=dataset_id, user=request.user, is_ready=True)
         email = request.data.get('email', request.user.email)
         
         success, message = EmailService.send_report_email(dataset, email)
@@ -251,65 +364,70 @@ def batch_upload(request):
     if not files:
         return Response({'error': 'No files provided'}, status=status.HTTP_400_BAD_REQUEST)
     
-    results = []
-    from .services.csv_processor import CSVProcessor
-    
-    for csv_file in files:
+    bad_value_policy = request.data.get('bad_value_policy', '')
+    if bad_value_policy:
         try:
-            if not csv_file.name.endswith('.csv'):
-                results.append({
-                    'filename': csv_file.name,
-                    'success': False,
-                    'error': 'Not a CSV file'
-                })
-                continue
-            
-            # Process CSV
-            processor = CSVProcessor(csv_file)
-            df = processor.process()
-            
-            # Create dataset (simplified - you'd want to use the full upload logic)
-            from .services.analytics_service import AnalyticsService
-            stats = AnalyticsService.calculate_summary_stats(df)
-            type_dist = AnalyticsService.get_type_distribution(df)
-            
-            dataset = EquipmentDataset.objects.create(
-                user=request.user,
-                filename=csv_file.name,
-                total_equipment=len(df),
-                avg_flowrate=stats['avg_flowrate'],
-                avg_pressure=stats['avg_pressure'],
-                avg_temperature=stats['avg_temperature'],
-                type_distribution=type_dist
-            )
-            
-            # Create records
-            for _, row in df.iterrows():
-                EquipmentRecord.objects.create(
-                    dataset=dataset,
-                    equipment_name=row['Equipment Name'],
-                    equipment_type=row['Type'],
-                    flowrate=row['Flowrate'],
-                    pressure=row['Pressure'],
-                    temperature=row['Temperature']
-                )
-            
-            results.append({
-                'filename': csv_file.name,
-                'success': True,
-                'dataset_id': dataset.id
-            })
-            
-        except Exception as e:
-            results.append({
-                'filename': csv_file.name,
-                'success': False,
-                'error': str(e)
-            })
+            CSVProcessor.check_policy(bad_value_policy)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    
+    # Files are parsed in parallel, one per core, then committed in bulk
+    started = time.perf_counter()
+    pipeline = BatchIngestionPipeline(request.user, bad_value_policy=bad_value_policy)
+    results = pipeline.run(files, get_content_digests(request, 'files'))
+    elapsed = time.perf_counter() - started
     
     return Response({
         'total_files': len(files),
         'successful': len([r for r in results if r['success']]),
         'failed': len([r for r in results if not r['success']]),
+        'total_rows': sum(r.get('rows', 0) for r in results),
+        'elapsed_ms': round(elapsed * 1000, 1),
         'results': results
     })
+
+
+@api_view(['GET'])
+def retention_status(request):
+    """Retention policy for the current user and what is waiting to be purged"""
+    user_keep, plant_keep, default_plant = RetentionService.policies()
+    plants = {
+        plant: keep for (user_id, plant), keep in plant_keep.items()
+        if user_id is None
+    }
+    # user-specific plant policies override global ones
+    plants.update({
+        plant: keep for (user_id, plant), keep in plant_keep.items()
+        if user_id == request.user.id
+    })
+    
+    return Response({
+        'keep_per_user': user_keep.get(request.user.id, user_keep[None]),
+        'keep_per_plant': default_plant,
+        'plant_policies': plants,
+        'pending_purge': RetentionService.pending(request.user)
+    })
+
+
+@api_view(['GET'])
+def ingestion_profile(request):
+    """Per-phase ingestion latency histogram (staff see every user's uploads)"""
+    spans = IngestionSpan.objects.all()
+    if not request.user.is_staff:
+        spans = spans.filter(Q(job__user=request.user) | Q(dataset__user=request.user))
+    
+    phase = request.query_params.get('phase')
+    if phase:
+        spans = spans.filter(phase=phase)
+    
+    return Response(IngestionProfiler.histogram(spans))
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def analytics_cache_stats(request):
+    """Hit/miss counters of the derived analytics cache in this server process"""
+    return Response({
+        'backend': settings.ANALYTICS_CACHE_BACKEND,
+        'kinds': AnalyticsCache.stats()
+    })
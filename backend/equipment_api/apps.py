@@ -1,6 +1,38 @@
+import os
+import sys
+
 from django.apps import AppConfig
 
 
+# process names of the servers the app is deployed under
+SERVER_PROGRAMS = ('gunicorn', 'uwsgi', 'daphne', 'uvicorn')
+
+
+def serving_requests():
+    """
+    True in a process that serves HTTP requests: runserver (the reloader's
+    child, not the file watcher) or a WSGI/ASGI server; False for migrate,
+    test, shell and other management commands
+    """
+    program = os.path.basename(sys.argv[0]) if sys.argv else ''
+    if program in ('manage.py', 'django-admin'):
+        if sys.argv[1:2] != ['runserver']:
+            return False
+        return os.environ.get('RUN_MAIN') == 'true' or '--noreload' in sys.argv
+    return any(name in program for name in SERVER_PROGRAMS)
+
+
 class EquipmentApiConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'equipment_api'
+
+    def ready(self):
+        from . import signals  # noqa: F401
+
+        if serving_requests():
+            from .services.job_queue import IngestionJobQueue
+            from .services.retention_service import RetentionService
+            # jobs queued or left running before a restart would otherwise
+            # wait for the next upload to wake the pool
+            IngestionJobQueue.start()
+            RetentionService.start_background()
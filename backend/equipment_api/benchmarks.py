@@ -0,0 +1,374 @@
+"""Ingestion throughput benchmark and synthetic plant data generator"""
+import json
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from multiprocessing import get_context
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from django.conf import settings
+from django.core.files import File
+from django.db import connection, transaction
+from django.test.utils import override_settings
+from django.utils import timezone
+
+from .models import EquipmentDataset
+from .services.analytics_service import AnalyticsService, RunningSummary
+from .services.csv_processor import CSVProcessor
+from .services.ingestion_service import BulkRecordWriter, IngestionService
+
+
+class SyntheticPlantData:
+    """
+    Generate sample_equipment_data.csv-shaped files of any size
+    Rows are produced and written in chunks, so 10M-row files never
+    sit in memory whole
+    """
+
+    # per-type (flowrate, pressure, temperature) baselines from the sample file
+    PROFILES = {
+        'Pump': (126.0, 5.5, 115.0),
+        'Compressor': (97.0, 8.2, 96.0),
+        'Valve': (60.0, 4.1, 105.0),
+        'HeatExchanger': (152.0, 6.25, 131.0),
+        'Reactor': (142.0, 7.35, 139.0),
+        'Condenser': (162.0, 6.85, 126.0),
+    }
+    DEFAULT_MIX = {
+        'Pump': 0.3, 'Compressor': 0.15, 'Valve': 0.25,
+        'HeatExchanger': 0.1, 'Reactor': 0.1, 'Condenser': 0.1
+    }
+    NOISE = 0.05
+    CHUNK_ROWS = 250000
+
+    def __init__(self, type_mix=None, outlier_rate=0.01, seed=0):
+        mix = type_mix or self.DEFAULT_MIX
+        unknown = [name for name in mix if name not in self.PROFILES]
+        if unknown:
+            raise ValueError(f"Unknown equipment types: {', '.join(unknown)}")
+
+        total = sum(mix.values())
+        self.types = list(mix)
+        self.weights = np.array([mix[name] / total for name in self.types])
+        self.baselines = np.array([self.PROFILES[name] for name in self.types])
+        self.outlier_rate = outlier_rate
+        self.rng = np.random.default_rng(seed)
+
+    @staticmethod
+    def parse_mix(text):
+        """'Pump=0.5,Valve=0.5' -> {'Pump': 0.5, 'Valve': 0.5}"""
+        mix = {}
+        for item in filter(None, (part.strip() for part in text.split(','))):
+            name, _, weight = item.partition('=')
+            mix[name.strip()] = float(weight)
+        return mix
+
+    def write(self, path, rows):
+        """Write a CSV with the given number of data rows"""
+        counters = np.zeros(len(self.types), dtype='int64')
+        with open(path, 'w', newline='') as out:
+            for start in range(0, rows, self.CHUNK_ROWS):
+                chunk = self._chunk(min(self.CHUNK_ROWS, rows - start), counters)
+                chunk.to_csv(out, header=start == 0, index=False, float_format='%.2f')
+
+    def _chunk(self, size, counters):
+        kinds = self.rng.choice(len(self.types), size=size, p=self.weights)
+        values = self.baselines[kinds] * self.rng.normal(1.0, self.NOISE, size=(size, 3))
+
+        # outliers: one parameter pushed 1.5-3x away from its baseline
+        outliers = np.flatnonzero(self.rng.random(size) < self.outlier_rate)
+        columns = self.rng.integers(0, 3, size=len(outliers))
+        values[outliers, columns] *= self.rng.uniform(1.5, 3.0, size=len(outliers))
+
+        # Pump-1, Pump-2, ... numbered per type across chunks
+        sequence = pd.Series(kinds).groupby(kinds).cumcount().to_numpy() + 1 + counters[kinds]
+        counters += np.bincount(kinds, minlength=len(self.types))
+
+        names = np.array(self.types, dtype=object)[kinds]
+        return pd.DataFrame({
+            'Equipment Name': names + '-' + sequence.astype(str).astype(object),
+            'Type': names,
+            'Flowrate': values[:, 0],
+            'Pressure': values[:, 1],
+            'Temperature': values[:, 2],
+        })
+
+
+class IngestionBenchmark:
+    """
+    Time CSV parsing, record persistence and summary computation, then a
+    full IngestionService run, for each file size, and parse the file
+    with each CSV engine. Every case runs in a fresh child process so its
+    peak RSS is not inflated by earlier ones.
+    """
+
+    def __init__(self, user, work_dir=None, type_mix=None, outlier_rate=0.01, seed=0, engines=None):
+        self.user = user
+        self.work_dir = work_dir or tempfile.gettempdir()
+        self.type_mix = type_mix
+        self.outlier_rate = outlier_rate
+        self.seed = seed
+        self.engines = engines or self.available_engines()
+
+    @staticmethod
+    def available_engines():
+        """Parse paths to compare: inferred dtypes, pinned dtypes, pyarrow if installed"""
+        engines = ['inferred', 'c']
+        if CSVProcessor.resolve_engine('pyarrow') == 'pyarrow':
+            engines.append('pyarrow')
+        return engines
+
+    def run(self, sizes, keep_files=False):
+        """Returns: list of result dicts, one per size"""
+        results = []
+        for rows in sizes:
+            path = os.path.join(self.work_dir, f'bench_{rows}.csv')
+            started = time.perf_counter()
+            SyntheticPlantData(self.type_mix, self.outlier_rate, self.seed).write(path, rows)
+            generate_seconds = time.perf_counter() - started
+
+            try:
+                # connections must not be shared with the forked child
+                connection.close()
+                with ProcessPoolExecutor(max_workers=1, mp_context=get_context('fork')) as executor:
+                    result = executor.submit(_run_case, self.user.id, path, rows).result()
+                result['engines'] = {}
+                for engine in self.engines:
+                    with ProcessPoolExecutor(max_workers=1, mp_context=get_context('fork')) as executor:
+                        result['engines'][engine] = executor.submit(_run_parse_case, path, engine).result()
+            finally:
+                if not keep_files:
+                    os.remove(path)
+
+            result['generate_s'] = round(generate_seconds, 3)
+            result.update(self.environment())
+            results.append(result)
+        return results
+
+    @staticmethod
+    def environment():
+        """Context stored with every result so runs can be compared later"""
+        try:
+            commit = subprocess.run(
+                ['git', 'rev-parse', '--short', 'HEAD'],
+                capture_output=True, text=True, cwd=settings.BASE_DIR, timeout=5
+            ).stdout.strip()
+        except (OSError, subprocess.SubprocessError):
+            commit = ''
+
+        return {
+            'timestamp': timezone.now().isoformat(),
+            'commit': commit,
+            'database': connection.vendor,
+            'python': platform.python_version(),
+            'pandas': pd.__version__,
+            'numpy': np.__version__,
+            'cpu_count': os.cpu_count(),
+            'platform': sys.platform,
+        }
+
+    @staticmethod
+    def write_results(results, path):
+        """Append results as JSON lines, one object per case"""
+        with open(path, 'a') as out:
+            for result in results:
+                out.write(json.dumps(result) + '\n')
+
+
+class HealthBenchmark:
+    """
+    Time AnalyticsService.analyze_health against the per-record loop it
+    replaced, on synthetic datasets, and check both give identical results
+    """
+
+    def __init__(self, user, work_dir=None, type_mix=None, outlier_rate=0.01, seed=0, repeat=5):
+        self.user = user
+        self.work_dir = work_dir or tempfile.gettempdir()
+        self.type_mix = type_mix
+        self.outlier_rate = outlier_rate
+        self.seed = seed
+        self.repeat = repeat
+
+    def run(self, sizes):
+        """Returns: list of result dicts, one per size"""
+        results = []
+        for rows in sizes:
+            path = os.path.join(self.work_dir, f'bench_health_{rows}.csv')
+            SyntheticPlantData(self.type_mix, self.outlier_rate, self.seed).write(path, rows)
+            try:
+                with open(path, 'rb') as f:
+                    dataset = IngestionService.ingest_upload(self.user, File(f, name=os.path.basename(path)))
+            finally:
+                os.remove(path)
+
+            try:
+                loop_s, expected = self._best_of(lambda: _analyze_health_loop(dataset))
+                vectorized_s, actual = self._best_of(lambda: AnalyticsService().analyze_health(dataset))
+            finally:
+                dataset.delete()
+
+            result = {
+                'benchmark': 'health',
+                'rows': rows,
+                'loop_s': round(loop_s, 4),
+                'vectorized_s': round(vectorized_s, 4),
+                'speedup': round(loop_s / vectorized_s, 1) if vectorized_s else None,
+                'identical': actual == expected,
+            }
+            result.update(IngestionBenchmark.environment())
+            results.append(result)
+        return results
+
+    def _best_of(self, func):
+        best, value = None, None
+        for _ in range(self.repeat):
+            started = time.perf_counter()
+            value = func()
+            elapsed = time.perf_counter() - started
+            best = elapsed if best is None else min(best, elapsed)
+        return best, value
+
+
+def _analyze_health_loop(dataset):
+    """The original per-record analyze_health, kept as the reference"""
+    analysis = []
+    avg_flow = dataset.avg_flowrate or 1
+    avg_press = dataset.avg_pressure or 1
+    avg_temp = dataset.avg_temperature or 1
+
+    for r in dataset.records.order_by('id'):
+        power_index = r.flowrate * r.pressure
+        flow_dev = abs(r.flowrate - avg_flow) / avg_flow
+        press_dev = abs(r.pressure - avg_press) / avg_press
+        temp_dev = abs(r.temperature - avg_temp) / avg_temp
+        avg_dev = (flow_dev + press_dev + temp_dev) / 3
+        health_score = max(0, 100 - (avg_dev * 100))
+
+        status = 'Good'
+        if health_score < 70: status = 'Warning'
+        if health_score < 50: status = 'Critical'
+
+        analysis.append({
+            'id': r.id,
+            'name': r.equipment_name,
+            'type': r.equipment_type,
+            'health_score': round(health_score, 1),
+            'status': status,
+            'power_index': round(power_index, 2),
+            'flowrate': r.flowrate,
+            'pressure': r.pressure,
+            'temperature': r.temperature
+        })
+
+    return sorted(analysis, key=lambda x: x['health_score'])
+
+
+@contextmanager
+def scratch_media():
+    """MEDIA_ROOT and the columnar store in a temporary directory, removed on exit"""
+    root = tempfile.mkdtemp(prefix='benchmark_media_')
+    try:
+        with override_settings(MEDIA_ROOT=root, COLUMNAR_STORE_ROOT=Path(root) / 'columnar'):
+            yield root
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+
+class _Timer:
+    def __init__(self):
+        self.seconds = {}
+
+    @contextmanager
+    def __call__(self, phase):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.seconds[phase] = self.seconds.get(phase, 0.0) + time.perf_counter() - started
+
+    def timed(self, phase, iterable):
+        """Charge the time spent producing each item to phase"""
+        iterator = iter(iterable)
+        while True:
+            with self(phase):
+                item = next(iterator, None)
+            if item is None:
+                return
+            yield item
+
+
+def _peak_rss_mb():
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+def _run_parse_case(path, engine):
+    """Parse a file with one engine, streaming as ingestion does (child process)"""
+    rss = _peak_rss_mb()
+    processor = CSVProcessor(engine=engine)
+    started = time.perf_counter()
+    with open(path, 'rb') as f:
+        for batch in processor.iter_batches(f):
+            pass
+    return {
+        'engine': processor.engine,  # pyarrow falls back to c when not installed
+        'parse_s': round(time.perf_counter() - started, 3),
+        'peak_rss_delta_mb': round(_peak_rss_mb() - rss, 1),
+        'phases': processor.profile.as_dict(),
+    }
+
+
+def _run_case(user_id, path, rows):
+    """One benchmark case, run in a child process"""
+    from django.contrib.auth.models import User
+
+    user = User.objects.get(id=user_id)
+    timer = _Timer()
+    processor = CSVProcessor()
+
+    # component timings: parse, persist and summary charged separately
+    dataset = EquipmentDataset.objects.create(user=user, filename=os.path.basename(path), total_equipment=0)
+    writer = BulkRecordWriter(dataset)
+    summary = RunningSummary()
+    with open(path, 'rb') as f:
+        for batch in timer.timed('parse', processor.iter_batches(f)):
+            with timer('persist'), transaction.atomic():
+                writer.write(batch)
+            with timer('summary'):
+                summary.update(batch)
+    with timer('summary'):
+        summary.as_summary()
+    components_rss = _peak_rss_mb()
+    dataset.delete()
+
+    # end to end through the production ingestion path
+    processor = CSVProcessor()
+    with open(path, 'rb') as f:
+        upload = File(f, name=os.path.basename(path))
+        with timer('ingest_total'):
+            dataset = IngestionService.ingest_upload(user, upload, processor=processor)
+    dataset.delete()
+
+    total = timer.seconds['ingest_total']
+    result = {
+        'rows': rows,
+        'file_mb': round(os.path.getsize(path) / (1024 * 1024), 2),
+        'peak_rss_components_mb': components_rss,
+        'peak_rss_mb': _peak_rss_mb(),
+        'rows_per_s': round(rows / total) if total else None,
+    }
+    result.update({f'{phase}_s': round(seconds, 3) for phase, seconds in timer.seconds.items()})
+    # the pipeline's own spans for the end to end run
+    result['phases'] = processor.profile.as_dict()
+    connection.close()
+    return result
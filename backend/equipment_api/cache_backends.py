@@ -0,0 +1,41 @@
+"""Cache backends for derived analytics"""
+import os
+
+from django.core.cache.backends.filebased import FileBasedCache
+
+
+class LRUFileBasedCache(FileBasedCache):
+    """
+    FileBasedCache that culls least recently used entries instead of a
+    random sample. A hit touches the entry's mtime, so mtime order is
+    access order.
+    """
+
+    _missing = object()
+
+    def get(self, key, default=None, version=None):
+        value = super().get(key, self._missing, version)
+        if value is self._missing:
+            return default
+        try:
+            os.utime(self._key_to_file(key, version))
+        except OSError:
+            pass  # removed or culled concurrently, the value is still good
+        return value
+
+    def _cull(self):
+        filelist = self._list_cache_files()
+        num_entries = len(filelist)
+        if num_entries < self._max_entries:
+            return
+        if self._cull_frequency == 0:
+            return self.clear()
+
+        def last_used(fname):
+            try:
+                return os.path.getmtime(fname)
+            except OSError:
+                return 0
+
+        for fname in sorted(filelist, key=last_used)[:int(num_entries / self._cull_frequency)]:
+            self._delete(fname)
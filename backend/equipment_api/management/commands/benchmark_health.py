@@ -0,0 +1,64 @@
+import os
+import tempfile
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from equipment_api.benchmarks import HealthBenchmark, IngestionBenchmark, SyntheticPlantData, scratch_media
+
+
+class Command(BaseCommand):
+    help = 'Benchmark health analysis against the per-record loop on synthetic plant data'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, nargs='+', default=[1000, 10000, 50000],
+                            help='Dataset sizes to benchmark, in records')
+        parser.add_argument('--type-mix', default='',
+                            help='Equipment type weights, e.g. Pump=0.5,Valve=0.3,Reactor=0.2')
+        parser.add_argument('--outlier-rate', type=float, default=0.01,
+                            help='Fraction of rows with one parameter far off its baseline')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--repeat', type=int, default=5, help='Runs per implementation, best is kept')
+        parser.add_argument('--output', default='benchmark_results.jsonl',
+                            help='JSON lines file, results are appended')
+        parser.add_argument('--work-dir', default=None, help='Where generated CSVs are written')
+
+    def handle(self, *args, **options):
+        try:
+            type_mix = SyntheticPlantData.parse_mix(options['type_mix']) or None
+        except ValueError:
+            raise CommandError('--type-mix must look like Pump=0.5,Valve=0.5')
+
+        # throwaway database on the configured backend, never the real one
+        test_settings = connection.settings_dict.setdefault('TEST', {})
+        if connection.vendor == 'sqlite' and not test_settings.get('NAME'):
+            test_settings['NAME'] = os.path.join(tempfile.gettempdir(), 'benchmark_health.sqlite3')
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+
+        try:
+            # columnar parts go to scratch media, never the real MEDIA_ROOT
+            with scratch_media():
+                user = User.objects.create_user('benchmark')
+                benchmark = HealthBenchmark(
+                    user,
+                    work_dir=options['work_dir'],
+                    type_mix=type_mix,
+                    outlier_rate=options['outlier_rate'],
+                    seed=options['seed'],
+                    repeat=options['repeat']
+                )
+                results = benchmark.run(options['rows'])
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+        IngestionBenchmark.write_results(results, options['output'])
+        for result in results:
+            self.stdout.write(
+                f"{result['database']:>10} {result['rows']:>9} records  "
+                f"loop {result['loop_s']:.3f}s  vectorized {result['vectorized_s']:.3f}s  "
+                f"{result['speedup']}x  identical={result['identical']}"
+            )
+        if not all(result['identical'] for result in results):
+            raise CommandError('Vectorized results differ from the per-record loop')
+        self.stdout.write(self.style.SUCCESS(f"Results appended to {options['output']}"))
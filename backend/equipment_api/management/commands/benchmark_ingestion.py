@@ -0,0 +1,72 @@
+import os
+import tempfile
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from equipment_api.benchmarks import IngestionBenchmark, SyntheticPlantData, scratch_media
+
+
+class Command(BaseCommand):
+    help = 'Benchmark CSV ingestion on synthetic plant data (run once per database backend)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, nargs='+', default=[1000, 10000, 100000, 1000000],
+                            help='File sizes to benchmark, in data rows (up to 10M)')
+        parser.add_argument('--type-mix', default='',
+                            help='Equipment type weights, e.g. Pump=0.5,Valve=0.3,Reactor=0.2')
+        parser.add_argument('--outlier-rate', type=float, default=0.01,
+                            help='Fraction of rows with one parameter far off its baseline')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--output', default='benchmark_results.jsonl',
+                            help='JSON lines file, results are appended')
+        parser.add_argument('--keep-files', action='store_true', help='Keep the generated CSVs')
+        parser.add_argument('--work-dir', default=None, help='Where generated CSVs are written')
+        parser.add_argument('--engines', nargs='+', choices=['inferred', 'c', 'pyarrow'], default=None,
+                            help='CSV engines to compare parse time and memory for (default: all available)')
+
+    def handle(self, *args, **options):
+        try:
+            type_mix = SyntheticPlantData.parse_mix(options['type_mix']) or None
+        except ValueError:
+            raise CommandError('--type-mix must look like Pump=0.5,Valve=0.5')
+
+        # benchmark against a throwaway database on the configured backend
+        # (DATABASE_URL), never the real one; SQLite gets a file so the
+        # forked case processes see the same data
+        test_settings = connection.settings_dict.setdefault('TEST', {})
+        if connection.vendor == 'sqlite' and not test_settings.get('NAME'):
+            test_settings['NAME'] = os.path.join(tempfile.gettempdir(), 'benchmark_ingestion.sqlite3')
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+
+        try:
+            # columnar parts go to scratch media, never the real MEDIA_ROOT
+            with scratch_media():
+                user = User.objects.create_user('benchmark')
+                benchmark = IngestionBenchmark(
+                    user,
+                    work_dir=options['work_dir'],
+                    type_mix=type_mix,
+                    outlier_rate=options['outlier_rate'],
+                    seed=options['seed'],
+                    engines=options['engines']
+                )
+                results = benchmark.run(options['rows'], keep_files=options['keep_files'])
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+        IngestionBenchmark.write_results(results, options['output'])
+        for result in results:
+            self.stdout.write(
+                f"{result['database']:>10} {result['rows']:>9} rows  "
+                f"parse {result['parse_s']:.2f}s  persist {result['persist_s']:.2f}s  "
+                f"summary {result['summary_s']:.2f}s  ingest {result['ingest_total_s']:.2f}s  "
+                f"{result['rows_per_s']} rows/s  peak {result['peak_rss_mb']} MB"
+            )
+            for engine, parse in result['engines'].items():
+                self.stdout.write(
+                    f"{'':>10} {engine:>15} engine  parse {parse['parse_s']:.2f}s  "
+                    f"peak +{parse['peak_rss_delta_mb']} MB"
+                )
+        self.stdout.write(self.style.SUCCESS(f"Results appended to {options['output']}"))
@@ -0,0 +1,28 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from equipment_api.services.retention_service import RetentionService
+
+
+class Command(BaseCommand):
+    help = 'Purge datasets past their retention policy in bounded batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Only report what is pending')
+        parser.add_argument('--max-batches', type=int, default=None, help='Stop after this many batches')
+        parser.add_argument('--loop', action='store_true', help='Keep purging every --interval seconds')
+        parser.add_argument('--interval', type=float, default=300.0, help='Seconds between purges with --loop')
+
+    def handle(self, *args, **options):
+        while True:
+            pending = RetentionService.pending()
+            self.stdout.write(f"Pending purge: {pending['datasets']} datasets, {pending['rows']} rows")
+
+            if not options['dry_run']:
+                deleted = RetentionService.purge(max_batches=options['max_batches'])
+                self.stdout.write(f"Purged {deleted['datasets']} datasets, {deleted['rows']} rows")
+
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
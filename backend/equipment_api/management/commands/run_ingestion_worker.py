@@ -0,0 +1,30 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from equipment_api.services.job_queue import IngestionJobQueue
+from equipment_api.services.retention_service import RetentionService
+
+
+class Command(BaseCommand):
+    help = 'Process queued CSV ingestion jobs'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Drain the queue and exit')
+        parser.add_argument('--interval', type=float, default=2.0, help='Seconds between polls')
+
+    def handle(self, *args, **options):
+        if not options['once']:
+            # purges expired datasets unless another process on this host does
+            RetentionService.start_background()
+
+        while True:
+            job = IngestionJobQueue.claim_next()
+            if job:
+                self.stdout.write(f'Processing job {job.id}: {job.filename}')
+                IngestionJobQueue.run(job)
+                continue
+
+            if options['once']:
+                break
+            time.sleep(options['interval'])
@@ -0,0 +1,36 @@
+# Generated by Django 4.2.7 on 2026-10-18 04:47
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('equipment_api', '0004_ingestionjob'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='ingestionjob',
+            name='file',
+            field=models.FileField(blank=True, upload_to='ingestion/'),
+        ),
+        migrations.CreateModel(
+            name='ChunkedUpload',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('filename', models.CharField(max_length=255)),
+                ('total_size', models.BigIntegerField()),
+                ('chunk_size', models.IntegerField()),
+                ('total_chunks', models.IntegerField()),
+                ('status', models.CharField(choices=[('uploading', 'Uploading'), ('finalized', 'Finalized')], default='uploading', max_length=20)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('job', models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='chunked_upload', to='equipment_api.ingestionjob')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+    ]
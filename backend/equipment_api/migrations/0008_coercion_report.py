@@ -0,0 +1,23 @@
+# Generated by Django 4.2.7 on 2026-10-18 04:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('equipment_api', '0007_archive_members'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ingestionjob',
+            name='bad_value_policy',
+            field=models.CharField(blank=True, default='', max_length=10),
+        ),
+        migrations.AddField(
+            model_name='ingestionjob',
+            name='coercion_report',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 4.2.7 on 2026-10-18 05:03
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('equipment_api', '0009_retention'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='equipmentdataset',
+            name='summary_state',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+        migrations.AddField(
+            model_name='ingestionjob',
+            name='append_to',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='append_jobs', to='equipment_api.equipmentdataset'),
+        ),
+    ]
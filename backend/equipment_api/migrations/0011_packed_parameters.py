@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-18 05:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('equipment_api', '0010_append_uploads'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='equipmentrecord',
+            name='parameter_values',
+            field=models.BinaryField(blank=True, null=True),
+        ),
+    ]
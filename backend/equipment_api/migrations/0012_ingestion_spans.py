@@ -0,0 +1,33 @@
+# Generated by Django 4.2.7 on 2026-10-18 05:09
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('equipment_api', '0011_packed_parameters'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IngestionSpan',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('phase', models.CharField(max_length=30)),
+                ('wall_ms', models.FloatField()),
+                ('calls', models.IntegerField(default=0)),
+                ('rows', models.BigIntegerField(default=0)),
+                ('bytes', models.BigIntegerField(default=0)),
+                ('memory_delta_mb', models.FloatField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('dataset', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='ingestion_spans', to='equipment_api.equipmentdataset')),
+                ('job', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='spans', to='equipment_api.ingestionjob')),
+            ],
+            options={
+                'ordering': ['id'],
+                'indexes': [models.Index(fields=['phase', 'wall_ms'], name='equipment_a_phase_a7cecb_idx')],
+            },
+        ),
+    ]
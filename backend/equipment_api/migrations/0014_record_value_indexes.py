@@ -0,0 +1,25 @@
+# Generated by Django 4.2.7 on 2026-10-18 05:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('equipment_api', '0013_analytics_cache_versions'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='equipmentrecord',
+            index=models.Index(fields=['dataset', 'flowrate'], name='record_dataset_flowrate'),
+        ),
+        migrations.AddIndex(
+            model_name='equipmentrecord',
+            index=models.Index(fields=['dataset', 'pressure'], name='record_dataset_pressure'),
+        ),
+        migrations.AddIndex(
+            model_name='equipmentrecord',
+            index=models.Index(fields=['dataset', 'temperature'], name='record_dataset_temperature'),
+        ),
+    ]
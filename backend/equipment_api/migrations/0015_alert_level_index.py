@@ -0,0 +1,17 @@
+# Generated by Django 4.2.7 on 2026-10-18 05:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('equipment_api', '0014_record_value_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='equipmentrecord',
+            index=models.Index(fields=['dataset', 'alert_level'], name='record_dataset_alert_level'),
+        ),
+    ]
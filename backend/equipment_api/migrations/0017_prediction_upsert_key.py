@@ -0,0 +1,36 @@
+# Generated by Django 4.2.7 on 2026-10-18 05:30
+
+from django.db import migrations, models
+from django.db.models import Max
+
+
+def drop_duplicate_predictions(apps, schema_editor):
+    # every prediction request used to insert new rows; keep the latest per key
+    PredictionResult = apps.get_model('equipment_api', 'PredictionResult')
+    latest = (
+        PredictionResult.objects
+        .values('dataset_id', 'equipment_record_id', 'parameter')
+        .annotate(keep=Max('id'))
+        .values_list('keep', flat=True)
+    )
+    PredictionResult.objects.exclude(id__in=list(latest)).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('equipment_api', '0016_alert_rules'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='predictionresult',
+            name='model_version',
+            field=models.PositiveIntegerField(default=1),
+        ),
+        migrations.RunPython(drop_duplicate_predictions, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='predictionresult',
+            constraint=models.UniqueConstraint(fields=('dataset', 'equipment_record', 'parameter', 'model_version'), name='prediction_unique_per_model'),
+        ),
+    ]
@@ -9,16 +9,34 @@ class EquipmentDataset(models.Model):
     
     # summary stats
     total_equipment = models.IntegerField()
-    avg_flowrate = models.FloatField()
-    avg_pressure = models.FloatField()
-    avg_temperature = models.FloatField()
-    type_distribution = models.JSONField()  # stores dict of equipment types and counts
+    avg_flowrate = models.FloatField(null=True, blank=True)
+    avg_pressure = models.FloatField(null=True, blank=True)
+    avg_temperature = models.FloatField(null=True, blank=True)
+    type_distribution = models.JSONField(default=dict)  # stores dict of equipment types and counts
+    summary_state = models.JSONField(default=dict, blank=True)  # running sums/counts for appends
+    
+    # dynamic parameter columns discovered in the CSV
+    parameter_columns = models.JSONField(default=list)
+    categorical_columns = models.JSONField(default=list)
+    parameter_averages = models.JSONField(default=dict)
     
     # hierarchy
     plant = models.CharField(max_length=100, null=True, blank=True)
     unit = models.CharField(max_length=100, null=True, blank=True)
     section = models.CharField(max_length=100, null=True, blank=True)
     
+    # False while a background ingestion job is still writing records
+    is_ready = models.BooleanField(default=True)
+    
+    # sha256 of the uploaded file, used to skip re-ingesting duplicates
+    content_hash = models.CharField(max_length=64, blank=True, default='', db_index=True)
+    
+    # past the retention policy; hidden and waiting for the background purge
+    marked_for_purge = models.BooleanField(default=False, db_index=True)
+    
+    # bumped whenever records change (appends), part of analytics cache keys
+    version = models.PositiveIntegerField(default=1)
+    
     class Meta:
         ordering = ['-uploaded_at']
     
@@ -31,9 +49,14 @@ class EquipmentRecord(models.Model):
     dataset = models.ForeignKey(EquipmentDataset, on_delete=models.CASCADE, related_name='records')
     equipment_name = models.CharField(max_length=255)
     equipment_type = models.CharField(max_length=100)
-    flowrate = models.FloatField()
-    pressure = models.FloatField()
-    temperature = models.FloatField()
+    flowrate = models.FloatField(null=True, blank=True)
+    pressure = models.FloatField(null=True, blank=True)
+    temperature = models.FloatField(null=True, blank=True)
+    parameters = models.JSONField(default=dict)  # categorical extra columns only
+    
+    # extra numeric sensor columns as packed little-endian float64, in
+    # dataset.parameter_columns order (NaN = missing)
+    parameter_values = models.BinaryField(null=True, blank=True)
     
     # alert status
     has_alert = models.BooleanField(default=False)
@@ -43,6 +66,16 @@ class EquipmentRecord(models.Model):
         ('critical', 'Critical')
     ], default='normal')
     
+    class Meta:
+        # range scans when a threshold changes (AlertService.reevaluate)
+        indexes = [
+            models.Index(fields=['dataset', 'flowrate'], name='record_dataset_flowrate'),
+            models.Index(fields=['dataset', 'pressure'], name='record_dataset_pressure'),
+            models.Index(fields=['dataset', 'temperature'], name='record_dataset_temperature'),
+            # alert summary counts per level (AlertService.get_alert_summary)
+            models.Index(fields=['dataset', 'alert_level'], name='record_dataset_alert_level'),
+        ]
+    
     def __str__(self):
         return self.equipment_name
 
@@ -60,6 +93,7 @@ class EquipmentThreshold(models.Model):
     warning_threshold = models.FloatField(null=True, blank=True)
     critical_threshold = models.FloatField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
     
     class Meta:
         unique_together = ['user', 'parameter']
@@ -68,6 +102,21 @@ class EquipmentThreshold(models.Model):
         return f"{self.user.username} - {self.parameter}"
 
 
+class AlertRule(models.Model):
+    """User-defined rule expression for alerts and root cause (services/rules.py)"""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='alert_rules')
+    expression = models.TextField()  # e.g. pressure > 18 and temperature > 50 => critical "pump overheating"
+    enabled = models.BooleanField(default=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        ordering = ['id']
+    
+    def __str__(self):
+        return f"{self.user.username} - {self.expression}"
+
+
 class DataComparison(models.Model):
     """Stores comparison between two datasets"""
     user = models.ForeignKey(User, on_delete=models.CASCADE)
@@ -145,5 +194,133 @@ class PredictionResult(models.Model):
     ])
     created_at = models.DateTimeField(auto_now_add=True)
     
+    # PredictionService.MODEL_VERSION that produced the row; one row per
+    # (dataset, record, parameter, version), rewritten in place by upserts
+    model_version = models.PositiveIntegerField(default=1)
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['dataset', 'equipment_record', 'parameter', 'model_version'],
+                name='prediction_unique_per_model'
+            ),
+        ]
+    
     def __str__(self):
         return f"{self.equipment_record.equipment_name} - {self.parameter} prediction"
+
+
+class IngestionJob(models.Model):
+    """Queued CSV upload processed by the background worker pool"""
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    filename = models.CharField(max_length=255)
+    file = models.FileField(upload_to='ingestion/', blank=True)
+    bytes_total = models.BigIntegerField(default=0)
+    content_hash = models.CharField(max_length=64, blank=True, default='')
+    status = models.CharField(max_length=20, choices=[
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('completed', 'Completed'),
+        ('failed', 'Failed')
+    ], default='queued')
+    phase = models.CharField(max_length=20, default='queued')
+    
+    # progress counters
+    rows_parsed = models.BigIntegerField(default=0)
+    rows_persisted = models.BigIntegerField(default=0)
+    
+    dataset = models.ForeignKey(EquipmentDataset, on_delete=models.SET_NULL, null=True, blank=True)
+    error = models.TextField(blank=True, default='')
+    
+    # non-numeric cell handling (reject / drop / impute) and what it found
+    bad_value_policy = models.CharField(max_length=10, blank=True, default='')
+    coercion_report = models.JSONField(default=dict, blank=True)
+    
+    # set when the upload is appended to an existing dataset
+    append_to = models.ForeignKey(
+        EquipmentDataset, on_delete=models.CASCADE, null=True, blank=True, related_name='append_jobs'
+    )
+    
+    # zip uploads fan out into one child job (and dataset) per CSV member
+    parent = models.ForeignKey('self', on_delete=models.CASCADE, null=True, blank=True, related_name='members')
+    archive_member = models.CharField(max_length=255, blank=True, default='')
+    
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    
+    # refreshed on every progress report while running; a stale one means
+    # the worker died and the job is put back on the queue
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        ordering = ['created_at']
+        indexes = [models.Index(fields=['status', 'created_at'])]
+    
+    def __str__(self):
+        return f"{self.filename} ({self.status})"
+
+
+class IngestionSpan(models.Model):
+    """Time, volume and memory of one ingestion phase for one upload"""
+    dataset = models.ForeignKey(
+        EquipmentDataset, on_delete=models.CASCADE, null=True, blank=True, related_name='ingestion_spans'
+    )
+    job = models.ForeignKey(
+        IngestionJob, on_delete=models.SET_NULL, null=True, blank=True, related_name='spans'
+    )
+    phase = models.CharField(max_length=30)  # decode, parse, coerce, summary, insert, ...
+    wall_ms = models.FloatField()  # exclusive of nested phases
+    calls = models.IntegerField(default=0)
+    rows = models.BigIntegerField(default=0)
+    bytes = models.BigIntegerField(default=0)
+    memory_delta_mb = models.FloatField(default=0)  # peak RSS growth during the phase
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        ordering = ['id']
+        indexes = [models.Index(fields=['phase', 'wall_ms'])]
+    
+    def __str__(self):
+        return f"{self.phase}: {self.wall_ms:.1f} ms"
+
+
+class ChunkedUpload(models.Model):
+    """Resumable upload assembled from numbered, checksummed chunks"""
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    filename = models.CharField(max_length=255)
+    total_size = models.BigIntegerField()
+    chunk_size = models.IntegerField()
+    total_chunks = models.IntegerField()
+    status = models.CharField(max_length=20, choices=[
+        ('uploading', 'Uploading'),
+        ('finalized', 'Finalized')
+    ], default='uploading')
+    job = models.OneToOneField(IngestionJob, on_delete=models.SET_NULL, null=True, blank=True, related_name='chunked_upload')
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"{self.filename} ({self.status})"
+
+
+class RetentionPolicy(models.Model):
+    """
+    How many recent datasets to keep
+    user empty = applies to every user; plant empty = across all plants,
+    otherwise per (user, plant). The most specific policy wins, settings
+    RETENTION_KEEP_PER_USER / RETENTION_KEEP_PER_PLANT are the fallback
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True)
+    plant = models.CharField(max_length=100, blank=True, default='')
+    keep_latest = models.PositiveIntegerField()
+    
+    class Meta:
+        unique_together = ['user', 'plant']
+        verbose_name_plural = 'retention policies'
+    
+    def __str__(self):
+        scope = self.user.username if self.user else 'all users'
+        if self.plant:
+            scope += f' / {self.plant}'
+        return f"{scope}: keep {self.keep_latest}"
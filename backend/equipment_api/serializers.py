@@ -1,12 +1,22 @@
 from rest_framework import serializers
 from django.contrib.auth.models import User
-from .models import EquipmentDataset, EquipmentRecord
+from .models import EquipmentDataset, EquipmentRecord, IngestionJob, IngestionSpan, ChunkedUpload
+from .services.chunked_upload import ChunkedUploadService
+from .services.parameters import ParameterColumns
 
 
 class EquipmentRecordSerializer(serializers.ModelSerializer):
+    parameters = serializers.SerializerMethodField()
+    
     class Meta:
         model = EquipmentRecord
-        fields = ['id', 'equipment_name', 'equipment_type', 'flowrate', 'pressure', 'temperature']
+        fields = ['id', 'equipment_name', 'equipment_type', 'flowrate', 'pressure', 'temperature', 'parameters']
+    
+    def get_parameters(self, obj):
+        # packed numeric values plus the categorical labels
+        values = ParameterColumns.unpack(obj.parameter_values, obj.dataset.parameter_columns)
+        values.update(obj.parameters or {})
+        return values
 
 
 class EquipmentDatasetSerializer(serializers.ModelSerializer):
@@ -16,7 +26,45 @@ class EquipmentDatasetSerializer(serializers.ModelSerializer):
         model = EquipmentDataset
         fields = ['id', 'filename', 'uploaded_at', 'total_equipment', 
                   'avg_flowrate', 'avg_pressure', 'avg_temperature', 
-                  'type_distribution', 'records']
+                  'type_distribution', 'parameter_columns', 'categorical_columns',
+                  'parameter_averages', 'records']
+
+
+class IngestionSpanSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = IngestionSpan
+        fields = ['phase', 'wall_ms', 'calls', 'rows', 'bytes', 'memory_delta_mb']
+
+
+class IngestionJobMemberSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = IngestionJob
+        fields = ['id', 'filename', 'archive_member', 'status', 'phase', 'bytes_total',
+                  'rows_parsed', 'rows_persisted', 'dataset', 'error', 'coercion_report']
+
+
+class IngestionJobSerializer(serializers.ModelSerializer):
+    members = IngestionJobMemberSerializer(many=True, read_only=True)
+    spans = IngestionSpanSerializer(many=True, read_only=True)
+    
+    class Meta:
+        model = IngestionJob
+        fields = ['id', 'filename', 'status', 'phase', 'bytes_total',
+                  'rows_parsed', 'rows_persisted', 'dataset', 'append_to', 'error',
+                  'bad_value_policy', 'coercion_report', 'members', 'spans',
+                  'created_at', 'started_at', 'finished_at']
+
+
+class ChunkedUploadSerializer(serializers.ModelSerializer):
+    received_chunks = serializers.SerializerMethodField()
+    
+    class Meta:
+        model = ChunkedUpload
+        fields = ['id', 'filename', 'total_size', 'chunk_size', 'total_chunks',
+                  'received_chunks', 'status', 'job', 'created_at']
+    
+    def get_received_chunks(self, obj):
+        return ChunkedUploadService.received_chunks(obj)
 
 
 class UserRegistrationSerializer(serializers.ModelSerializer):
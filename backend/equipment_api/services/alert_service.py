@@ -1,87 +1,246 @@
 """Alert service for threshold checking and equipment alerts"""
-from equipment_api.models import EquipmentThreshold, EquipmentRecord
+import operator
+from functools import reduce
+
+import numpy as np
+import pandas as pd
+from django.db.models import Count, Q
+
+from equipment_api.models import EquipmentDataset, EquipmentRecord, EquipmentThreshold
+from .columnar_store import load_columns, load_parameters
+from .rules import Rule, columns_for, user_rules
 
 
 class AlertService:
     """Handle equipment alert logic"""
-    
+
+    # threshold attribute, comparison, level and message per rule, in the
+    # order a single threshold is checked
+    RULES = [
+        ('critical_threshold', 'above', 'critical', '{name} critically high: {value}'),
+        ('warning_threshold', 'above', 'warning', '{name} warning: {value}'),
+        ('min_value', 'below', 'warning', '{name} below minimum: {value}'),
+        ('max_value', 'above', 'warning', '{name} above maximum: {value}'),
+    ]
+
+    MEASUREMENTS = ['flowrate', 'pressure', 'temperature']
+
+    # changed records are written with one UPDATE per level per chunk
+    UPDATE_CHUNK = 10000
+
     @staticmethod
     def check_alerts(dataset, user):
-        """Check all equipment records against user thresholds"""
-        thresholds = EquipmentThreshold.objects.filter(user=user)
+        """
+        Check all equipment records against user thresholds and rules
+        Evaluated as whole columns; records whose alert state changed are
+        written back with one UPDATE per level
+        """
+        columns, rules, fired, _ = AlertService._classify(dataset, AlertService.rules_for(user.id))
+
         alerts = []
-        
-        for record in dataset.records.all():
-            alert_info = AlertService._check_record(record, thresholds)
-            if alert_info:
-                alerts.append(alert_info)
-                # Update record alert status
-                record.has_alert = True
-                record.alert_level = alert_info['level']
-                record.save()
-        
+        for position in np.flatnonzero(fired >= 0).tolist():
+            rule = rules[fired[position]]
+            values = columns.get(rule.parameter)
+            value = values[position].item() if values is not None else None
+            alert = {
+                'record_id': columns['id'][position].item(),
+                'equipment_name': columns['equipment_name'][position],
+                'parameter': rule.parameter,
+                'value': value,
+                'threshold': rule.threshold,
+                'level': rule.level,
+                'message': rule.describe(value)
+            }
+            if rule.user_defined:
+                alert['rule'] = rule.text
+            alerts.append(alert)
+
         return alerts
-    
+
+    @staticmethod
+    def recheck_user(user):
+        """
+        Re-classify every dataset of the user, e.g. after a rule changed
+        Returns: number of records whose alert level changed
+        """
+        rules = AlertService.rules_for(user.id)
+        return sum(
+            AlertService._classify(dataset, rules)[3]
+            for dataset in EquipmentDataset.objects.filter(user=user, is_ready=True)
+        )
+
+    @staticmethod
+    def _classify(dataset, rules):
+        """Returns: (columns, rules, fired, number of records whose level changed)"""
+        columns = AlertService.dataset_columns(dataset, rules, ['id', 'equipment_name', 'alert_level'])
+        fired = AlertService.evaluate(columns, rules, len(columns['id']))
+        levels = AlertService.levels(rules, fired)
+        changed = AlertService._save_levels(dataset.records, columns['id'], columns['alert_level'], levels)
+        return columns, rules, fired, changed
+
+    @staticmethod
+    def thresholds_for(user_id):
+        """A user's thresholds in evaluation order"""
+        return list(EquipmentThreshold.objects.filter(user_id=user_id).order_by('id'))
+
     @staticmethod
-    def _check_record(record, thresholds):
-        """Check single record against thresholds"""
-        for threshold in thresholds:
-            param_value = getattr(record, threshold.parameter)
-            
-            # Check critical threshold
-            if threshold.critical_threshold and param_value > threshold.critical_threshold:
-                return {
-                    'equipment_name': record.equipment_name,
-                    'parameter': threshold.parameter,
-                    'value': param_value,
-                    'threshold': threshold.critical_threshold,
-                    'level': 'critical',
-                    'message': f'{threshold.parameter.title()} critically high: {param_value}'
-                }
-            
-            # Check warning threshold
-            if threshold.warning_threshold and param_value > threshold.warning_threshold:
-                return {
-                    'equipment_name': record.equipment_name,
-                    'parameter': threshold.parameter,
-                    'value': param_value,
-                    'threshold': threshold.warning_threshold,
-                    'level': 'warning',
-                    'message': f'{threshold.parameter.title()} warning: {param_value}'
-                }
-            
-            # Check min/max bounds
-            if threshold.min_value and param_value < threshold.min_value:
-                return {
-                    'equipment_name': record.equipment_name,
-                    'parameter': threshold.parameter,
-                    'value': param_value,
-                    'threshold': threshold.min_value,
-                    'level': 'warning',
-                    'message': f'{threshold.parameter.title()} below minimum: {param_value}'
-                }
-            
-            if threshold.max_value and param_value > threshold.max_value:
-                return {
-                    'equipment_name': record.equipment_name,
-                    'parameter': threshold.parameter,
-                    'value': param_value,
-                    'threshold': threshold.max_value,
-                    'level': 'warning',
-                    'message': f'{threshold.parameter.title()} above maximum: {param_value}'
-                }
-        
-        return None
-    
+    def rules_for(user_id):
+        """
+        Compiled alert rules in precedence order: each threshold's limits
+        (in RULES order, unset or zero limits skipped), then the user's
+        critical/warning rule expressions
+        """
+        rules = [
+            Rule.for_limit(
+                threshold.parameter, comparison, getattr(threshold, attribute), level,
+                message.replace('{name}', threshold.parameter.title())
+            )
+            for threshold in AlertService.thresholds_for(user_id)
+            for attribute, comparison, level, message in AlertService.RULES
+            if getattr(threshold, attribute)
+        ]
+        return rules + user_rules(user_id, levels=['critical', 'warning'])
+
+    @staticmethod
+    def known_columns(user):
+        """Columns a user's rules can read: measurements and their uploads' parameter columns"""
+        known = set(AlertService.MEASUREMENTS)
+        for names in EquipmentDataset.objects.filter(user=user).values_list('parameter_columns', flat=True):
+            known.update(name.lower() for name in names or [])
+        return known
+
+    @staticmethod
+    def dataset_columns(dataset, rules, fields):
+        """Stored fields plus every column the rules read, lowercase names"""
+        needed = columns_for(rules)
+        columns = load_columns(dataset, fields + [name for name in needed if name in AlertService.MEASUREMENTS])
+        if set(needed) - set(AlertService.MEASUREMENTS):
+            for name, values in load_parameters(dataset).items():
+                columns.setdefault(name.lower(), values)
+        return columns
+
+    @staticmethod
+    def batch_levels(df, rules):
+        """Alert level per row of a parsed CSV batch, for ingest"""
+        if not rules:
+            return np.full(len(df), 'normal', dtype=object)
+        # CSV column -> rule name, e.g. 'Flowrate' -> 'flowrate'
+        needed = set(columns_for(rules))
+        columns = {
+            column.lower(): df[column].to_numpy(dtype='float64')
+            for column in df.columns
+            if column.lower() in needed and pd.api.types.is_numeric_dtype(df[column])
+        }
+        return AlertService.levels(rules, AlertService.evaluate(columns, rules, len(df)))
+
+    @staticmethod
+    def evaluate(columns, rules, size):
+        """
+        First matching rule per record, one vectorized mask per rule
+        Missing values never match.
+        Returns: each record's index into rules, -1 for none
+        """
+        fired = np.full(size, -1, dtype=np.int64)
+        for index, rule in enumerate(rules):
+            fired[rule.matches(columns, size) & (fired < 0)] = index
+        return fired
+
+    @staticmethod
+    def levels(rules, fired):
+        """Alert level per record ('normal' where no rule fired)"""
+        names = np.array([rule.level for rule in rules] + ['normal'], dtype=object)
+        # -1 indexes the trailing 'normal'
+        return names[fired]
+
+    @staticmethod
+    def _save_levels(records, ids, current, levels):
+        """Persist only records whose level changed, one UPDATE per level"""
+        changed = current != levels
+        for level in np.unique(levels[changed]).tolist():
+            level_ids = ids[changed & (levels == level)].tolist()
+            for start in range(0, len(level_ids), AlertService.UPDATE_CHUNK):
+                records.filter(id__in=level_ids[start:start + AlertService.UPDATE_CHUNK]).update(
+                    has_alert=level != 'normal', alert_level=level
+                )
+        return int(changed.sum())
+
+    @staticmethod
+    def reevaluate(user, parameter, previous=None):
+        """
+        Re-classify the user's records after one parameter's threshold changed
+        Only records whose value lies between an old and a new limit can
+        match a rule differently, so only those are read (a range query on
+        the (dataset, parameter) index) and re-evaluated against all of
+        the user's thresholds and rules. Rules reading parameter columns
+        need whole datasets, so the datasets of those records are
+        re-checked instead.
+        previous: {attribute: value} of the threshold before the change,
+                  None if it was just created
+        Returns: number of records whose alert level changed
+        """
+        current = EquipmentThreshold.objects.filter(user=user, parameter=parameter).first()
+
+        ranges = []
+        for attribute, comparison, _, _ in AlertService.RULES:
+            old = (previous or {}).get(attribute) or None
+            new = (getattr(current, attribute) if current else None) or None
+            if old != new:
+                ranges.append(AlertService._flip_range(parameter, comparison, old, new))
+        if not ranges:
+            return 0
+
+        rules = AlertService.rules_for(user.id)
+        records = EquipmentRecord.objects.filter(dataset__user=user).filter(reduce(operator.or_, ranges))
+
+        if set(columns_for(rules)) - set(AlertService.MEASUREMENTS):
+            dataset_ids = records.values_list('dataset_id', flat=True).distinct()
+            return sum(
+                AlertService._classify(dataset, rules)[3]
+                for dataset in EquipmentDataset.objects.filter(id__in=list(dataset_ids))
+            )
+
+        parameters = sorted(set(columns_for(rules)) | {parameter})
+        rows = list(records.values_list('id', 'alert_level', *parameters))
+        if not rows:
+            return 0
+
+        values = list(zip(*rows))
+        columns = {name: np.array(column, dtype='float64') for name, column in zip(parameters, values[2:])}
+        levels = AlertService.levels(rules, AlertService.evaluate(columns, rules, len(rows)))
+        return AlertService._save_levels(
+            EquipmentRecord.objects.filter(dataset__user=user),
+            np.array(values[0], dtype='int64'), np.array(values[1], dtype=object), levels
+        )
+
+    @staticmethod
+    def _flip_range(parameter, comparison, old, new):
+        """Values whose match of one rule differs between limit old and new (None = unset)"""
+        if old is None or new is None:
+            # rule added or removed: everything it matches
+            limit = new if old is None else old
+            return Q(**{f'{parameter}__gt' if comparison == 'above' else f'{parameter}__lt': limit})
+        low, high = sorted([old, new])
+        if comparison == 'above':
+            return Q(**{f'{parameter}__gt': low, f'{parameter}__lte': high})
+        return Q(**{f'{parameter}__gte': low, f'{parameter}__lt': high})
+
     @staticmethod
     def get_alert_summary(dataset):
-        """Get summary of alerts for a dataset"""
-        records = dataset.records.all()
-        total = records.count()
-        critical = records.filter(alert_level='critical').count()
-        warning = records.filter(alert_level='warning').count()
-        normal = records.filter(alert_level='normal').count()
-        
+        """
+        Get summary of alerts for a dataset
+        One conditional-aggregation query over the (dataset, alert_level) index
+        """
+        counts = dataset.records.aggregate(
+            total=Count('id'),
+            critical=Count('id', filter=Q(alert_level='critical')),
+            warning=Count('id', filter=Q(alert_level='warning')),
+            normal=Count('id', filter=Q(alert_level='normal'))
+        )
+        total = counts['total']
+        critical = counts['critical']
+        warning = counts['warning']
+        normal = counts['normal']
+
         return {
             'total_equipment': total,
             'critical_alerts': critical,
@@ -0,0 +1,110 @@
+"""Versioned cache for derived analytics results"""
+import pickle
+import threading
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models import Count, Max
+
+from equipment_api.models import AlertRule, EquipmentThreshold
+
+
+class AnalyticsCache:
+    """
+    Cache in front of the per-dataset analytics services.
+
+    Keys carry everything a result depends on: the dataset id and version
+    (bumped when records change), the user's threshold version for
+    threshold-dependent results, and a per-kind service version to bump
+    when a service's output changes. Nothing is deleted on change; old
+    keys just stop being asked for and are evicted least recently used.
+
+    Results are stored pickled, so the size check measures the payload
+    that is written. Hit/miss counters are kept in process memory, out of
+    reach of eviction and off the cache's write path.
+    """
+
+    ALIAS = 'analytics'
+    COUNTERS = ['hits', 'misses', 'oversized']
+
+    _counts = Counter()
+    _counts_lock = threading.Lock()
+
+    # bump a kind's version when its service output changes
+    SERVICE_VERSIONS = {
+        'health': 1,
+        'chart_data': 1,
+        'validation': 1,
+        'predictions': 1,
+        'alerts': 1,
+        'root_causes': 1,
+    }
+
+    @staticmethod
+    def cache():
+        return caches[AnalyticsCache.ALIAS]
+
+    @staticmethod
+    def threshold_version(user):
+        """Changes whenever one of the user's thresholds or rules is added, changed or removed"""
+        parts = []
+        for model in (EquipmentThreshold, AlertRule):
+            state = model.objects.filter(user=user).aggregate(count=Count('id'), latest=Max('updated_at'))
+            latest = state['latest'].timestamp() if state['latest'] else 0
+            parts.append(f"{state['count']}.{latest}")
+        return '-'.join(parts)
+
+    @staticmethod
+    def key(kind, dataset, user=None):
+        parts = [
+            'analytics', 'pickled', kind, f'v{AnalyticsCache.SERVICE_VERSIONS[kind]}',
+            str(dataset.id), str(dataset.version)
+        ]
+        if user is not None:
+            parts.append(AnalyticsCache.threshold_version(user))
+        return ':'.join(parts)
+
+    @staticmethod
+    def get_or_compute(kind, dataset, compute, user=None):
+        """
+        Cached result of compute() for this dataset state
+        Pass user for results that depend on the user's thresholds
+        """
+        cache = AnalyticsCache.cache()
+        key = AnalyticsCache.key(kind, dataset, user)
+
+        missing = object()
+        payload = cache.get(key, missing)
+        if payload is not missing:
+            AnalyticsCache._count(kind, 'hits')
+            return pickle.loads(payload)
+
+        AnalyticsCache._count(kind, 'misses')
+        value = compute()
+        payload = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        # results too big for the cache are served but not stored
+        if len(payload) <= settings.ANALYTICS_CACHE_MAX_ITEM_BYTES:
+            cache.set(key, payload)
+        else:
+            AnalyticsCache._count(kind, 'oversized')
+        return value
+
+    @staticmethod
+    def _count(kind, counter):
+        with AnalyticsCache._counts_lock:
+            AnalyticsCache._counts[kind, counter] += 1
+
+    @staticmethod
+    def stats():
+        """Hit/miss counters per kind, for this process since it started"""
+        with AnalyticsCache._counts_lock:
+            counts = dict(AnalyticsCache._counts)
+
+        result = {}
+        for kind in AnalyticsCache.SERVICE_VERSIONS:
+            kind_stats = {counter: counts.get((kind, counter), 0) for counter in AnalyticsCache.COUNTERS}
+            lookups = kind_stats['hits'] + kind_stats['misses']
+            kind_stats['hit_rate'] = round(kind_stats['hits'] / lookups, 3) if lookups else None
+            result[kind] = kind_stats
+        return result
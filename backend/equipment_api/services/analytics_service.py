@@ -1,6 +1,150 @@
+from collections import Counter
+
+import numpy as np
+import pandas as pd
+from django.db.models import Count, Sum
+
+from equipment_api.models import EquipmentDataset
+from .columnar_store import load_columns
+from .csv_processor import CSVProcessor
+from .parameters import ParameterColumns
+from .rules import parse_rule
+
+
+def type_counts(types):
+    """Rows per equipment type, without unused categories of a categorical column"""
+    counts = types.value_counts()
+    return counts[counts > 0].to_dict()
+
+
+class RunningSummary:
+    """
+    Accumulate summary stats across DataFrame batches
+    Sums and counts are kept on the dataset (summary_state) so later
+    appends can continue from them without rescanning records
+    """
+    
+    NUMERIC_COLUMNS = {
+        'Flowrate': 'avg_flowrate',
+        'Pressure': 'avg_pressure',
+        'Temperature': 'avg_temperature',
+    }
+    FIELDS = {
+        'Flowrate': 'flowrate',
+        'Pressure': 'pressure',
+        'Temperature': 'temperature',
+    }
+    
+    def __init__(self, parameter_columns=None):
+        self.total = 0
+        self.sums = {col: 0.0 for col in self.NUMERIC_COLUMNS}
+        self.counts = {col: 0 for col in self.NUMERIC_COLUMNS}
+        self.types = Counter()
+        
+        # dynamic sensor columns, tracked the same way
+        self.parameter_columns = list(parameter_columns or [])
+        self.parameter_sums = {col: 0.0 for col in self.parameter_columns}
+        self.parameter_counts = {col: 0 for col in self.parameter_columns}
+    
+    @classmethod
+    def from_dataset(cls, dataset):
+        """Resume from a stored dataset's running totals"""
+        running = cls(dataset.parameter_columns)
+        running.total = dataset.total_equipment
+        running.types.update(dataset.type_distribution or {})
+        
+        state = dataset.summary_state or {}
+        if state.get('sums') and state.get('counts'):
+            running.sums.update(state['sums'])
+            running.counts.update(state['counts'])
+            running.parameter_sums.update(state.get('parameter_sums', {}))
+            running.parameter_counts.update(state.get('parameter_counts', {}))
+            return running
+        
+        # datasets ingested before summary_state existed: one aggregate query
+        aggregates = {}
+        for col, field in cls.FIELDS.items():
+            aggregates[f'{col}_sum'] = Sum(field)
+            aggregates[f'{col}_count'] = Count(field)
+        values = dataset.records.aggregate(**aggregates)
+        for col in cls.NUMERIC_COLUMNS:
+            running.sums[col] = float(values[f'{col}_sum'] or 0.0)
+            running.counts[col] = int(values[f'{col}_count'] or 0)
+        return running
+    
+    def update(self, df):
+        """Fold one batch into the running totals"""
+        self.total += len(df)
+        
+        # one vectorized pass over core and parameter columns
+        columns = list(self.NUMERIC_COLUMNS) + self.parameter_columns
+        values = df.reindex(columns=columns)
+        sums = values.sum().to_dict()
+        counts = values.count().to_dict()
+        for col in self.NUMERIC_COLUMNS:
+            self.sums[col] += float(sums[col])
+            self.counts[col] += int(counts[col])
+        for col in self.parameter_columns:
+            self.parameter_sums[col] += float(sums[col])
+            self.parameter_counts[col] += int(counts[col])
+        self.types.update(type_counts(df['Type']))
+    
+    def as_summary(self):
+        """Same shape as AnalyticsService.calculate_summary"""
+        summary = {'total_equipment': self.total}
+        for col, key in self.NUMERIC_COLUMNS.items():
+            count = self.counts[col]
+            summary[key] = round(self.sums[col] / count, 2) if count else None
+        summary['type_distribution'] = dict(self.types.most_common())
+        summary['parameter_averages'] = {
+            col: round(self.parameter_sums[col] / count, 2) if count else None
+            for col, count in self.parameter_counts.items()
+        }
+        return summary
+    
+    def state(self):
+        """Sums and counts to store as the dataset's summary_state"""
+        return {
+            'sums': dict(self.sums),
+            'counts': dict(self.counts),
+            'parameter_sums': dict(self.parameter_sums),
+            'parameter_counts': dict(self.parameter_counts),
+        }
+    
+    def apply(self, dataset):
+        """Copy the summary onto a dataset (not saved)"""
+        for key, value in self.as_summary().items():
+            setattr(dataset, key, value)
+        dataset.summary_state = self.state()
+
+
 class AnalyticsService:
     """Calculate summary statistics from equipment data"""
     
+    # fields of a health analysis row, in response order
+    HEALTH_FIELDS = [
+        'id', 'name', 'type', 'health_score', 'status',
+        'power_index', 'flowrate', 'pressure', 'temperature'
+    ]
+    HEALTH_STATUSES = ['Good', 'Warning', 'Critical']
+    HEALTH_ORDERINGS = {'health_score': 'asc', 'power_index': 'desc'}
+    
+    # built-in root cause rules, after the user's own (services/rules.py)
+    ROOT_CAUSE_RULES = [
+        # High Pressure Logic
+        'pressure > 18 => warning "Excessive system pressure detected (Potential Blockage)"',
+        'pressure > 18 and temperature > 50 => critical "Co-occurring thermal spike indicates pump overheating"',
+        # Low Flow Logic
+        'flowrate < 100 => warning "Low flowrate indicates potential leak or valve failure"',
+        # High Temp Logic
+        'temperature > 80 => critical "Critical thermal threshold exceeded (Coolant Failure)"',
+    ]
+    # only for records no rule above explains
+    BASELINE_RULES = [
+        'true => info "Deviation from historical baseline detected"',
+        'pressure > 10 => info "Pressure variance observed"',
+    ]
+    
     def calculate_summary(self, df):
         """
         Calculate averages and type distribution
@@ -11,100 +155,253 @@ class AnalyticsService:
             'avg_flowrate': round(df['Flowrate'].mean(), 2),
             'avg_pressure': round(df['Pressure'].mean(), 2),
             'avg_temperature': round(df['Temperature'].mean(), 2),
-            'type_distribution': df['Type'].value_counts().to_dict()
+            'type_distribution': type_counts(df['Type']),
+            'parameter_averages': self.parameter_averages(df)
         }
         
         return summary
     
+    @staticmethod
+    def parameter_averages(df):
+        """Mean of every numeric extra column in one vectorized pass"""
+        columns, _ = ParameterColumns.discover(df, CSVProcessor.REQUIRED_COLUMNS)
+        means = df[columns].mean().round(2)
+        return {col: None if pd.isna(value) else float(value) for col, value in means.items()}
+    
     def prepare_chart_data(self, dataset):
         """Prepare data for frontend charts"""
-        records = dataset.records.all()
+        columns = load_columns(dataset, ['equipment_name', 'temperature', 'pressure'])
+        names = columns['equipment_name'].tolist()
         
         # data for charts
         chart_data = {
             'type_distribution': dataset.type_distribution,
             'temperature_data': [
-                {'name': r.equipment_name, 'value': r.temperature} 
-                for r in records
+                {'name': name, 'value': value} 
+                for name, value in zip(names, self._nullable(columns['temperature']))
             ],
             'pressure_data': [
-                {'name': r.equipment_name, 'value': r.pressure} 
-                for r in records
+                {'name': name, 'value': value} 
+                for name, value in zip(names, self._nullable(columns['pressure']))
             ],
         }
         
         return chart_data
     
     def analyze_health(self, dataset):
-        """"
+        """
         Calculate health scores and power efficiency
+        Sorted by health score, riskiest first
+        """
+        health = self.health_arrays(dataset)
+        # stable, so equal scores keep record order
+        order = np.argsort(health['health_score'], kind='stable')
+        return self.health_rows(health, order)
+    
+    def query_health(self, dataset, order_by='health_score', limit=None, offset=0, status=None, fields=None,
+                     health=None):
+        """
+        One page of the health analysis
+        order_by: 'health_score' (riskiest first) or 'power_index' (highest first)
+        status: list of statuses to keep; fields: list of HEALTH_FIELDS to return
+        health: precomputed health_arrays(dataset), e.g. from the cache
+        Returns: (total matching records, rows)
         """
-        records = dataset.records.all()
-        analysis = []
+        if order_by not in self.HEALTH_ORDERINGS:
+            raise ValueError(f"order_by must be one of: {', '.join(self.HEALTH_ORDERINGS)}")
+        unknown = set(fields or []) - set(self.HEALTH_FIELDS)
+        if unknown:
+            raise ValueError(f"Unknown fields: {', '.join(sorted(unknown))}")
+        unknown = set(status or []) - set(self.HEALTH_STATUSES)
+        if unknown:
+            raise ValueError(f"Unknown status: {', '.join(sorted(unknown))}")
+        
+        if health is None:
+            health = self.health_arrays(dataset)
+        positions = np.arange(len(health['id']))
+        if status:
+            positions = np.flatnonzero(np.isin(health['status'], status))
+        
+        key = health[order_by][positions].astype(float)
+        if self.HEALTH_ORDERINGS[order_by] == 'desc':
+            key = -key
+        # missing values sort last either way
+        key[np.isnan(key)] = np.inf
+        
+        stop = None if limit is None else offset + limit
+        order = positions[self.smallest(key, stop)][offset:stop]
+        return len(positions), self.health_rows(health, order, fields)
+    
+    @staticmethod
+    def smallest(key, k=None):
+        """
+        Positions of the k smallest keys, in the order a stable sort gives
+        Uses partial selection (argpartition), so a top-k is O(n) + O(k log k)
+        """
+        if k is None or k >= len(key):
+            return np.argsort(key, kind='stable')
+        if k <= 0:
+            return np.empty(0, dtype=np.intp)
+        
+        kth = key[np.argpartition(key, k - 1)[k - 1]]
+        # argpartition picks ties at the boundary arbitrarily, take the earliest ones
+        below = np.flatnonzero(key < kth)
+        ties = np.flatnonzero(key == kth)[:k - len(below)]
+        chosen = np.concatenate([below, ties])
+        return chosen[np.argsort(key[chosen], kind='stable')]
+    
+    def health_arrays(self, dataset):
+        """
+        Health score, status and power index for every record, computed
+        as whole-array operations over the stored columns
+        Returns: dict of numpy arrays in record (id) order
+        """
+        health = load_columns(dataset, [
+            'id', 'equipment_name', 'equipment_type', 'flowrate', 'pressure', 'temperature'
+        ])
+        flowrate = health['flowrate']
+        pressure = health['pressure']
+        temperature = health['temperature']
         
         # Calculate dataset averages (baselines)
         avg_flow = dataset.avg_flowrate or 1
         avg_press = dataset.avg_pressure or 1
         avg_temp = dataset.avg_temperature or 1
         
-        for r in records:
-            # 1. Hydraulic Power Calculation (Flow * Pressure proxy)
-            # Higher is not necessarily 'better' or 'worse', but indicates load
-            power_index = r.flowrate * r.pressure
-            
-            # 2. Health Score Calculation
-            # 100 - average deviation % of all parameters
-            # Lower deviation = Higher Health
-            
-            flow_dev = abs(r.flowrate - avg_flow) / avg_flow
-            press_dev = abs(r.pressure - avg_press) / avg_press
-            temp_dev = abs(r.temperature - avg_temp) / avg_temp
-            
-            avg_dev = (flow_dev + press_dev + temp_dev) / 3
-            health_score = max(0, 100 - (avg_dev * 100)) # Simple 0-100 score
-            
-            status = 'Good'
-            if health_score < 70: status = 'Warning'
-            if health_score < 50: status = 'Critical'
-            
-            analysis.append({
-                'id': r.id,
-                'name': r.equipment_name,
-                'type': r.equipment_type,
-                'health_score': round(health_score, 1),
-                'status': status,
-                'power_index': round(power_index, 2),
-                'flowrate': r.flowrate,
-                'pressure': r.pressure,
-                'temperature': r.temperature
-            })
-            
-        return sorted(analysis, key=lambda x: x['health_score']) # Sort by lowest health (riskiest first)
+        # 1. Hydraulic Power Calculation (Flow * Pressure proxy)
+        # Higher is not necessarily 'better' or 'worse', but indicates load
+        health['power_index'] = flowrate * pressure
+        
+        # 2. Health Score Calculation
+        # 100 - average deviation % of all parameters
+        # Lower deviation = Higher Health
+        flow_dev = np.abs(flowrate - avg_flow) / avg_flow
+        press_dev = np.abs(pressure - avg_press) / avg_press
+        temp_dev = np.abs(temperature - avg_temp) / avg_temp
+        
+        avg_dev = (flow_dev + press_dev + temp_dev) / 3
+        score = 100 - (avg_dev * 100)
+        
+        # Simple 0-100 score; missing values (NaN) score 0 as well
+        positive = score > 0
+        score = np.where(positive, score, 0.0)
+        health['positive'] = positive
+        
+        health['status'] = np.where(
+            score < 50, 'Critical', np.where(score < 70, 'Warning', 'Good')
+        ).astype(object)
+        
+        # python's round() per value, np.round can differ on ties
+        health['health_score'] = np.array([round(value, 1) for value in score.tolist()])
+        return health
+    
+    @staticmethod
+    def health_rows(health, order, fields=None):
+        """Result dicts for the records at the given positions, optionally only some fields"""
+        fields = fields or AnalyticsService.HEALTH_FIELDS
+        columns = [AnalyticsService._health_column(health, field, order) for field in fields]
+        return [dict(zip(fields, values)) for values in zip(*columns)]
+    
+    @staticmethod
+    def _health_column(health, field, order):
+        if field == 'health_score':
+            # an int 0 for non-positive scores, as max(0, score) gave
+            return [
+                score if positive else 0
+                for score, positive in zip(health['health_score'][order].tolist(), health['positive'][order].tolist())
+            ]
+        if field == 'power_index':
+            return [None if value != value else round(value, 2) for value in health['power_index'][order].tolist()]
+        if field in ('flowrate', 'pressure', 'temperature'):
+            return AnalyticsService._nullable(health[field][order])
+        source = {'name': 'equipment_name', 'type': 'equipment_type'}.get(field, field)
+        return health[source][order].tolist()
+
+    @staticmethod
+    def _nullable(values):
+        """numpy floats -> python floats with NaN as None"""
+        return [None if v != v else v for v in values.tolist()]
 
-    def analyze_root_cause(self, record):
+    def analyze_root_cause(self, record, rules=None):
         """
         AI-driven root cause analysis (simulated but logic-backed)
+        record: anything with flowrate, pressure and temperature attributes
+        rules: the user's compiled rules, checked before the built-in ones
+        """
+        columns = {
+            name: np.array([getattr(record, name)], dtype='float64')
+            for name in ['flowrate', 'pressure', 'temperature']
+        }
+        return self.root_causes(columns, 1, rules)[0]
+    
+    def diagnose(self, records, rules=None):
+        """
+        Root causes for a queryset of records in one query
+        Parameter columns are decoded only if a rule reads them
+        Returns: list of {'id', 'equipment_name', 'alert_level', 'causes'} in id order
         """
-        causes = []
+        measurements = ['flowrate', 'pressure', 'temperature']
+        needed = {name for rule in rules or [] for name in rule.identifiers} - set(measurements)
+        fields = ['id', 'dataset_id', 'equipment_name', 'alert_level'] + measurements
+        if needed:
+            fields.append('parameter_values')
         
-        # High Pressure Logic
-        if record.pressure > 18:
-            causes.append("Excessive system pressure detected (Potential Blockage)")
-            if record.temperature > 50:
-                causes.append("Co-occurring thermal spike indicates pump overheating")
+        rows = list(records.order_by('id').values_list(*fields))
+        if not rows:
+            return []
+        values = dict(zip(fields, zip(*rows)))
+        columns = {name: np.array(values[name], dtype='float64') for name in measurements}
         
-        # Low Flow Logic
-        if record.flowrate < 100:
-            causes.append("Low flowrate indicates potential leak or valve failure")
+        if needed:
+            self._add_parameters(columns, np.array(values['dataset_id']), values['parameter_values'], needed)
         
-        # High Temp Logic
-        if record.temperature > 80:
-            causes.append("Critical thermal threshold exceeded (Coolant Failure)")
-            
+        causes = self.root_causes(columns, len(rows), rules)
+        return [
+            {'id': record_id, 'equipment_name': name, 'alert_level': level, 'causes': record_causes}
+            for record_id, name, level, record_causes
+            in zip(values['id'], values['equipment_name'], values['alert_level'], causes)
+        ]
+    
+    @staticmethod
+    def _add_parameters(columns, dataset_ids, blobs, needed):
+        """Decode the needed parameter columns, one buffer per dataset (layouts differ)"""
+        size = len(dataset_ids)
+        layouts = dict(
+            EquipmentDataset.objects.filter(id__in=set(dataset_ids.tolist()))
+            .values_list('id', 'parameter_columns')
+        )
+        for dataset_id, names in layouts.items():
+            names = [name.lower() for name in names or []]
+            if not set(names) & needed:
+                continue
+            positions = np.flatnonzero(dataset_ids == dataset_id)
+            decoded = ParameterColumns.unpack_many([blobs[position] for position in positions], len(names))
+            for index, name in enumerate(names):
+                if name in needed:
+                    columns.setdefault(name, np.full(size, np.nan))[positions] = decoded[:, index]
+    
+    def root_causes(self, columns, size, rules=None):
+        """
+        Causes for many records at once, one vectorized mask per rule
+        columns: {name: array of size values}
+        Returns: list of cause lists, one per record
+        """
+        rules = list(rules or []) + [parse_rule(text) for text in self.ROOT_CAUSE_RULES]
+        baseline = [parse_rule(text) for text in self.BASELINE_RULES]
+        
+        matched = np.zeros((len(rules) + len(baseline), size), dtype=bool)
+        for index, rule in enumerate(rules):
+            matched[index] = rule.matches(columns, size)
         # Default if no specific logic hits but alert triggered
-        if not causes:
-            causes.append("Deviation from historical baseline detected")
-            if record.pressure > 10:
-                causes.append("Pressure variance observed")
-                
+        unexplained = ~matched[:len(rules)].any(axis=0)
+        for index, rule in enumerate(baseline, start=len(rules)):
+            matched[index] = rule.matches(columns, size) & unexplained
+        
+        rules += baseline
+        causes = [[] for _ in range(size)]
+        # nonzero on the transpose walks records in order, rules in order within each
+        for position, index in zip(*np.nonzero(matched.T)):
+            rule = rules[index]
+            values = columns.get(rule.parameter)
+            causes[position].append(rule.describe(None if values is None else values[position].item()))
         return causes
@@ -0,0 +1,211 @@
+"""Parallel multi-file ingestion for batch uploads"""
+import os
+import shutil
+import tempfile
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+
+from .compression import CompressionService
+
+
+def setup_worker():
+    """
+    Pool initializer: load the app registry in a spawned child (macOS and
+    Windows), where nothing of the parent's Django is inherited. Model
+    modules are imported lazily below, after this has run.
+    """
+    from django.apps import apps
+    if not apps.ready:
+        import django
+        django.setup()
+
+
+def parse_csv_file(path, member, bad_value_policy, engine):
+    """
+    Parse and summarize one CSV file (runs in a worker process)
+    Kept free of ORM access so it is safe to run outside Django's
+    connection handling; policy and engine come resolved from the parent,
+    so no settings are read here
+    member: name of the CSV inside a zip archive at path
+    Returns: (DataFrame, summary dict, coercion report dict, IngestionProfiler,
+              parse seconds)
+    """
+    from .analytics_service import AnalyticsService
+    from .csv_processor import CSVProcessor
+
+    started = time.perf_counter()
+    processor = CSVProcessor(bad_value_policy, engine)
+    if member:
+        with zipfile.ZipFile(path) as archive, archive.open(member) as f:
+            df = processor.validate_and_parse(f)
+    else:
+        with open(path, 'rb') as f:
+            df = processor.validate_and_parse(f)
+    with processor.profile.span('summary', rows=len(df)):
+        summary = AnalyticsService().calculate_summary(df)
+    return df, summary, processor.report.as_dict(), processor.profile, time.perf_counter() - started
+
+
+class BatchIngestionPipeline:
+    """
+    Parse uploaded files in parallel on a process pool (one file per core),
+    then commit each dataset through the bulk writer in the request process.
+    """
+
+    def __init__(self, user, max_workers=None, bad_value_policy=None):
+        from .csv_processor import CSVProcessor
+
+        self.user = user
+        # resolved against settings here, workers get plain values
+        processor = CSVProcessor(bad_value_policy or None)
+        self.bad_value_policy = processor.report.policy
+        self.engine = processor.engine
+        self.max_workers = max_workers or getattr(settings, 'BATCH_UPLOAD_WORKERS', None) or os.cpu_count() or 1
+
+    def run(self, files, digests=None):
+        """
+        Ingest a list of uploaded files
+        digests: sha256 per file (same order), files already ingested are reused
+        Zip archives fan out into one dataset (and result) per CSV member
+        Returns: list of per-dataset result dicts, in upload order
+        """
+        from .dedup_service import DeduplicationService
+
+        self.digests = digests or [''] * len(files)
+        results = [[] for _ in files]
+        spool_dir = tempfile.mkdtemp(prefix='batch_upload_')
+
+        try:
+            # workers read from disk, so hand every upload over as a file path
+            # tasks: (file index, path, zip member, dataset filename, digest)
+            tasks = []
+            for index, csv_file in enumerate(files):
+                if not CompressionService.is_supported(csv_file.name):
+                    results[index].append({
+                        'filename': csv_file.name,
+                        'success': False,
+                        'error': 'Not a CSV file'
+                    })
+                    continue
+
+                if CompressionService.detect(csv_file) == 'zip':
+                    path = self._spool(csv_file, spool_dir, index)
+                    tasks.extend(self._expand_archive(index, csv_file.name, path, results))
+                    continue
+
+                if CompressionService.detect(csv_file) is not None:
+                    # gzip / zstd: the digest is of the decoded CSV
+                    self.digests[index] = CompressionService.content_digest(csv_file)
+
+                existing = DeduplicationService.resolve(self.user, self.digests[index], csv_file.name)
+                if existing:
+                    results[index].append(self._deduplicated(csv_file.name, existing))
+                    continue
+
+                path = self._spool(csv_file, spool_dir, index)
+                tasks.append((index, path, None, csv_file.name, self.digests[index]))
+
+            if tasks and self._parse_and_commit(tasks, results):
+                from .retention_service import RetentionService
+                # as after a single upload: hide what the new datasets push
+                # past the retention policy, the purge runs later
+                RetentionService.mark(self.user)
+        finally:
+            shutil.rmtree(spool_dir, ignore_errors=True)
+
+        return [result for file_results in results for result in file_results]
+
+    def _expand_archive(self, index, archive_name, path, results):
+        """One parse task per CSV member not already ingested"""
+        from .dedup_service import DeduplicationService
+
+        try:
+            archive, members = CompressionService.open_archive(path)
+        except ValueError as e:
+            results[index].append({'filename': archive_name, 'success': False, 'error': str(e)})
+            return []
+
+        tasks = []
+        with archive:
+            for info in members:
+                filename = CompressionService.member_name(info)
+                digest = CompressionService.member_digest(archive, info)
+                existing = DeduplicationService.resolve(self.user, digest, filename)
+                if existing:
+                    results[index].append(self._deduplicated(filename, existing))
+                else:
+                    tasks.append((index, path, info.filename, filename, digest))
+        return tasks
+
+    @staticmethod
+    def _deduplicated(filename, dataset):
+        return {
+            'filename': filename,
+            'success': True,
+            'dataset_id': dataset.id,
+            'rows': dataset.total_equipment,
+            'deduplicated': True
+        }
+
+    def _parse_and_commit(self, tasks, results):
+        """
+        Fan parsing out to the pool and persist results as they arrive
+        Returns: number of datasets committed
+        """
+        from .ingestion_service import IngestionService
+
+        committed = 0
+        workers = min(self.max_workers, len(tasks))
+        with ProcessPoolExecutor(max_workers=workers, initializer=setup_worker) as executor:
+            futures = [
+                (task, executor.submit(parse_csv_file, task[1], task[2], self.bad_value_policy, self.engine))
+                for task in tasks
+            ]
+
+            # commit in upload order while later files are still parsing
+            for (index, _, _, filename, digest), future in futures:
+                try:
+                    df, summary, report, profile, parse_seconds = future.result()
+
+                    started = time.perf_counter()
+                    dataset = IngestionService.ingest_dataframe(
+                        self.user, filename, df, summary=summary,
+                        content_hash=digest, profile=profile
+                    )
+                    persist_seconds = time.perf_counter() - started
+                    profile.save(dataset=dataset)
+                    committed += 1
+
+                    result = {
+                        'filename': filename,
+                        'success': True,
+                        'dataset_id': dataset.id,
+                        'rows': len(df),
+                        'parse_ms': round(parse_seconds * 1000, 1),
+                        'persist_ms': round(persist_seconds * 1000, 1)
+                    }
+                    if report['bad_cells']:
+                        result['coercion_report'] = report
+                    results[index].append(result)
+                except Exception as e:
+                    results[index].append({
+                        'filename': filename,
+                        'success': False,
+                        'error': str(e)
+                    })
+        return committed
+
+    @staticmethod
+    def _spool(csv_file, spool_dir, index):
+        """Write an upload to disk unless Django already did"""
+        if hasattr(csv_file, 'temporary_file_path'):
+            return csv_file.temporary_file_path()
+
+        path = os.path.join(spool_dir, f'{index}.csv')
+        with open(path, 'wb') as out:
+            for chunk in csv_file.chunks():
+                out.write(chunk)
+        return path
@@ -1,6 +1,7 @@
 import os
 import requests
 import json
+from .alert_service import AlertService
 from .analytics_service import AnalyticsService
 from dotenv import load_dotenv
 
@@ -10,7 +11,8 @@ class ChatService:
     """Service to handle AI Chat interactions via OpenRouter"""
     
     def __init__(self):
-        self.api_key = os.getenv('OPENROUTER_API_KEY')        self.api_url = "https://openrouter.ai/api/v1/chat/completions"
+        self.api_key = os.getenv('OPENROUTER_API_KEY')
+        self.api_url = "https://openrouter.ai/api/v1/chat/completions"
         self.analytics = AnalyticsService()
 
     def get_response(self, user_message, dataset):
@@ -74,19 +76,10 @@ Keep responses concise and helpful. formatting: Markdown.
         avg_p = dataset.avg_pressure
         avg_t = dataset.avg_temperature
         
-        # Check for active alerts using database query if possible, or simple fallback
-        # records = dataset.records.all() # Optimization: don't load all if not needed
-        # But we need alerts count.
+        # alert levels are kept current at ingest, one aggregate query
+        summary = AlertService.get_alert_summary(dataset)
+        alerts_count = summary['critical_alerts'] + summary['warning_alerts']
         
-        try:
-            alerts_count = dataset.records.filter(has_alert=True).count()
-        except:
-             # Fallback if has_alert doesn't exist
-            alerts_count = 0
-            for r in dataset.records.all():
-                 if r.pressure > 20 or r.temperature > 80:
-                     alerts_count += 1
-                
         return f"""
         - Dataset: {dataset.filename}
         - Total Equipment: {total}
@@ -0,0 +1,214 @@
+"""Resumable chunked uploads spooled under MEDIA_ROOT"""
+import bisect
+import hashlib
+import io
+import math
+import os
+import shutil
+import uuid
+
+from django.conf import settings
+from django.core.files import File
+
+from equipment_api.models import ChunkedUpload
+from .compression import CompressionService
+
+
+class ChunkStream(io.RawIOBase):
+    """
+    Read spooled chunk files back as one continuous stream
+    Seekable, so zip archives can be opened without reassembling them
+    """
+
+    def __init__(self, paths):
+        self._paths = list(paths)
+        self._offsets = [0]
+        for path in self._paths:
+            self._offsets.append(self._offsets[-1] + os.path.getsize(path))
+        self._index = 0
+        self._position = 0
+        self._current = None
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self._position
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            offset += self._position
+        elif whence == io.SEEK_END:
+            offset += self._offsets[-1]
+        if offset < 0:
+            raise ValueError('Negative seek position')
+
+        self._position = offset
+        self._index = bisect.bisect_right(self._offsets, offset) - 1
+        if self._current is not None:
+            self._current.close()
+            self._current = None
+        return offset
+
+    def readinto(self, buffer):
+        while True:
+            if self._index >= len(self._paths):
+                return 0
+            if self._current is None:
+                self._current = open(self._paths[self._index], 'rb')
+                self._current.seek(self._position - self._offsets[self._index])
+
+            read = self._current.readinto(buffer)
+            if read:
+                self._position += read
+                return read
+
+            # move on to the next chunk file
+            self._current.close()
+            self._current = None
+            self._index += 1
+
+    def close(self):
+        if self._current is not None:
+            self._current.close()
+            self._current = None
+        super().close()
+
+
+class ChunkedUploadService:
+    """Handle the init / chunk / finalize upload protocol"""
+
+    DEFAULT_CHUNK_SIZE = 8 * 1024 * 1024
+    MAX_CHUNK_SIZE = 64 * 1024 * 1024
+    READ_SIZE = 64 * 1024
+
+    @staticmethod
+    def create(user, filename, total_size, chunk_size=None):
+        """Start a new upload session"""
+        chunk_size = int(chunk_size or ChunkedUploadService.DEFAULT_CHUNK_SIZE)
+        total_size = int(total_size)
+
+        if not CompressionService.is_supported(filename):
+            raise ValueError('File must be a CSV (optionally .gz, .zst or .zip)')
+        if total_size <= 0:
+            raise ValueError('total_size must be positive')
+        if not 0 < chunk_size <= ChunkedUploadService.MAX_CHUNK_SIZE:
+            raise ValueError(f'chunk_size must be between 1 and {ChunkedUploadService.MAX_CHUNK_SIZE}')
+
+        upload = ChunkedUpload.objects.create(
+            user=user,
+            filename=filename,
+            total_size=total_size,
+            chunk_size=chunk_size,
+            total_chunks=math.ceil(total_size / chunk_size)
+        )
+        os.makedirs(ChunkedUploadService.spool_dir(upload), exist_ok=True)
+        return upload
+
+    @staticmethod
+    def spool_dir(upload):
+        return os.path.join(settings.MEDIA_ROOT, 'chunked_uploads', str(upload.id))
+
+    @staticmethod
+    def chunk_path(upload, index):
+        return os.path.join(ChunkedUploadService.spool_dir(upload), f'{index:06d}.part')
+
+    @staticmethod
+    def expected_size(upload, index):
+        """Every chunk is chunk_size bytes except possibly the last"""
+        if index == upload.total_chunks - 1:
+            return upload.total_size - index * upload.chunk_size
+        return upload.chunk_size
+
+    @staticmethod
+    def received_chunks(upload):
+        """Indexes of chunks already acknowledged (the spool is the source of truth)"""
+        directory = ChunkedUploadService.spool_dir(upload)
+        if not os.path.isdir(directory):
+            return []
+        return sorted(
+            int(name.split('.')[0])
+            for name in os.listdir(directory)
+            if name.endswith('.part')
+        )
+
+    @staticmethod
+    def store_chunk(upload, index, stream, checksum):
+        """
+        Stream one chunk to disk, verifying size and sha256 checksum
+        The part file only appears once it is verified, so a dropped
+        connection never leaves a half-written chunk behind
+        """
+        if upload.status != 'uploading':
+            raise ValueError('Upload is already finalized')
+        if not 0 <= index < upload.total_chunks:
+            raise ValueError(f'Chunk index must be between 0 and {upload.total_chunks - 1}')
+        if not checksum:
+            raise ValueError('Chunk checksum is required')
+
+        path = ChunkedUploadService.chunk_path(upload, index)
+        tmp_path = f'{path}.{uuid.uuid4().hex}.tmp'
+        digest = hashlib.sha256()
+        size = 0
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        try:
+            with open(tmp_path, 'wb') as out:
+                while True:
+                    data = stream.read(ChunkedUploadService.READ_SIZE)
+                    if not data:
+                        break
+                    digest.update(data)
+                    size += len(data)
+                    out.write(data)
+
+            expected = ChunkedUploadService.expected_size(upload, index)
+            if size != expected:
+                raise ValueError(f'Chunk {index} has {size} bytes, expected {expected}')
+            if digest.hexdigest() != checksum.lower():
+                raise ValueError(f'Checksum mismatch for chunk {index}')
+
+            os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+        upload.save(update_fields=['updated_at'])
+
+    @staticmethod
+    def finalize(upload):
+        """Mark the upload complete once every chunk has arrived"""
+        if upload.status != 'uploading':
+            raise ValueError('Upload is already finalized')
+
+        received = set(ChunkedUploadService.received_chunks(upload))
+        missing = [i for i in range(upload.total_chunks) if i not in received]
+        if missing:
+            raise ValueError(f'Missing chunks: {missing[:20]}')
+
+        # conditional update so a repeated finalize cannot queue twice
+        claimed = ChunkedUpload.objects.filter(id=upload.id, status='uploading').update(status='finalized')
+        if not claimed:
+            raise ValueError('Upload is already finalized')
+
+        upload.status = 'finalized'
+        return upload
+
+    @staticmethod
+    def open_stream(upload):
+        """Expose the spooled chunks as a single uploaded-file-like object"""
+        paths = [
+            ChunkedUploadService.chunk_path(upload, index)
+            for index in range(upload.total_chunks)
+        ]
+        stream = File(io.BufferedReader(ChunkStream(paths)), name=upload.filename)
+        stream.size = upload.total_size
+        return stream
+
+    @staticmethod
+    def discard(upload):
+        """Remove the spooled chunks"""
+        shutil.rmtree(ChunkedUploadService.spool_dir(upload), ignore_errors=True)
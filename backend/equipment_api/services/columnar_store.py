@@ -0,0 +1,237 @@
+"""Optional Parquet side store for per-dataset equipment columns"""
+import os
+import shutil
+import threading
+import uuid
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+
+from .csv_processor import CSVProcessor
+from .parameters import ParameterColumns
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # optional dependency, analytics fall back to the DB
+    pa = None
+    pq = None
+
+
+class ColumnarStore:
+    """
+    Keeps each dataset's measurement columns as Parquet parts under
+    COLUMNAR_STORE_ROOT/<dataset id>/, in record insertion (id) order.
+    Alert state is mutable and stays in the relational table only.
+    """
+
+    FIELDS = ['equipment_name', 'equipment_type', 'flowrate', 'pressure', 'temperature']
+    NUMERIC_FIELDS = ['flowrate', 'pressure', 'temperature']
+
+    # dataset parameter columns are stored as float64 'param:<name>' columns
+    PARAMETER_PREFIX = 'param:'
+
+    @staticmethod
+    def enabled():
+        return pa is not None and getattr(settings, 'COLUMNAR_STORE_ENABLED', True)
+
+    @staticmethod
+    def dataset_dir(dataset_id):
+        root = getattr(settings, 'COLUMNAR_STORE_ROOT', os.path.join(settings.MEDIA_ROOT, 'columnar'))
+        return os.path.join(str(root), str(dataset_id))
+
+    @staticmethod
+    def parts(dataset_id):
+        """Committed part files in write order"""
+        directory = ColumnarStore.dataset_dir(dataset_id)
+        if not os.path.isdir(directory):
+            return []
+        return [
+            os.path.join(directory, name)
+            for name in sorted(os.listdir(directory))
+            if name.endswith('.parquet')
+        ]
+
+    @staticmethod
+    def parameter_field(name):
+        return ColumnarStore.PARAMETER_PREFIX + name
+
+    @staticmethod
+    def read(dataset, fields):
+        """
+        Read columns for a dataset from Parquet
+        Returns: dict field -> numpy array, or None if not stored
+        (including parts written before a requested column existed, or
+        parts that do not add up to the dataset's row count)
+        """
+        if not ColumnarStore.enabled():
+            return None
+
+        paths = ColumnarStore.parts(dataset.id)
+        if not paths:
+            return None
+        for path in paths:
+            if not set(fields).issubset(pq.read_schema(path).names):
+                return None
+
+        tables = [pq.read_table(path, columns=fields) for path in paths]
+        table = pa.concat_tables(tables) if len(tables) > 1 else tables[0]
+        if table.num_rows != dataset.total_equipment:
+            # out of step with the table, the caller falls back to the DB
+            return None
+        return {
+            field: ColumnarStore._to_numpy(table.column(field), field)
+            for field in fields
+        }
+
+    @staticmethod
+    def _to_numpy(column, field):
+        if field in ColumnarStore.NUMERIC_FIELDS or field.startswith(ColumnarStore.PARAMETER_PREFIX):
+            # nulls come back as NaN
+            return column.to_numpy().astype('float64')
+        return np.asarray(column.to_pylist(), dtype=object)
+
+    @staticmethod
+    def copy(source_id, target_id):
+        """Give a cloned dataset its own copy of the source's parts"""
+        source = ColumnarStore.dataset_dir(source_id)
+        if ColumnarStore.enabled() and os.path.isdir(source):
+            shutil.copytree(source, ColumnarStore.dataset_dir(target_id), dirs_exist_ok=True)
+
+    @staticmethod
+    def discard(dataset_id):
+        shutil.rmtree(ColumnarStore.dataset_dir(dataset_id), ignore_errors=True)
+
+
+class ColumnarWriter:
+    """
+    Write one Parquet part for a dataset, batch by batch
+    The part becomes visible once close() has been called and the
+    surrounding transaction commits; a no-op when the store is disabled
+    or pyarrow is not installed
+    """
+
+    # parts are numbered when published
+    _lock = threading.Lock()
+
+    SCHEMA = None if pa is None else pa.schema([
+        ('equipment_name', pa.string()),
+        ('equipment_type', pa.string()),
+        ('flowrate', pa.float64()),
+        ('pressure', pa.float64()),
+        ('temperature', pa.float64()),
+    ])
+
+    def __init__(self, dataset):
+        self.enabled = ColumnarStore.enabled()
+        self.dataset = dataset
+        self._writer = None
+        if not self.enabled:
+            return
+
+        directory = ColumnarStore.dataset_dir(dataset.id)
+        os.makedirs(directory, exist_ok=True)
+        self.tmp_path = os.path.join(directory, f'.{uuid.uuid4().hex}.tmp')
+
+    def write(self, df):
+        """Append a validated CSV batch"""
+        if not self.enabled:
+            return
+        if self._writer is None:
+            # parameter columns are known once the first batch has been seen
+            self.schema = self.SCHEMA
+            for name in self.dataset.parameter_columns:
+                self.schema = self.schema.append(pa.field(ColumnarStore.parameter_field(name), pa.float64()))
+            self._writer = pq.ParquetWriter(self.tmp_path, self.schema)
+
+        frame = CSVProcessor.to_record_frame(df)
+        parameters = ParameterColumns.matrix(df, self.dataset.parameter_columns)
+        for position, name in enumerate(self.dataset.parameter_columns):
+            frame[ColumnarStore.parameter_field(name)] = parameters[:, position]
+        table = pa.Table.from_pandas(frame, schema=self.schema, preserve_index=False)
+        self._writer.write_table(table)
+
+    def close(self):
+        """
+        Finish the part and rename it into place when the current
+        transaction commits (at once outside one), so the store never
+        holds rows the database rolled back; call abort() on rollback
+        """
+        if self._writer is None:
+            return
+        self._writer.close()
+        self._writer = None
+        transaction.on_commit(self._publish)
+
+    def _publish(self):
+        with ColumnarWriter._lock:
+            directory = ColumnarStore.dataset_dir(self.dataset.id)
+            part = len(ColumnarStore.parts(self.dataset.id))
+            os.replace(self.tmp_path, os.path.join(directory, f'part-{part:05d}.parquet'))
+
+    def abort(self):
+        """Drop the unpublished part, also after close() if the commit never came"""
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+        if self.enabled and os.path.exists(self.tmp_path):
+            os.remove(self.tmp_path)
+
+
+def load_columns(dataset, fields):
+    """
+    Columns of a dataset's records as numpy arrays, in id order
+    Served from the columnar store when present, otherwise from one
+    values_list query. 'id' always comes from the relational table.
+    """
+    stored = [field for field in fields if field != 'id']
+    columns = ColumnarStore.read(dataset, stored) if stored else {}
+
+    if columns is not None and 'id' in fields:
+        ids = np.array(list(dataset.records.order_by('id').values_list('id', flat=True)), dtype='int64')
+        if stored and len(ids) != len(columns[stored[0]]):
+            # store is out of sync with the table, trust the table
+            columns = None
+        else:
+            columns['id'] = ids
+
+    if columns is None:
+        columns = _columns_from_db(dataset, fields)
+
+    return {field: columns[field] for field in fields}
+
+
+def load_parameters(dataset):
+    """
+    A dataset's parameter columns as {name: float64 array}, in id order
+    Read from the columnar store when present, otherwise by decoding the
+    packed per-record blobs in one buffer, never via per-row JSON
+    """
+    names = list(dataset.parameter_columns or [])
+    if not names:
+        return {}
+
+    fields = [ColumnarStore.parameter_field(name) for name in names]
+    stored = ColumnarStore.read(dataset, fields)
+    if stored is not None:
+        return {name: stored[field] for name, field in zip(names, fields)}
+
+    blobs = dataset.records.order_by('id').values_list('parameter_values', flat=True)
+    values = ParameterColumns.unpack_many(list(blobs), len(names))
+    return {name: values[:, position] for position, name in enumerate(names)}
+
+
+def _columns_from_db(dataset, fields):
+    rows = list(dataset.records.order_by('id').values_list(*fields))
+    values = list(zip(*rows)) if rows else [()] * len(fields)
+
+    columns = {}
+    for field, column in zip(fields, values):
+        if field in ColumnarStore.NUMERIC_FIELDS:
+            columns[field] = np.array(column, dtype='float64')
+        elif field == 'id':
+            columns[field] = np.array(column, dtype='int64')
+        else:
+            columns[field] = np.array(column, dtype=object)
+    return columns
@@ -1,5 +1,6 @@
 """Comparison service for analyzing differences between datasets"""
 from equipment_api.models import DataComparison, EquipmentDataset
+from .columnar_store import load_columns
 
 
 class ComparisonService:
@@ -9,9 +10,9 @@ class ComparisonService:
     def compare_datasets(dataset1, dataset2, user):
         """Compare two datasets and return detailed analysis"""
         
-        # Get records from both datasets
-        records1 = {r.equipment_name: r for r in dataset1.records.all()}
-        records2 = {r.equipment_name: r for r in dataset2.records.all()}
+        # Get records from both datasets (name -> values, last row wins)
+        records1 = ComparisonService._values_by_name(dataset1)
+        records2 = ComparisonService._values_by_name(dataset2)
         
         # Find common, added, and removed equipment
         common_names = set(records1.keys()) & set(records2.keys())
@@ -26,12 +27,12 @@ class ComparisonService:
             
             diff = {
                 'equipment_name': name,
-                'flowrate_change': r2.flowrate - r1.flowrate,
-                'flowrate_percent': ((r2.flowrate - r1.flowrate) / r1.flowrate * 100) if r1.flowrate != 0 else 0,
-                'pressure_change': r2.pressure - r1.pressure,
-                'pressure_percent': ((r2.pressure - r1.pressure) / r1.pressure * 100) if r1.pressure != 0 else 0,
-                'temperature_change': r2.temperature - r1.temperature,
-                'temperature_percent': ((r2.temperature - r1.temperature) / r1.temperature * 100) if r1.temperature != 0 else 0,
+                'flowrate_change': r2['flowrate'] - r1['flowrate'],
+                'flowrate_percent': ((r2['flowrate'] - r1['flowrate']) / r1['flowrate'] * 100) if r1['flowrate'] != 0 else 0,
+                'pressure_change': r2['pressure'] - r1['pressure'],
+                'pressure_percent': ((r2['pressure'] - r1['pressure']) / r1['pressure'] * 100) if r1['pressure'] != 0 else 0,
+                'temperature_change': r2['temperature'] - r1['temperature'],
+                'temperature_percent': ((r2['temperature'] - r1['temperature']) / r1['temperature'] * 100) if r1['temperature'] != 0 else 0,
             }
             differences.append(diff)
         
@@ -64,6 +65,17 @@ class ComparisonService:
         
         return comparison_result
     
+    @staticmethod
+    def _values_by_name(dataset):
+        """Map equipment name -> {parameter: value} from the stored columns"""
+        fields = ['flowrate', 'pressure', 'temperature']
+        columns = load_columns(dataset, ['equipment_name'] + fields)
+        values = zip(*(columns[field].tolist() for field in fields))
+        return {
+            name: dict(zip(fields, row))
+            for name, row in zip(columns['equipment_name'].tolist(), values)
+        }
+    
     @staticmethod
     def get_significant_changes(comparison_result, threshold=10):
         """Get equipment with significant parameter changes (>threshold%)"""
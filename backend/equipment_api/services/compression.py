@@ -0,0 +1,115 @@
+"""Compressed upload support: gzip, zstd and zip, decoded as streams"""
+import gzip
+import hashlib
+import posixpath
+import zipfile
+
+try:
+    import zstandard
+except ImportError:  # optional dependency, zstd uploads are rejected
+    zstandard = None
+
+
+class CompressionService:
+    """
+    Detect compressed uploads from their magic bytes and unwrap them lazily,
+    so the parser reads decompressed bytes without inflating the whole file
+    """
+
+    MAGIC = [
+        (b'\x1f\x8b', 'gzip'),
+        (b'\x28\xb5\x2f\xfd', 'zstd'),
+        (b'PK\x03\x04', 'zip'),
+    ]
+    EXTENSIONS = ('.csv', '.csv.gz', '.gz', '.csv.zst', '.zst', '.zip')
+    READ_SIZE = 64 * 1024
+
+    @staticmethod
+    def is_supported(filename):
+        """Accept plain CSVs and the compressed forms we can decode"""
+        return bool(filename) and filename.lower().endswith(CompressionService.EXTENSIONS)
+
+    @staticmethod
+    def detect(stream):
+        """
+        Codec of a seekable stream from its leading bytes
+        Returns: 'gzip', 'zstd', 'zip' or None for plain text; the stream is rewound
+        """
+        header = stream.read(4)
+        stream.seek(0)
+        for magic, codec in CompressionService.MAGIC:
+            if header.startswith(magic):
+                return codec
+        return None
+
+    @staticmethod
+    def decode(stream, codec):
+        """Wrap a gzip or zstd stream in a streaming decoder"""
+        if codec is None:
+            return stream
+        if codec == 'gzip':
+            return gzip.GzipFile(fileobj=stream, mode='rb')
+        if codec == 'zstd':
+            if zstandard is None:
+                raise ValueError('zstd uploads require the zstandard package')
+            return zstandard.ZstdDecompressor().stream_reader(stream)
+        raise ValueError('Zip archives are ingested one member at a time')
+
+    @staticmethod
+    def open_archive(stream):
+        """
+        Open a zip upload and list its CSV members in archive order
+        Returns: (ZipFile, [ZipInfo])
+        """
+        try:
+            archive = zipfile.ZipFile(stream)
+        except zipfile.BadZipFile as e:
+            raise ValueError(f'Invalid zip archive: {e}')
+
+        members = [
+            info for info in archive.infolist()
+            if not info.is_dir()
+            and info.filename.lower().endswith('.csv')
+            and not info.filename.startswith('__MACOSX/')
+            and not posixpath.basename(info.filename).startswith('.')
+        ]
+        if not members:
+            archive.close()
+            raise ValueError('Zip archive contains no CSV files')
+        return archive, members
+
+    @staticmethod
+    def content_digest(stream):
+        """
+        sha256 of the CSV in a seekable upload: the decompressed bytes for
+        gzip and zstd, so one CSV has one digest however it arrives; the raw
+        bytes for plain CSVs and zip archives (whose members are hashed
+        one by one). The stream is rewound.
+        """
+        codec = CompressionService.detect(stream)
+        decoded = CompressionService.decode(stream, None if codec == 'zip' else codec)
+        try:
+            return CompressionService._digest(decoded)
+        finally:
+            stream.seek(0)
+
+    @staticmethod
+    def member_digest(archive, info):
+        """sha256 of a member's decompressed bytes, matching a plain upload of it"""
+        with archive.open(info) as member:
+            return CompressionService._digest(member)
+
+    @staticmethod
+    def _digest(stream):
+        digest = hashlib.sha256()
+        while True:
+            data = stream.read(CompressionService.READ_SIZE)
+            if not data:
+                break
+            digest.update(data)
+        return digest.hexdigest()
+
+    @staticmethod
+    def member_name(info):
+        """Dataset filename for an archive member"""
+        return posixpath.basename(info.filename)
@@ -1,43 +1,386 @@
 import pandas as pd
-from io import StringIO
+from django.conf import settings
+
+from .compression import CompressionService
+from .parameters import ParameterColumns
+from .profiling import IngestionProfiler
+
+try:
+    import pyarrow as pa
+    import pyarrow.csv as pa_csv
+except ImportError:  # optional dependency, the pandas C parser is used
+    pa = None
+    pa_csv = None
+
+
+class CoercionReport:
+    """Compact record of cells that failed numeric coercion"""
+
+    MAX_SAMPLES = 20
+    MAX_VALUE_LENGTH = 50
+
+    def __init__(self, policy):
+        self.policy = policy
+        self.bad_rows = 0
+        self.columns = {}
+        self.samples = []
+
+    def add(self, df, masks):
+        """
+        Record the bad cells of one batch
+        masks: column -> boolean Series of unparseable cells
+        """
+        bad_any = None
+        for col, mask in masks.items():
+            count = int(mask.sum())
+            if not count:
+                continue
+            self.columns[col] = self.columns.get(col, 0) + count
+            bad_any = mask if bad_any is None else bad_any | mask
+
+            room = self.MAX_SAMPLES - len(self.samples)
+            if room > 0:
+                for index, value in df.loc[mask, col].head(room).items():
+                    self.samples.append({
+                        # pandas numbers rows continuously across chunks;
+                        # +2 turns that into a 1-based file line after the header
+                        'line': int(index) + 2,
+                        'column': col,
+                        'value': str(value)[:self.MAX_VALUE_LENGTH]
+                    })
+
+        if bad_any is not None:
+            self.bad_rows += int(bad_any.sum())
+        return bad_any
+
+    @property
+    def bad_cells(self):
+        return sum(self.columns.values())
+
+    def as_dict(self):
+        return {
+            'policy': self.policy,
+            'bad_rows': self.bad_rows,
+            'bad_cells': self.bad_cells,
+            'columns': self.columns,
+            'samples': sorted(self.samples, key=lambda s: (s['line'], s['column']))
+        }
+
+    def summary(self):
+        """One-line description for error messages"""
+        cells = ', '.join(
+            f"line {s['line']} {s['column']}={s['value']!r}"
+            for s in self.as_dict()['samples'][:5]
+        )
+        more = '' if self.bad_cells <= 5 else f' (+{self.bad_cells - 5} more)'
+        return f'{self.bad_cells} non-numeric values in {self.bad_rows} rows: {cells}{more}'
 
 
 class CSVProcessor:
     """Handles CSV file validation and parsing"""
-    
+
     REQUIRED_COLUMNS = ['Equipment Name', 'Type', 'Flowrate', 'Pressure', 'Temperature']
-    
+    NUMERIC_COLUMNS = ['Flowrate', 'Pressure', 'Temperature']
+
+    # what to do with cells that are present but not numeric:
+    # reject the file, drop the rows, or impute the column mean
+    BAD_VALUE_POLICIES = ['reject', 'drop', 'impute']
+
+    # dtypes pinned for the required columns, so they are not inferred
+    # by scanning the data; extra columns are still inferred
+    DTYPES = {
+        'Equipment Name': str,
+        'Type': 'category',
+        'Flowrate': 'float64',
+        'Pressure': 'float64',
+        'Temperature': 'float64',
+    }
+
+    # pyarrow: multithreaded pyarrow parser; c: pandas C parser, both with
+    # pinned dtypes; inferred: pandas C parser inferring every column (the
+    # fallback when a pinned numeric column holds non-numeric text)
+    ENGINES = ['auto', 'pyarrow', 'c', 'inferred']
+
+    # pyarrow reads streams in blocks of bytes, roughly this many per row
+    ARROW_ROW_BYTES = 64
+
+    def __init__(self, bad_value_policy=None, engine=None):
+        policy = bad_value_policy or getattr(settings, 'CSV_BAD_VALUE_POLICY', 'reject')
+        self.check_policy(policy)
+        self.engine = self.resolve_engine(engine or getattr(settings, 'CSV_ENGINE', 'auto'))
+        self.report = CoercionReport(policy)
+        self.profile = IngestionProfiler()
+        
+        # extra columns, discovered from the first batch unless preset
+        self.parameter_columns = None
+        self.categorical_columns = []
+
+        # file-wide column means the impute policy fills with, when streaming
+        self.impute_means = None
+
+    @classmethod
+    def check_policy(cls, policy):
+        """Raise ValueError for an unknown bad value policy"""
+        if policy not in cls.BAD_VALUE_POLICIES:
+            raise ValueError(f"bad_value_policy must be one of: {', '.join(cls.BAD_VALUE_POLICIES)}")
+
+    @classmethod
+    def resolve_engine(cls, engine):
+        """Parser to use for an engine setting, pyarrow only when installed"""
+        if engine not in cls.ENGINES:
+            raise ValueError(f"engine must be one of: {', '.join(cls.ENGINES)}")
+        if engine in ('auto', 'pyarrow'):
+            return 'pyarrow' if pa_csv is not None else 'c'
+        return engine
+
+    # files larger than this are parsed in chunks instead of all at once
+    STREAMING_THRESHOLD = 20 * 1024 * 1024
+    CHUNK_ROWS = 50000
+
+    def should_stream(self, csv_file):
+        """
+        Pick the streaming path for large uploads
+        Compressed uploads always stream, their inflated size is unknown
+        """
+        if CompressionService.detect(csv_file) is not None:
+            return True
+        return (csv_file.size or 0) > self.STREAMING_THRESHOLD
+
+    def open_source(self, csv_file):
+        """Decoded byte stream for a plain, gzip or zstd upload, reads timed as 'decode'"""
+        return self.profile.stream(CompressionService.decode(csv_file, CompressionService.detect(csv_file)))
+
     def validate_and_parse(self, csv_file):
         """
         Read CSV and check if all required columns exist
         Returns: pandas DataFrame or raises ValueError
         """
         try:
-            # read csv file
-            content = csv_file.read().decode('utf-8')
-            df = pd.read_csv(StringIO(content))
-            
-            # check for required columns
-            missing_cols = [col for col in self.REQUIRED_COLUMNS if col not in df.columns]
-            if missing_cols:
-                raise ValueError(f"Missing required columns: {', '.join(missing_cols)}")
-            
+            # read csv file straight from the upload, no decoded copy
+            with self.profile.span('parse'):
+                df = next(self._read_frames(csv_file))
+            self.profile.count('parse', rows=len(df))
+
+            self._check_columns(df)
+
             # basic data validation
             if df.empty:
                 raise ValueError("CSV file is empty")
-            
-            # check numeric columns
-            numeric_cols = ['Flowrate', 'Pressure', 'Temperature']
-            for col in numeric_cols:
-                if not pd.api.types.is_numeric_dtype(df[col]):
-                    try:
-                        df[col] = pd.to_numeric(df[col])
-                    except:
-                        raise ValueError(f"Column {col} must contain numeric values")
-            
+
+            with self.profile.span('coerce', rows=len(df)):
+                df = self._coerce_numeric(df)
+            self._raise_if_rejected()
+            if df.empty:
+                raise ValueError("No valid rows left after dropping non-numeric values")
             return df
-            
+
         except pd.errors.EmptyDataError:
             raise ValueError("CSV file is empty or invalid")
         except Exception as e:
             raise ValueError(f"Error processing CSV: {str(e)}")
+
+    def iter_batches(self, csv_file, chunk_rows=None):
+        """
+        Stream the CSV in chunks of chunk_rows rows
+        gzip / zstd input is decompressed on the fly as chunks are read
+        Header is validated once, numeric columns are coerced per chunk
+        Yields: pandas DataFrame batches or raises ValueError
+        """
+        try:
+            chunk_rows = chunk_rows or self.CHUNK_ROWS
+            if self.report.policy == 'impute':
+                # every chunk is filled with the same, file-wide mean
+                self.impute_means = self._column_means(csv_file, chunk_rows)
+                csv_file.seek(0)
+            reader = self._read_frames(csv_file, chunk_rows)
+
+            rows = 0
+            for index, chunk in enumerate(self.profile.timed('parse', reader)):
+                if index == 0:
+                    self._check_columns(chunk)
+                if chunk.empty:
+                    continue
+
+                with self.profile.span('coerce', rows=len(chunk)):
+                    chunk = self._coerce_numeric(chunk)
+                if self.report.policy == 'reject' and self.report.bad_cells:
+                    # keep scanning without yielding so the report covers
+                    # the whole file in one pass
+                    continue
+                if chunk.empty:
+                    continue
+                rows += len(chunk)
+                yield chunk
+
+            self._raise_if_rejected()
+            if rows == 0:
+                if self.report.bad_rows:
+                    raise ValueError("No valid rows left after dropping non-numeric values")
+                raise ValueError("CSV file is empty")
+
+        except pd.errors.EmptyDataError:
+            raise ValueError("CSV file is empty or invalid")
+        except Exception as e:
+            raise ValueError(f"Error processing CSV: {str(e)}")
+
+    def _column_means(self, csv_file, chunk_rows):
+        """
+        Mean of the parseable values of each numeric column over the whole
+        file, from a running sum and count; a first pass for the impute
+        policy, so no chunk is filled with its own mean
+        Returns: {column: mean or NaN when the column has no valid value}
+        """
+        sums, counts = {}, {}
+        with self.profile.span('coerce'):
+            for index, frame in enumerate(self._read_frames(csv_file, chunk_rows)):
+                if index == 0:
+                    self._check_columns(frame)
+                for col in self.NUMERIC_COLUMNS + self.parameter_columns:
+                    if col not in frame.columns:
+                        continue
+                    values = pd.to_numeric(frame[col], errors='coerce')
+                    sums[col] = sums.get(col, 0.0) + values.sum()
+                    counts[col] = counts.get(col, 0) + values.count()
+        return {col: sums[col] / counts[col] if counts[col] else float('nan') for col in sums}
+
+    def _read_frames(self, csv_file, chunk_rows=None):
+        """
+        Raw DataFrames from the upload, the whole file at once when
+        chunk_rows is None. A pinned read that meets non-numeric text is
+        resumed on the inferred path after the rows already returned, so
+        the bad cells reach the coercion report.
+        """
+        returned = 0
+        if self.engine != 'inferred':
+            try:
+                for frame in self._pinned_frames(csv_file, chunk_rows):
+                    # continuous row numbers across batches, as pandas gives
+                    frame.index = pd.RangeIndex(returned, returned + len(frame))
+                    returned += len(frame)
+                    yield frame
+                return
+            except pd.errors.EmptyDataError:
+                raise
+            except ValueError:
+                csv_file.seek(0)
+
+        source = self.open_source(csv_file)
+        if not chunk_rows:
+            yield pd.read_csv(source, encoding='utf-8')
+            return
+
+        for frame in pd.read_csv(source, encoding='utf-8', chunksize=chunk_rows):
+            if returned:
+                skipped = min(returned, len(frame))
+                frame = frame.iloc[skipped:]
+                returned -= skipped
+                if frame.empty:
+                    continue
+            yield frame
+
+    def _pinned_frames(self, csv_file, chunk_rows):
+        source = self.open_source(csv_file)
+        if self.engine == 'pyarrow':
+            yield from self._arrow_frames(source, chunk_rows)
+        elif chunk_rows:
+            yield from pd.read_csv(source, encoding='utf-8', dtype=self.DTYPES, chunksize=chunk_rows)
+        else:
+            yield pd.read_csv(source, encoding='utf-8', dtype=self.DTYPES)
+
+    def _arrow_frames(self, source, chunk_rows):
+        types = {
+            'Equipment Name': pa.string(),
+            'Type': pa.dictionary(pa.int32(), pa.string()),
+        }
+        types.update({col: pa.float64() for col in self.NUMERIC_COLUMNS})
+        convert = pa_csv.ConvertOptions(column_types=types, strings_can_be_null=True)
+
+        if not chunk_rows:
+            # whole file, parsed on all cores
+            yield self._arrow_to_pandas(pa_csv.read_csv(source, convert_options=convert))
+            return
+
+        options = pa_csv.ReadOptions(block_size=max(chunk_rows * self.ARROW_ROW_BYTES, 1 << 20))
+        for batch in pa_csv.open_csv(source, read_options=options, convert_options=convert):
+            yield self._arrow_to_pandas(pa.Table.from_batches([batch]))
+
+    @staticmethod
+    def _arrow_to_pandas(table):
+        # pandas leaves dates in extra columns as text, so does this path
+        for position, field in enumerate(table.schema):
+            if pa.types.is_temporal(field.type):
+                table = table.set_column(position, field.name, table.column(position).cast(pa.string()))
+        return table.to_pandas()
+
+    @staticmethod
+    def to_record_frame(df):
+        """Map CSV columns to EquipmentRecord field names and storage dtypes"""
+        return pd.DataFrame({
+            'equipment_name': df['Equipment Name'].astype(str),
+            'equipment_type': df['Type'].astype(str),
+            'flowrate': df['Flowrate'].astype('float64'),
+            'pressure': df['Pressure'].astype('float64'),
+            'temperature': df['Temperature'].astype('float64'),
+        })
+
+    def use_columns(self, parameter_columns, categorical_columns):
+        """Parse against a known column split (appends) instead of discovering one"""
+        self.parameter_columns = list(parameter_columns)
+        self.categorical_columns = list(categorical_columns)
+
+    def _check_columns(self, df):
+        """Raise if any required column is missing, then split the extra columns"""
+        missing_cols = [col for col in self.REQUIRED_COLUMNS if col not in df.columns]
+        if missing_cols:
+            raise ValueError(f"Missing required columns: {', '.join(missing_cols)}")
+
+        if self.parameter_columns is None:
+            self.parameter_columns, self.categorical_columns = ParameterColumns.discover(
+                df, self.REQUIRED_COLUMNS
+            )
+
+    def _coerce_numeric(self, df):
+        """
+        Vectorized numeric conversion with the bad value policy applied
+        Covers the core measurements and every numeric parameter column.
+        Cells that are present but unparseable are found with one
+        errors='coerce' pass and a mask per column, recorded in
+        self.report, then rejected, dropped or imputed with the column
+        mean over the whole file (impute_means when streaming, else this
+        frame is the whole file); a column with no valid value to impute
+        from raises ValueError
+        Returns: the converted DataFrame (rows may be dropped)
+        """
+        coerced = {}
+        masks = {}
+        for col in self.NUMERIC_COLUMNS + (self.parameter_columns or []):
+            if col not in df.columns or pd.api.types.is_numeric_dtype(df[col]):
+                continue
+            coerced[col] = pd.to_numeric(df[col], errors='coerce')
+            masks[col] = coerced[col].isna() & df[col].notna()
+
+        # record before overwriting so samples keep the raw text
+        bad_rows = self.report.add(df, masks)
+        for col, values in coerced.items():
+            df[col] = values
+
+        if bad_rows is None:
+            return df
+        if self.report.policy == 'drop':
+            return df[~bad_rows]
+        if self.report.policy == 'impute':
+            for col, mask in masks.items():
+                if not mask.any():
+                    continue
+                if self.impute_means is not None:
+                    mean = self.impute_means[col]
+                else:
+                    mean = df.loc[~mask, col].mean()
+                if pd.isna(mean):
+                    raise ValueError(f"Cannot impute {col}: it has no numeric values")
+                df.loc[mask, col] = mean
+        return df
+
+    def _raise_if_rejected(self):
+        if self.report.policy == 'reject' and self.report.bad_cells:
+            raise ValueError(self.report.summary())
@@ -0,0 +1,82 @@
+"""Content-hash de-duplication of uploaded datasets"""
+from django.db import connection, transaction
+
+from equipment_api.models import EquipmentDataset, EquipmentRecord
+from .alert_service import AlertService
+from .columnar_store import ColumnarStore
+
+
+class DeduplicationService:
+    """Reuse an existing dataset when the same file is uploaded again"""
+
+    # copied verbatim when cloning a shared dataset
+    DATASET_FIELDS = [
+        'total_equipment', 'avg_flowrate', 'avg_pressure', 'avg_temperature',
+        'type_distribution', 'summary_state', 'parameter_columns', 'categorical_columns',
+        'parameter_averages', 'plant', 'unit', 'section', 'content_hash'
+    ]
+    RECORD_FIELDS = [
+        'equipment_name', 'equipment_type', 'flowrate', 'pressure',
+        'temperature', 'parameters', 'parameter_values'
+    ]
+
+    @staticmethod
+    def find_existing(user, content_hash):
+        """Ready dataset with this digest owned by or shared with the user"""
+        if not content_hash:
+            return None
+
+        matches = EquipmentDataset.objects.filter(content_hash=content_hash, is_ready=True)
+        own = matches.filter(user=user).first()
+        if own:
+            return own
+        return matches.filter(shareddataset__shared_with=user).first()
+
+    @staticmethod
+    def resolve(user, content_hash, filename):
+        """
+        Dataset the user can use instead of re-ingesting, or None
+        Own uploads are returned as-is, shared ones are cloned
+        """
+        existing = DeduplicationService.find_existing(user, content_hash)
+        if existing is None:
+            return None
+        if existing.user_id == user.id:
+            return existing
+        return DeduplicationService.clone_for_user(existing, user, filename)
+
+    @staticmethod
+    def clone_for_user(source, user, filename):
+        """
+        Copy a dataset to another user without re-parsing the file
+        Records are copied with a single INSERT ... SELECT on the server
+        (in id order, so columnar parts stay aligned); alert state is
+        reset and re-evaluated against the new owner's thresholds
+        """
+        opts = EquipmentRecord._meta
+        quote = connection.ops.quote_name
+        table = quote(opts.db_table)
+        dataset_col = quote(opts.get_field('dataset').column)
+        columns = ', '.join(quote(opts.get_field(name).column) for name in DeduplicationService.RECORD_FIELDS)
+        has_alert = quote(opts.get_field('has_alert').column)
+        alert_level = quote(opts.get_field('alert_level').column)
+
+        sql = (
+            f"INSERT INTO {table} ({dataset_col}, {columns}, {has_alert}, {alert_level}) "
+            f"SELECT %s, {columns}, %s, %s FROM {table} WHERE {dataset_col} = %s "
+            f"ORDER BY {quote(opts.pk.column)}"
+        )
+
+        with transaction.atomic():
+            clone = EquipmentDataset.objects.create(
+                user=user,
+                filename=filename,
+                **{name: getattr(source, name) for name in DeduplicationService.DATASET_FIELDS}
+            )
+            with connection.cursor() as cursor:
+                cursor.execute(sql, [clone.id, False, 'normal', source.id])
+
+        ColumnarStore.copy(source.id, clone.id)
+        AlertService.check_alerts(clone, user)
+
+        return clone
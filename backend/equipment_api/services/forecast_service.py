@@ -0,0 +1,212 @@
+"""Per-equipment trend forecasting across a user's uploads"""
+from datetime import timedelta
+
+import numpy as np
+import pandas as pd
+from django.utils import timezone
+
+from equipment_api.models import EquipmentDataset
+from .columnar_store import load_columns
+
+
+# two-sided 95% Student t quantiles for 1..30 degrees of freedom, the
+# normal quantile beyond
+_T95 = [
+    12.706, 4.303, 3.182, 2.776, 2.571, 2.447, 2.365, 2.306, 2.262, 2.228,
+    2.201, 2.179, 2.160, 2.145, 2.131, 2.120, 2.110, 2.101, 2.093, 2.086,
+    2.080, 2.074, 2.069, 2.064, 2.060, 2.056, 2.052, 2.048, 2.045, 2.042,
+]
+
+
+class ForecastService:
+    """Least-squares trend per equipment over its readings in every upload"""
+
+    PARAMETERS = ['flowrate', 'pressure', 'temperature']
+    HIERARCHY = ['plant', 'unit', 'section']
+    HORIZON_DAYS = 7
+    # ten years; far beyond any useful extrapolation, well within datetime
+    MAX_HORIZON_DAYS = 3650
+    CONFIDENCE = 0.95
+
+    @staticmethod
+    def history(user, parameters, plant=None, unit=None, section=None, equipment=None):
+        """
+        Readings of each equipment in each of the user's uploads, oldest first
+        Equipment is identified by plant/unit/section and equipment_name; a
+        name listed several times in one upload is averaged.
+        Returns: (keys DataFrame, upload times, {parameter: equipment x upload
+                  array, NaN where not seen})
+        """
+        datasets = EquipmentDataset.objects.filter(user=user, is_ready=True, marked_for_purge=False)
+        for name, value in (('plant', plant), ('unit', unit), ('section', section)):
+            if value:
+                datasets = datasets.filter(**{name: value})
+        datasets = list(datasets.order_by('uploaded_at', 'id'))
+
+        frames = []
+        for position, dataset in enumerate(datasets):
+            frame = pd.DataFrame(load_columns(dataset, ['equipment_name'] + parameters))
+            if equipment:
+                frame = frame[frame['equipment_name'] == equipment]
+            for name in ForecastService.HIERARCHY:
+                frame[name] = getattr(dataset, name) or ''
+            frame['upload'] = position
+            frames.append(frame)
+
+        keys = ForecastService.HIERARCHY + ['equipment_name']
+        if not frames or not sum(len(frame) for frame in frames):
+            return pd.DataFrame(columns=keys), [], {name: np.empty((0, 0)) for name in parameters}
+
+        frame = pd.concat(frames, ignore_index=True)
+        frame[parameters] = frame[parameters].astype('float64')
+        means = frame.groupby(keys + ['upload'], sort=True)[parameters].mean().unstack('upload')
+
+        uploads = range(len(datasets))
+        series = {
+            name: means[name].reindex(columns=uploads).to_numpy(dtype='float64')
+            for name in parameters
+        }
+        times = [dataset.uploaded_at for dataset in datasets]
+        return means.index.to_frame(index=False), times, series
+
+    @staticmethod
+    def fit(days, values):
+        """
+        Least-squares line through each row of values (NaN = missing)
+        Rows observed at the same uploads share a design matrix [1, t - mean t],
+        so each distinct pattern is one lstsq with those rows stacked as
+        right-hand sides; the work grows linearly with the number of rows.
+        Returns: dict of per-row arrays: level (fitted value at the mean
+                 time), slope, centre (mean time), sxx, rss and n; level and
+                 slope are NaN where fewer than two distinct times were seen
+        """
+        rows = values.shape[0]
+        observed = ~np.isnan(values)
+        fit = {name: np.full(rows, np.nan) for name in ['level', 'slope', 'centre', 'sxx', 'rss']}
+        fit['n'] = observed.sum(axis=1)
+        if not rows:
+            return fit
+
+        patterns, inverse = np.unique(observed, axis=0, return_inverse=True)
+        inverse = inverse.reshape(-1)
+        # rows grouped by pattern: order[bounds[i]:bounds[i + 1]] share patterns[i]
+        order = np.argsort(inverse, kind='stable')
+        bounds = np.concatenate([[0], np.cumsum(np.bincount(inverse, minlength=len(patterns)))])
+
+        for index, pattern in enumerate(patterns):
+            members = order[bounds[index]:bounds[index + 1]]
+            t = days[pattern]
+            if len(t) < 2 or np.ptp(t) == 0:
+                continue
+            centre = t.mean()
+            design = np.column_stack([np.ones(len(t)), t - centre])
+            targets = values[members][:, pattern].T
+            coefficients = np.linalg.lstsq(design, targets, rcond=None)[0]
+            residuals = targets - design @ coefficients
+
+            fit['level'][members] = coefficients[0]
+            fit['slope'][members] = coefficients[1]
+            fit['centre'][members] = centre
+            fit['sxx'][members] = np.sum((t - centre) ** 2)
+            fit['rss'][members] = np.sum(residuals ** 2, axis=0)
+        return fit
+
+    @staticmethod
+    def interval(fit, at):
+        """
+        Forecast and 95% prediction interval at time at (days) per row
+        The interval needs three or more readings; NaN otherwise.
+        Returns: (forecast, half width, slope half width)
+        """
+        n = fit['n']
+        forecast = fit['level'] + fit['slope'] * (at - fit['centre'])
+
+        dof = n - 2
+        with np.errstate(invalid='ignore', divide='ignore'):
+            variance = np.where(dof > 0, fit['rss'] / np.maximum(dof, 1), np.nan)
+            quantile = np.array(_T95 + [1.96])[np.clip(dof, 1, len(_T95) + 1) - 1]
+            half_width = quantile * np.sqrt(variance * (1 + 1 / n + (at - fit['centre']) ** 2 / fit['sxx']))
+            slope_width = quantile * np.sqrt(variance / fit['sxx'])
+        return forecast, half_width, slope_width
+
+    @staticmethod
+    def forecast(user, parameters=None, horizon_days=HORIZON_DAYS, plant=None, unit=None,
+                 section=None, equipment=None):
+        """
+        Forecast every equipment's readings horizon_days from now
+        Trend is increasing/decreasing when the slope's 95% interval
+        excludes zero, stable otherwise, None without enough history.
+        Returns: list of dicts ordered by plant, unit, section, name, parameter
+        """
+        parameters = parameters or ForecastService.PARAMETERS
+        unknown = sorted(set(parameters) - set(ForecastService.PARAMETERS))
+        if unknown:
+            raise ValueError(f"Unknown parameter: {', '.join(unknown)}")
+        # also false for NaN, which timedelta cannot take
+        if not 0 <= horizon_days <= ForecastService.MAX_HORIZON_DAYS:
+            raise ValueError(f'horizon_days must be between 0 and {ForecastService.MAX_HORIZON_DAYS}')
+
+        keys, times, series = ForecastService.history(user, parameters, plant, unit, section, equipment)
+        if not len(keys):
+            return []
+
+        days = np.array([(time - times[0]).total_seconds() / 86400 for time in times])
+        forecast_time = timezone.now() + timedelta(days=horizon_days)
+        at = (forecast_time - times[0]).total_seconds() / 86400
+        dates = [str(time.date()) for time in times]
+
+        columns = {}
+        for name in parameters:
+            values = series[name]
+            observed = ~np.isnan(values)
+            fit = ForecastService.fit(days, values)
+            forecast, half_width, slope_width = ForecastService.interval(fit, at)
+
+            # first and last upload each equipment was seen in
+            first = observed.argmax(axis=1)
+            last = values.shape[1] - 1 - observed[:, ::-1].argmax(axis=1)
+            slope = fit['slope']
+            with np.errstate(invalid='ignore'):
+                trend = np.where(
+                    slope - slope_width > 0, 'increasing',
+                    np.where(slope + slope_width < 0, 'decreasing', 'stable')
+                ).astype(object)
+            trend[np.isnan(slope_width)] = None
+
+            columns[name] = [
+                column.tolist() for column in (
+                    fit['n'], first, last, values[np.arange(len(values)), last], slope,
+                    trend, forecast, forecast - half_width, forecast + half_width
+                )
+            ]
+
+        def number(value):
+            return None if value is None or np.isnan(value) else value
+
+        forecasts = []
+        for row, key in enumerate(keys.itertuples(index=False)):
+            for name in parameters:
+                n, first, last, last_value, slope, trend, value, lower, upper = (
+                    column[row] for column in columns[name]
+                )
+                if not n:
+                    continue
+                forecasts.append({
+                    'equipment_name': key.equipment_name,
+                    'plant': key.plant or None,
+                    'unit': key.unit or None,
+                    'section': key.section or None,
+                    'parameter': name,
+                    'observations': n,
+                    'first_seen': dates[first],
+                    'last_seen': dates[last],
+                    'last_value': last_value,
+                    'slope_per_day': number(slope),
+                    'trend': trend,
+                    'forecast_date': str(forecast_time.date()),
+                    'forecast': number(value),
+                    'lower': number(lower),
+                    'upper': number(upper),
+                    'confidence': ForecastService.CONFIDENCE
+                })
+        return forecasts
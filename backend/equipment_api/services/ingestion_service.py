@@ -0,0 +1,325 @@
+"""Bulk ingestion engine for persisting parsed CSV data"""
+import io
+import json
+
+from django.db import connection, transaction
+
+from equipment_api.models import EquipmentDataset, EquipmentRecord
+from .alert_service import AlertService
+from .analytics_service import AnalyticsService, RunningSummary
+from .columnar_store import ColumnarWriter
+from .csv_processor import CSVProcessor
+from .parameters import ParameterColumns
+from .profiling import IngestionProfiler
+
+
+class BulkRecordWriter:
+    """
+    Writes EquipmentRecord rows for one dataset in batches.
+    PostgreSQL gets a COPY FROM STDIN per batch, every other backend
+    (SQLite locally) gets one executemany per batch. Alert levels are
+    evaluated against the owner's thresholds and rules as rows are written.
+    """
+
+    BATCH_SIZE = 5000
+
+    # model fields written for every row, in column order
+    FIELDS = [
+        'dataset', 'equipment_name', 'equipment_type',
+        'flowrate', 'pressure', 'temperature',
+        'parameters', 'parameter_values', 'has_alert', 'alert_level'
+    ]
+
+    def __init__(self, dataset, batch_size=None):
+        self.dataset = dataset
+        self.batch_size = batch_size or self.BATCH_SIZE
+        self.rows_written = 0
+        self.rules = AlertService.rules_for(dataset.user_id)
+
+        opts = EquipmentRecord._meta
+        quote = connection.ops.quote_name
+        self.table = quote(opts.db_table)
+        self.columns = [quote(opts.get_field(name).column) for name in self.FIELDS]
+
+    def write(self, df):
+        """
+        Insert every row of a validated DataFrame
+        Returns: number of rows written
+        """
+        rows = self._build_rows(df)
+
+        for start in range(0, len(rows), self.batch_size):
+            batch = rows[start:start + self.batch_size]
+            if connection.vendor == 'postgresql':
+                self._copy_batch(batch)
+            else:
+                self._insert_batch(batch)
+
+        self.rows_written += len(rows)
+        return len(rows)
+
+    def _build_rows(self, df):
+        """Convert DataFrame columns to DB-ready tuples in one pass"""
+        frame = CSVProcessor.to_record_frame(df)
+        # NaN -> NULL, numpy scalars -> python objects
+        frame = frame.astype(object).where(frame.notna(), None)
+
+        # numeric extra columns packed per row, categorical ones as JSON
+        packed = ParameterColumns.pack(df, self.dataset.parameter_columns)
+        categorical = self.dataset.categorical_columns
+        if categorical:
+            labels = df.reindex(columns=categorical).astype(object)
+            labels = labels.where(labels.notna(), None)
+            parameters = [json.dumps(dict(zip(categorical, row))) for row in labels.itertuples(index=False, name=None)]
+        else:
+            parameters = [json.dumps({})] * len(frame)
+
+        levels = AlertService.batch_levels(df, self.rules).tolist()
+
+        dataset_id = self.dataset.id
+        return [
+            (dataset_id, name, eq_type, flow, press, temp, labels_json, values, level != 'normal', level)
+            for (name, eq_type, flow, press, temp), labels_json, values, level
+            in zip(frame.itertuples(index=False, name=None), parameters, packed, levels)
+        ]
+
+    def _insert_batch(self, batch):
+        placeholders = ', '.join(['%s'] * len(self.columns))
+        sql = f"INSERT INTO {self.table} ({', '.join(self.columns)}) VALUES ({placeholders})"
+        with connection.cursor() as cursor:
+            cursor.executemany(sql, batch)
+
+    def _copy_batch(self, batch):
+        buffer = io.StringIO()
+        for row in batch:
+            buffer.write('\t'.join(self._copy_value(value) for value in row))
+            buffer.write('\n')
+        buffer.seek(0)
+
+        sql = f"COPY {self.table} ({', '.join(self.columns)}) FROM STDIN"
+        with connection.cursor() as cursor:
+            cursor.copy_expert(sql, buffer)
+
+    @staticmethod
+    def _copy_value(value):
+        """Encode a value for COPY text format"""
+        if value is None:
+            return '\\N'
+        if isinstance(value, bytes):
+            # bytea hex input, backslash escaped for the text format
+            return '\\\\x' + value.hex()
+        if isinstance(value, str):
+            return (value.replace('\\', '\\\\').replace('\t', '\\t')
+                         .replace('\n', '\\n').replace('\r', '\\r'))
+        return str(value)
+
+
+class IngestionService:
+    """Create datasets and their records from validated CSV data"""
+
+    @staticmethod
+    def ingest_upload(user, csv_file, progress=None, staged=False, content_hash='', processor=None):
+        """
+        Parse and persist an uploaded CSV
+        Large files are streamed in chunks, small ones parsed whole
+        processor: CSVProcessor to parse with, its report holds any bad cells
+                   and its profile the per-phase timings
+        Returns: EquipmentDataset or raises ValueError
+        """
+        processor = processor or CSVProcessor()
+
+        if processor.should_stream(csv_file):
+            batches = processor.iter_batches(csv_file)
+        else:
+            batches = [processor.validate_and_parse(csv_file)]
+
+        return IngestionService.ingest_batches(
+            user, csv_file.name, batches,
+            progress=progress, staged=staged, content_hash=content_hash,
+            profile=processor.profile
+        )
+
+    @staticmethod
+    def ingest_dataframe(user, filename, df, summary=None, content_hash='', profile=None):
+        """
+        Persist a parsed DataFrame as a new dataset
+        Dataset and records are written in one transaction
+        summary: precomputed AnalyticsService.calculate_summary output
+        content_hash: sha256 of the source file, for de-duplication
+        profile: IngestionProfiler the write phases are recorded on
+        Returns: EquipmentDataset
+        """
+        profile = profile or IngestionProfiler()
+        parameter_columns, categorical_columns = ParameterColumns.discover(df, CSVProcessor.REQUIRED_COLUMNS)
+
+        with profile.span('summary', rows=len(df)):
+            if summary is None:
+                summary = AnalyticsService().calculate_summary(df)
+
+            # running totals so later appends do not rescan
+            running = RunningSummary(parameter_columns)
+            running.update(df)
+
+        columns = None
+        try:
+            with transaction.atomic():
+                dataset = EquipmentDataset.objects.create(
+                    user=user,
+                    filename=filename,
+                    total_equipment=summary['total_equipment'],
+                    avg_flowrate=summary['avg_flowrate'],
+                    avg_pressure=summary['avg_pressure'],
+                    avg_temperature=summary['avg_temperature'],
+                    type_distribution=summary['type_distribution'],
+                    parameter_columns=parameter_columns,
+                    categorical_columns=categorical_columns,
+                    parameter_averages=running.as_summary()['parameter_averages'],
+                    summary_state=running.state(),
+                    content_hash=content_hash
+                )
+                with profile.span('insert', rows=len(df)):
+                    BulkRecordWriter(dataset).write(df)
+
+                # the part is published when this transaction commits
+                columns = ColumnarWriter(dataset)
+                with profile.span('columnar', rows=len(df)):
+                    columns.write(df)
+                    columns.close()
+        except Exception:
+            # rolled back, drop the part that was never published
+            if columns is not None:
+                columns.abort()
+            raise
+
+        return dataset
+
+    @staticmethod
+    def ingest_batches(user, filename, batches, progress=None, staged=False, content_hash='', profile=None):
+        """
+        Persist an iterable of DataFrame batches as a new dataset
+        Summary stats are accumulated per batch, so only one batch
+        is held in memory at a time
+
+        progress: optional callable(phase, rows_parsed, rows_persisted)
+        staged: commit each batch separately and keep the dataset hidden
+                (is_ready=False) until the last one lands, so progress is
+                visible to other connections while the data is not
+        profile: IngestionProfiler the write phases are recorded on
+        Returns: EquipmentDataset
+        """
+        profile = profile or IngestionProfiler()
+        if staged:
+            return IngestionService._persist_batches(user, filename, batches, progress, staged, content_hash, profile)
+
+        with transaction.atomic():
+            return IngestionService._persist_batches(user, filename, batches, progress, staged, content_hash, profile)
+
+    @staticmethod
+    def _persist_batches(user, filename, batches, progress, staged, content_hash, profile):
+        dataset = EquipmentDataset.objects.create(
+            user=user,
+            filename=filename,
+            total_equipment=0,
+            is_ready=not staged,
+            content_hash=content_hash
+        )
+
+        writer = BulkRecordWriter(dataset)
+        columns = ColumnarWriter(dataset)
+        running = RunningSummary()
+
+        try:
+            for index, batch in enumerate(batches):
+                if index == 0:
+                    # the first batch fixes the dataset's extra columns
+                    dataset.parameter_columns, dataset.categorical_columns = ParameterColumns.discover(
+                        batch, CSVProcessor.REQUIRED_COLUMNS
+                    )
+                    running = RunningSummary(dataset.parameter_columns)
+                IngestionService._report(progress, 'parsing', running.total + len(batch), writer.rows_written)
+                IngestionService._write_batch(profile, batch, writer, columns, running)
+                IngestionService._report(progress, 'persisting', running.total, writer.rows_written)
+
+            IngestionService._report(progress, 'finalizing', running.total, writer.rows_written)
+            with profile.span('finalize'):
+                running.apply(dataset)
+                dataset.is_ready = True
+                dataset.save()
+                # published with the commit of the dataset row
+                columns.close()
+
+        except Exception:
+            columns.abort()
+            if staged:
+                # nothing was visible yet, drop the partial data
+                dataset.delete()
+            raise
+
+        return dataset
+
+    @staticmethod
+    def append_upload(dataset, csv_file, progress=None, processor=None):
+        """
+        Append an uploaded CSV's rows to an existing dataset
+        Summary stats continue from the stored running sums, counts and
+        type counters, so the cost is O(new rows). Rows and summary are
+        committed together; concurrent appends are serialized on the
+        dataset row. Extra columns follow the dataset's: missing ones are
+        stored as NaN, new ones are ignored.
+        Returns: EquipmentDataset or raises ValueError
+        """
+        processor = processor or CSVProcessor()
+        processor.use_columns(dataset.parameter_columns, dataset.categorical_columns)
+        profile = processor.profile
+
+        if processor.should_stream(csv_file):
+            batches = processor.iter_batches(csv_file)
+        else:
+            batches = [processor.validate_and_parse(csv_file)]
+
+        columns = None
+        try:
+            with transaction.atomic():
+                dataset = EquipmentDataset.objects.select_for_update().get(id=dataset.id)
+                writer = BulkRecordWriter(dataset)
+                columns = ColumnarWriter(dataset)
+                running = RunningSummary.from_dataset(dataset)
+                appended = 0
+
+                for batch in batches:
+                    appended += len(batch)
+                    IngestionService._report(progress, 'parsing', appended, writer.rows_written)
+                    IngestionService._write_batch(profile, batch, writer, columns, running)
+                    IngestionService._report(progress, 'persisting', appended, writer.rows_written)
+
+                IngestionService._report(progress, 'finalizing', appended, writer.rows_written)
+                with profile.span('finalize'):
+                    running.apply(dataset)
+                    # new records, so cached analytics for the old version no longer apply
+                    dataset.version += 1
+                    dataset.save()
+                    # the new part is published when this transaction commits
+                    columns.close()
+        except Exception:
+            # rolled back, drop the part that was never published
+            if columns is not None:
+                columns.abort()
+            raise
+
+        return dataset
+
+    @staticmethod
+    def _write_batch(profile, batch, writer, columns, running):
+        """Insert, column-store and summarize one batch, each as its own span"""
+        rows = len(batch)
+        with profile.span('insert', rows=rows), transaction.atomic():
+            writer.write(batch)
+        with profile.span('columnar', rows=rows):
+            columns.write(batch)
+        with profile.span('summary', rows=rows):
+            running.update(batch)
+
+    @staticmethod
+    def _report(progress, phase, rows_parsed, rows_persisted):
+        if progress:
+            progress(phase, rows_parsed, rows_persisted)
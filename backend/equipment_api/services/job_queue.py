@@ -0,0 +1,429 @@
+"""DB-backed ingestion job queue with a local worker pool"""
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files import File
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from equipment_api.models import ChunkedUpload, EquipmentDataset, IngestionJob
+from .chunked_upload import ChunkedUploadService
+from .compression import CompressionService
+from .csv_processor import CSVProcessor
+from .dedup_service import DeduplicationService
+from .ingestion_service import IngestionService
+from .profiling import IngestionProfiler
+from .retention_service import RetentionService
+
+
+class IngestionJobQueue:
+    """
+    Queue uploads as IngestionJob rows and process them off the request thread.
+    Jobs are claimed with a conditional UPDATE, so any number of in-process
+    workers or `manage.py run_ingestion_worker` processes can share the table
+    without an external broker. A claimed job's heartbeat is refreshed on
+    every progress report; jobs whose worker died are requeued once it is
+    older than INGESTION_JOB_TIMEOUT.
+    """
+
+    _executor = None
+    _lock = threading.Lock()
+
+    @staticmethod
+    def enqueue(user, uploaded_file, content_hash='', bad_value_policy=''):
+        """
+        Store the upload and queue it for ingestion
+        content_hash: sha256 of the bytes as sent; for gzip and zstd uploads
+        it is dropped and the worker hashes the decoded CSV instead
+        """
+        if CompressionService.detect(uploaded_file) in ('gzip', 'zstd'):
+            content_hash = ''
+
+        existing = DeduplicationService.resolve(user, content_hash, uploaded_file.name)
+        if existing:
+            return IngestionJobQueue._completed_job(
+                user, uploaded_file.name, uploaded_file.size or 0, content_hash, existing
+            )
+
+        job = IngestionJob.objects.create(
+            user=user,
+            filename=uploaded_file.name,
+            file=uploaded_file,
+            bytes_total=uploaded_file.size or 0,
+            content_hash=content_hash,
+            bad_value_policy=bad_value_policy or ''
+        )
+        transaction.on_commit(IngestionJobQueue.wake)
+        return job
+
+    @staticmethod
+    def enqueue_append(dataset, uploaded_file, bad_value_policy=''):
+        """Queue an upload whose rows are appended to an existing dataset"""
+        job = IngestionJob.objects.create(
+            user=dataset.user,
+            filename=uploaded_file.name,
+            file=uploaded_file,
+            bytes_total=uploaded_file.size or 0,
+            bad_value_policy=bad_value_policy or '',
+            append_to=dataset
+        )
+        transaction.on_commit(IngestionJobQueue.wake)
+        return job
+
+    @staticmethod
+    def enqueue_chunked(upload, bad_value_policy=''):
+        """
+        Queue a finalized chunked upload, read straight from its spool
+        The worker hashes it for de-duplication, so finalizing never reads
+        the assembled file
+        """
+        job = IngestionJob.objects.create(
+            user=upload.user,
+            filename=upload.filename,
+            bytes_total=upload.total_size,
+            bad_value_policy=bad_value_policy or ''
+        )
+        upload.job = job
+        upload.save(update_fields=['job', 'updated_at'])
+
+        transaction.on_commit(IngestionJobQueue.wake)
+        return job
+
+    @staticmethod
+    def _completed_job(user, filename, size, content_hash, dataset):
+        """Record a duplicate upload as a job that finished immediately"""
+        now = timezone.now()
+        return IngestionJob.objects.create(
+            user=user,
+            filename=filename,
+            bytes_total=size,
+            content_hash=content_hash,
+            status='completed',
+            phase='deduplicated',
+            rows_parsed=dataset.total_equipment,
+            rows_persisted=dataset.total_equipment,
+            dataset=dataset,
+            started_at=now,
+            finished_at=now
+        )
+
+    @classmethod
+    def start(cls):
+        """Drain the queue at server startup, jobs left by a dead worker included"""
+        cls.wake()
+
+    @classmethod
+    def _after_fork(cls):
+        # a forked server worker inherits the pool object but not its threads
+        cls._executor = None
+        cls._lock = threading.Lock()
+
+    @classmethod
+    def wake(cls):
+        """Hand queued jobs to the local worker pool"""
+        workers = getattr(settings, 'INGESTION_WORKERS', 2)
+        if workers <= 0:
+            # jobs are left for an external run_ingestion_worker process
+            return
+
+        with cls._lock:
+            if cls._executor is None:
+                cls._executor = ThreadPoolExecutor(
+                    max_workers=workers,
+                    thread_name_prefix='ingestion'
+                )
+        cls._executor.submit(cls.drain)
+
+    @staticmethod
+    def drain():
+        """Process jobs until the queue is empty"""
+        try:
+            while True:
+                job = IngestionJobQueue.claim_next()
+                if job is None:
+                    break
+                IngestionJobQueue.run(job)
+        finally:
+            connection.close()
+
+    @staticmethod
+    def claim_next():
+        """Atomically move the oldest queued job to running"""
+        IngestionJobQueue.requeue_stale()
+
+        queued = IngestionJob.objects.filter(status='queued').order_by('created_at')
+        for job_id in queued.values_list('id', flat=True)[:10]:
+            now = timezone.now()
+            claimed = IngestionJob.objects.filter(id=job_id, status='queued').update(
+                status='running',
+                phase='parsing',
+                started_at=now,
+                heartbeat_at=now
+            )
+            if claimed:
+                return IngestionJob.objects.select_related('user').get(id=job_id)
+        return None
+
+    @staticmethod
+    def requeue_stale():
+        """
+        Put running jobs whose heartbeat is older than INGESTION_JOB_TIMEOUT
+        back on the queue (their worker crashed or was restarted)
+        Datasets they had staged but not finished are handed to the
+        retention purge, and zip member jobs are dropped; the rerun
+        recreates both.
+        Returns: number of jobs requeued
+        """
+        timeout = getattr(settings, 'INGESTION_JOB_TIMEOUT', 900)
+        if timeout <= 0:
+            return 0
+
+        cutoff = timezone.now() - timedelta(seconds=timeout)
+        stale = IngestionJob.objects.filter(status='running', parent__isnull=True).filter(
+            Q(heartbeat_at__lt=cutoff) | Q(heartbeat_at__isnull=True, started_at__lt=cutoff)
+        )
+
+        requeued = 0
+        for job in stale:
+            # conditional, so a job requeued elsewhere meanwhile is skipped
+            reset = IngestionJob.objects.filter(
+                id=job.id, status='running', heartbeat_at=job.heartbeat_at
+            ).update(
+                status='queued',
+                phase='queued',
+                rows_parsed=0,
+                rows_persisted=0,
+                started_at=None,
+                heartbeat_at=None
+            )
+            if not reset:
+                continue
+
+            filenames = [job.filename] + list(job.members.values_list('filename', flat=True))
+            EquipmentDataset.objects.filter(
+                user_id=job.user_id,
+                filename__in=filenames,
+                is_ready=False,
+                marked_for_purge=False,
+                uploaded_at__gte=job.started_at or cutoff
+            ).update(marked_for_purge=True)
+            job.members.all().delete()
+            requeued += 1
+        return requeued
+
+    @staticmethod
+    def run_archive(job, upload):
+        """
+        Ingest each CSV member of a zip upload as its own dataset
+        Members are tracked as child jobs and decompressed one at a time
+        straight from the archive; a bad member does not stop the rest
+        Returns: the first member's dataset, or raises if none succeeded
+        """
+        archive, members = CompressionService.open_archive(upload)
+        first = None
+        errors = []
+        totals = {'parsed': 0, 'persisted': 0}
+
+        with archive:
+            for info in members:
+                child = IngestionJob.objects.create(
+                    user=job.user,
+                    parent=job,
+                    filename=CompressionService.member_name(info),
+                    archive_member=info.filename,
+                    bytes_total=info.file_size,
+                    status='running',
+                    phase='parsing',
+                    started_at=timezone.now()
+                )
+
+                def report(phase, rows_parsed, rows_persisted, child=child):
+                    IngestionJob.objects.filter(id=child.id).update(
+                        phase=phase,
+                        rows_parsed=rows_parsed,
+                        rows_persisted=rows_persisted
+                    )
+                    IngestionJob.objects.filter(id=job.id).update(
+                        phase=phase,
+                        rows_parsed=totals['parsed'] + rows_parsed,
+                        rows_persisted=totals['persisted'] + rows_persisted,
+                        heartbeat_at=timezone.now()
+                    )
+
+                profile = IngestionProfiler()
+                dataset = None
+                phase = 'failed'
+                try:
+                    # hash the decompressed member so it de-duplicates
+                    # against the same CSV uploaded on its own
+                    with profile.span('dedup', bytes=info.file_size):
+                        content_hash = CompressionService.member_digest(archive, info)
+                        dataset = DeduplicationService.resolve(job.user, content_hash, child.filename)
+                    phase = 'deduplicated'
+
+                    if dataset is None:
+                        processor = CSVProcessor(job.bad_value_policy or None)
+                        processor.profile = profile
+                        try:
+                            with archive.open(info) as stream:
+                                member = File(stream, name=child.filename)
+                                member.size = info.file_size
+                                dataset = IngestionService.ingest_upload(
+                                    job.user, member, progress=report, staged=True,
+                                    content_hash=content_hash, processor=processor
+                                )
+                        finally:
+                            IngestionJobQueue._save_report(child, processor)
+                        phase = 'done'
+
+                    totals['parsed'] += dataset.total_equipment
+                    totals['persisted'] += dataset.total_equipment
+                    IngestionJob.objects.filter(id=child.id).update(
+                        status='completed',
+                        phase=phase,
+                        content_hash=content_hash,
+                        rows_parsed=dataset.total_equipment,
+                        rows_persisted=dataset.total_equipment,
+                        dataset=dataset,
+                        finished_at=timezone.now()
+                    )
+                    first = first or dataset
+                except Exception as e:
+                    errors.append(f'{info.filename}: {e}')
+                    IngestionJob.objects.filter(id=child.id).update(
+                        status='failed',
+                        phase='failed',
+                        error=str(e),
+                        finished_at=timezone.now()
+                    )
+                finally:
+                    profile.save(dataset=dataset if phase == 'done' else None, job=child)
+
+        if first is None:
+            raise ValueError('; '.join(errors))
+        if errors:
+            IngestionJob.objects.filter(id=job.id).update(error='; '.join(errors))
+        return first
+
+    @staticmethod
+    def run_append(job, report, profile):
+        """Append a job's upload (or each CSV in a zip) to its target dataset"""
+        dataset = job.append_to
+        processor = CSVProcessor(job.bad_value_policy or None)
+        processor.profile = profile
+
+        try:
+            with File(job.file.open('rb'), name=job.filename) as upload:
+                if CompressionService.detect(upload) != 'zip':
+                    return IngestionService.append_upload(dataset, upload, progress=report, processor=processor)
+
+                archive, members = CompressionService.open_archive(upload)
+                with archive:
+                    for info in members:
+                        with archive.open(info) as stream:
+                            member = File(stream, name=CompressionService.member_name(info))
+                            member.size = info.file_size
+                            dataset = IngestionService.append_upload(
+                                dataset, member, progress=report, processor=processor
+                            )
+                return dataset
+        finally:
+            IngestionJobQueue._save_report(job, processor)
+
+    @staticmethod
+    def _save_report(job, processor):
+        """Keep the bad cell report, whether the file was accepted or not"""
+        if processor.report.bad_cells:
+            IngestionJob.objects.filter(id=job.id).update(
+                coercion_report=processor.report.as_dict()
+            )
+
+    @staticmethod
+    def run(job):
+        """Ingest one claimed job and record the outcome"""
+        def report(phase, rows_parsed, rows_persisted):
+            IngestionJob.objects.filter(id=job.id).update(
+                phase=phase,
+                rows_parsed=rows_parsed,
+                rows_persisted=rows_persisted,
+                heartbeat_at=timezone.now()
+            )
+
+        chunked = ChunkedUpload.objects.filter(job=job).first()
+        profile = IngestionProfiler()
+        dataset = None
+        phase = 'failed'
+
+        try:
+            if job.append_to_id:
+                dataset = IngestionJobQueue.run_append(job, report, profile)
+                phase = 'done'
+            else:
+                if chunked:
+                    upload = ChunkedUploadService.open_stream(chunked)
+                else:
+                    upload = File(job.file.open('rb'), name=job.filename)
+
+                with upload:
+                    codec = CompressionService.detect(upload)
+                    if not job.content_hash and codec != 'zip':
+                        # chunked and compressed uploads: hash the decoded CSV
+                        with profile.span('dedup', bytes=job.bytes_total):
+                            job.content_hash = CompressionService.content_digest(upload)
+                        IngestionJob.objects.filter(id=job.id).update(content_hash=job.content_hash)
+
+                    # an identical file may have finished while this one was queued
+                    with profile.span('dedup'):
+                        dataset = DeduplicationService.resolve(job.user, job.content_hash, job.filename)
+                    phase = 'deduplicated'
+
+                    if dataset is None:
+                        if codec == 'zip':
+                            dataset = IngestionJobQueue.run_archive(job, upload)
+                        else:
+                            processor = CSVProcessor(job.bad_value_policy or None)
+                            processor.profile = profile
+                            try:
+                                dataset = IngestionService.ingest_upload(
+                                    job.user, upload, progress=report, staged=True,
+                                    content_hash=job.content_hash, processor=processor
+                                )
+                            finally:
+                                IngestionJobQueue._save_report(job, processor)
+                        phase = 'done'
+
+                if phase == 'done':
+                    # older datasets are only hidden here, the purge runs later
+                    with profile.span('retention'):
+                        RetentionService.mark(job.user)
+
+            IngestionJob.objects.filter(id=job.id).update(
+                status='completed',
+                phase=phase,
+                dataset=dataset,
+                finished_at=timezone.now()
+            )
+        except Exception as e:
+            IngestionJob.objects.filter(id=job.id).update(
+                status='failed',
+                phase='failed',
+                error=str(e),
+                finished_at=timezone.now()
+            )
+        finally:
+            # a deduplicated upload wrote nothing, keep its spans off the dataset
+            profile.save(dataset=dataset if phase == 'done' else None, job=job)
+
+            # the spooled upload is no longer needed either way
+            if chunked:
+                ChunkedUploadService.discard(chunked)
+            else:
+                job.file.delete(save=False)
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=IngestionJobQueue._after_fork)
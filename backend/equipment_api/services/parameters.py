@@ -0,0 +1,81 @@
+"""Dynamic sensor parameter columns: discovery and packed float storage"""
+import math
+
+import numpy as np
+import pandas as pd
+
+
+class ParameterColumns:
+    """
+    Extra CSV columns beyond the required ones.
+    Numeric columns become parameters, stored per record as one packed
+    float64 array (EquipmentRecord.parameter_values) in the dataset's
+    parameter_columns order, so reading them back is a single buffer
+    decode instead of a JSON parse per row.
+    """
+
+    DTYPE = np.dtype('<f8')
+
+    # an object column is numeric if this share of its values parse
+    NUMERIC_SHARE = 0.95
+
+    @staticmethod
+    def discover(df, required):
+        """
+        Split extra columns of a raw (first) batch into numeric and categorical
+        Returns: (parameter_columns, categorical_columns)
+        """
+        numeric, categorical = [], []
+        for col in df.columns:
+            if col in required:
+                continue
+            values = df[col]
+            if pd.api.types.is_numeric_dtype(values):
+                numeric.append(col)
+                continue
+
+            present = values.dropna()
+            parsed = pd.to_numeric(present, errors='coerce').notna().sum()
+            if len(present) and parsed >= ParameterColumns.NUMERIC_SHARE * len(present):
+                numeric.append(col)
+            else:
+                categorical.append(col)
+        return numeric, categorical
+
+    @staticmethod
+    def matrix(df, columns):
+        """Parameter values of a batch as a float64 (rows x columns) array"""
+        if not columns:
+            return np.empty((len(df), 0), dtype=ParameterColumns.DTYPE)
+        # columns missing from this batch (e.g. an append) are all NaN
+        return df.reindex(columns=columns).to_numpy(dtype=ParameterColumns.DTYPE)
+
+    @staticmethod
+    def pack(df, columns):
+        """One packed blob per row, or None for every row without parameters"""
+        if not columns:
+            return [None] * len(df)
+        values = np.ascontiguousarray(ParameterColumns.matrix(df, columns))
+        width = values.shape[1] * ParameterColumns.DTYPE.itemsize
+        buffer = values.tobytes()
+        return [buffer[start:start + width] for start in range(0, len(buffer), width)]
+
+    @staticmethod
+    def unpack(blob, columns):
+        """One record's parameters as {column: value}, NaN -> None"""
+        if not blob or not columns:
+            return {}
+        values = np.frombuffer(bytes(blob), dtype=ParameterColumns.DTYPE)
+        return {
+            col: None if math.isnan(value) else value
+            for col, value in zip(columns, values.tolist())
+        }
+
+    @staticmethod
+    def unpack_many(blobs, width):
+        """Stack many records' blobs into a (rows x width) array in one decode"""
+        if width == 0:
+            return np.empty((len(blobs), 0), dtype=ParameterColumns.DTYPE)
+        missing = np.full(width, np.nan, dtype=ParameterColumns.DTYPE).tobytes()
+        buffer = b''.join(bytes(blob) if blob else missing for blob in blobs)
+        return np.frombuffer(buffer, dtype=ParameterColumns.DTYPE).reshape(-1, width)
@@ -3,94 +3,156 @@ from equipment_api.models import PredictionResult
 from datetime import datetime, timedelta
 import numpy as np
 
+from .columnar_store import load_columns
+
 
 class PredictionService:
     """Handle predictive maintenance and trend analysis"""
-    
+
+    PARAMETERS = ['flowrate', 'pressure', 'temperature']
+
+    # stored with every PredictionResult; bump when the heuristics change so
+    # old rows are neither reused nor overwritten
+    MODEL_VERSION = 1
+
+    HORIZON_DAYS = 7
+    UPSERT_BATCH = 5000
+
     @staticmethod
     def predict_trends(dataset):
-        """Analyze trends for all equipment in dataset"""
+        """
+        Analyze trends for all equipment in dataset
+        Every record is classified with array masks against the dataset-wide
+        mean and std of each parameter. Stored results are reused as they
+        are; only missing or changed ones are written, with one bulk upsert
+        keyed by (dataset, record, parameter, model version), so a repeat
+        request for an unchanged dataset does not write.
+        """
+        columns = load_columns(dataset, ['id', 'equipment_name'] + PredictionService.PARAMETERS)
+        ids = columns['id'].tolist()
+        names = columns['equipment_name'].tolist()
+
+        classified = {
+            param: [
+                array.tolist()
+                for array in PredictionService.classify(np.asarray(columns[param], dtype='float64'))
+            ]
+            for param in PredictionService.PARAMETERS
+        }
+
+        stored = {
+            (record_id, param): (predicted, confidence, trend, date)
+            for record_id, param, predicted, confidence, trend, date in
+            PredictionResult.objects.filter(
+                dataset=dataset, model_version=PredictionService.MODEL_VERSION
+            ).values_list(
+                'equipment_record_id', 'parameter', 'predicted_value',
+                'confidence', 'trend', 'prediction_date'
+            )
+        }
+
+        # Prediction for 7 days from now
+        prediction_date = datetime.now().date() + timedelta(days=PredictionService.HORIZON_DAYS)
+
         predictions = []
-        
-        for record in dataset.records.all():
-            # Predict for each parameter
-            for param in ['flowrate', 'pressure', 'temperature']:
-                prediction = PredictionService._simple_trend_prediction(
-                    record, param, dataset
+        changed = []
+        for position, record_id in enumerate(ids):
+            for param in PredictionService.PARAMETERS:
+                valid, current, trend, predicted, confidence = (
+                    column[position] for column in classified[param]
                 )
-                if prediction:
-                    predictions.append(prediction)
-        
+                if not valid:
+                    # nothing to extrapolate from a missing reading
+                    continue
+
+                previous = stored.get((record_id, param))
+                if previous and previous[:3] == (predicted, confidence, trend):
+                    date = previous[3]
+                else:
+                    date = prediction_date
+                    changed.append(PredictionResult(
+                        dataset=dataset,
+                        equipment_record_id=record_id,
+                        parameter=param,
+                        predicted_value=predicted,
+                        confidence=confidence,
+                        prediction_date=date,
+                        trend=trend,
+                        model_version=PredictionService.MODEL_VERSION
+                    ))
+
+                predictions.append({
+                    'equipment_name': names[position],
+                    'parameter': param,
+                    'current_value': current,
+                    'predicted_value': predicted,
+                    'trend': trend,
+                    'confidence': confidence,
+                    'prediction_date': str(date)
+                })
+
+        PredictionService._upsert(changed)
         return predictions
-    
+
     @staticmethod
-    def _simple_trend_prediction(record, parameter, dataset):
-        """Simple linear trend prediction based on historical data"""
-        # Get historical data for this equipment (if available)
-        # For now, use simple heuristics based on current values
-        
-        current_value = getattr(record, parameter)
-        
-        # Calculate average for this parameter across dataset
-        records = dataset.records.all()
-        values = [getattr(r, parameter) for r in records]
-        avg_value = np.mean(values)
-        std_value = np.std(values)
-        
-        # Determine trend
-        if current_value > avg_value + std_value:
-            trend = 'increasing'
-            predicted_value = current_value * 1.05  # 5% increase
-            confidence = 0.7
-        elif current_value < avg_value - std_value:
-            trend = 'decreasing'
-            predicted_value = current_value * 0.95  # 5% decrease
-            confidence = 0.7
+    def classify(values):
+        """
+        Simple trend heuristic over one parameter column
+        Above mean + std is increasing (+5%), below mean - std decreasing
+        (-5%), anything else stable; missing values are skipped.
+        Returns: (valid, values, trend, predicted, confidence) arrays
+        """
+        valid = ~np.isnan(values)
+        if valid.any():
+            avg_value, std_value = np.nanmean(values), np.nanstd(values)
         else:
-            trend = 'stable'
-            predicted_value = current_value
-            confidence = 0.85
-        
-        # Prediction for 7 days from now
-        prediction_date = datetime.now().date() + timedelta(days=7)
-        
-        # Create prediction record
-        prediction = PredictionResult.objects.create(
-            dataset=dataset,
-            equipment_record=record,
-            parameter=parameter,
-            predicted_value=predicted_value,
-            confidence=confidence,
-            prediction_date=prediction_date,
-            trend=trend
+            avg_value = std_value = np.nan
+
+        with np.errstate(invalid='ignore'):
+            increasing = values > avg_value + std_value
+            decreasing = values < avg_value - std_value
+
+        trend = np.where(increasing, 'increasing', np.where(decreasing, 'decreasing', 'stable')).astype(object)
+        predicted = values * np.where(increasing, 1.05, np.where(decreasing, 0.95, 1.0))
+        confidence = np.where(increasing | decreasing, 0.7, 0.85)
+        return valid, values, trend, predicted, confidence
+
+    @staticmethod
+    def _upsert(results):
+        """Insert or overwrite results on (dataset, record, parameter, model version)"""
+        if not results:
+            return
+        PredictionResult.objects.bulk_create(
+            results,
+            batch_size=PredictionService.UPSERT_BATCH,
+            update_conflicts=True,
+            unique_fields=['dataset', 'equipment_record', 'parameter', 'model_version'],
+            update_fields=['predicted_value', 'confidence', 'prediction_date', 'trend']
         )
-        
-        return {
-            'equipment_name': record.equipment_name,
-            'parameter': parameter,
-            'current_value': current_value,
-            'predicted_value': predicted_value,
-            'trend': trend,
-            'confidence': confidence,
-            'prediction_date': str(prediction_date)
-        }
-    
+
     @staticmethod
     def get_maintenance_alerts(dataset):
         """Get equipment that may need maintenance based on predictions"""
-        predictions = PredictionResult.objects.filter(dataset=dataset)
+        # Flag equipment with increasing temperature or pressure
+        predictions = PredictionResult.objects.filter(
+            dataset=dataset,
+            model_version=PredictionService.MODEL_VERSION,
+            parameter__in=['temperature', 'pressure'],
+            trend='increasing'
+        ).order_by('equipment_record_id', 'id').values_list(
+            'parameter', 'predicted_value', 'confidence', 'equipment_record__equipment_name',
+            'equipment_record__temperature', 'equipment_record__pressure'
+        )
+
         alerts = []
-        
-        for pred in predictions:
-            # Flag equipment with increasing temperature or pressure
-            if pred.parameter in ['temperature', 'pressure'] and pred.trend == 'increasing':
-                alerts.append({
-                    'equipment_name': pred.equipment_record.equipment_name,
-                    'parameter': pred.parameter,
-                    'current': getattr(pred.equipment_record, pred.parameter),
-                    'predicted': pred.predicted_value,
-                    'confidence': pred.confidence,
-                    'recommendation': f'Monitor {pred.parameter} - showing increasing trend'
-                })
-        
+        for parameter, predicted, confidence, name, temperature, pressure in predictions:
+            alerts.append({
+                'equipment_name': name,
+                'parameter': parameter,
+                'current': temperature if parameter == 'temperature' else pressure,
+                'predicted': predicted,
+                'confidence': confidence,
+                'recommendation': f'Monitor {parameter} - showing increasing trend'
+            })
+
         return alerts
@@ -0,0 +1,179 @@
+"""Per-phase timing spans for the ingestion pipeline"""
+import bisect
+import resource
+import sys
+import time
+from contextlib import contextmanager
+
+from equipment_api.models import IngestionSpan
+
+
+def _peak_rss_bytes():
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+class IngestionProfiler:
+    """
+    Collect wall time, rows, bytes and memory per ingestion phase.
+
+    Spans nest: a phase is charged its own (exclusive) time, so 'parse'
+    does not include the 'decode' reads pandas makes while parsing.
+    Memory is the growth of the process's peak RSS while the phase ran,
+    which is cheap to sample but shared by concurrent ingestions.
+    """
+
+    # histogram bucket upper bounds, in milliseconds
+    BUCKETS_MS = [1, 5, 10, 50, 100, 500, 1000, 5000, 10000, 60000]
+
+    def __init__(self):
+        self.phases = {}
+        self._children = []
+
+    @contextmanager
+    def span(self, phase, rows=0, bytes=0):
+        """Time the enclosed block as part of phase"""
+        started = time.perf_counter()
+        rss = _peak_rss_bytes()
+        self._children.append(0.0)
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - started
+            children = self._children.pop()
+            if self._children:
+                self._children[-1] += elapsed
+            self.add(phase, elapsed - children, rows, bytes, _peak_rss_bytes() - rss)
+
+    def add(self, phase, seconds, rows=0, bytes=0, memory=0, calls=1):
+        """Fold one measurement into a phase's totals"""
+        totals = self._totals(phase)
+        totals['seconds'] += seconds
+        totals['calls'] += calls
+        totals['rows'] += rows
+        totals['bytes'] += bytes
+        totals['memory'] = max(totals['memory'], memory)
+
+    def count(self, phase, rows=0, bytes=0):
+        """Attribute rows or bytes to a phase without timing anything"""
+        totals = self._totals(phase)
+        totals['rows'] += rows
+        totals['bytes'] += bytes
+
+    def _totals(self, phase):
+        return self.phases.setdefault(phase, {
+            'seconds': 0.0, 'calls': 0, 'rows': 0, 'bytes': 0, 'memory': 0
+        })
+
+    def timed(self, phase, iterable):
+        """Charge the time spent producing each batch (and its rows) to phase"""
+        iterator = iter(iterable)
+        while True:
+            with self.span(phase):
+                batch = next(iterator, None)
+            if batch is None:
+                return
+            self.count(phase, rows=len(batch))
+            yield batch
+
+    def stream(self, source, phase='decode'):
+        """Wrap a byte stream so its reads (I/O and decompression) are timed"""
+        return _TimedStream(source, self, phase)
+
+    def merge(self, other):
+        """Fold in spans collected elsewhere (e.g. in a worker process)"""
+        for phase, totals in other.phases.items():
+            self.add(phase, totals['seconds'], totals['rows'], totals['bytes'], totals['memory'], totals['calls'])
+
+    def as_dict(self):
+        return {
+            phase: {
+                'wall_ms': round(totals['seconds'] * 1000, 2),
+                'calls': totals['calls'],
+                'rows': totals['rows'],
+                'bytes': totals['bytes'],
+                'memory_delta_mb': round(totals['memory'] / (1024 * 1024), 2),
+            }
+            for phase, totals in self.phases.items()
+        }
+
+    def save(self, dataset=None, job=None):
+        """Store one IngestionSpan row per phase"""
+        if not self.phases:
+            return []
+        return IngestionSpan.objects.bulk_create([
+            IngestionSpan(
+                dataset=dataset,
+                job=job,
+                phase=phase,
+                wall_ms=values['wall_ms'],
+                calls=values['calls'],
+                rows=values['rows'],
+                bytes=values['bytes'],
+                memory_delta_mb=values['memory_delta_mb'],
+            )
+            for phase, values in self.as_dict().items()
+        ])
+
+    @staticmethod
+    def histogram(spans=None):
+        """
+        Per-phase latency histogram over stored spans
+        Returns: {phase: {'count', 'buckets': {'<=1ms': n, ..., '>60000ms': n},
+                  'p50_ms', 'p95_ms', 'max_ms'}}
+        """
+        spans = IngestionSpan.objects.all() if spans is None else spans
+        bounds = IngestionProfiler.BUCKETS_MS
+        labels = [f'<={bound}ms' for bound in bounds] + [f'>{bounds[-1]}ms']
+
+        latencies = {}
+        for phase, wall_ms in spans.order_by('phase', 'wall_ms').values_list('phase', 'wall_ms'):
+            latencies.setdefault(phase, []).append(wall_ms)
+
+        result = {}
+        for phase, values in latencies.items():
+            buckets = dict.fromkeys(labels, 0)
+            for value in values:
+                buckets[labels[bisect.bisect_left(bounds, value)]] += 1
+            result[phase] = {
+                'count': len(values),
+                'buckets': buckets,
+                'p50_ms': values[int(0.50 * (len(values) - 1))],
+                'p95_ms': values[int(0.95 * (len(values) - 1))],
+                'max_ms': values[-1],
+            }
+        return result
+
+
+class _TimedStream:
+    """File-like proxy that charges read time and bytes to a profiler phase"""
+
+    # pandas checks the mode for 'b'; GzipFile reports an int
+    mode = 'rb'
+
+    def __init__(self, stream, profiler, phase):
+        self._stream = stream
+        self._profiler = profiler
+        self._phase = phase
+
+    def _timed(self, method, *args):
+        with self._profiler.span(self._phase):
+            data = method(*args)
+        self._profiler.count(self._phase, bytes=len(data) if isinstance(data, bytes) else 0)
+        return data
+
+    def read(self, *args):
+        return self._timed(self._stream.read, *args)
+
+    def read1(self, *args):
+        return self._timed(getattr(self._stream, 'read1', self._stream.read), *args)
+
+    def readline(self, *args):
+        return self._timed(self._stream.readline, *args)
+
+    def __iter__(self):
+        return iter(self.readline, b'')
+
+    def __getattr__(self, name):
+        return getattr(self._stream, name)
@@ -0,0 +1,213 @@
+"""Retention: mark datasets past their policy and purge them in the background"""
+import logging
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:  # Windows: no host-wide guard, one process per host is assumed
+    fcntl = None
+
+from django.conf import settings
+from django.db import close_old_connections, connection, transaction
+from django.db.models import F, Sum, Window
+from django.db.models.functions import RowNumber
+
+from equipment_api.models import EquipmentDataset, EquipmentRecord, PredictionResult, RetentionPolicy
+
+logger = logging.getLogger(__name__)
+
+
+class RetentionService:
+    """
+    Apply per-user and per-plant retention policies.
+
+    mark() is cheap and set-based: one ranked query finds datasets past
+    their policy, one UPDATE hides them. purge() does the expensive part
+    later, off the upload path: records are deleted in bounded chunks,
+    each in its own transaction, then the dataset rows and their small
+    dependents go in one batch per RETENTION_BATCH_DATASETS datasets.
+    """
+
+    _thread = None
+    _lock = threading.Lock()
+    _lock_file = None
+
+    @staticmethod
+    def policies():
+        """
+        Resolved keep counts
+        Returns: (user_keep, plant_keep, default_plant_keep) where user_keep
+        maps user_id (None = everyone) -> keep and plant_keep maps
+        (user_id, plant) -> keep; None means unlimited
+        """
+        user_keep = {None: getattr(settings, 'RETENTION_KEEP_PER_USER', 20) or None}
+        plant_keep = {}
+        default_plant = getattr(settings, 'RETENTION_KEEP_PER_PLANT', 0) or None
+
+        for policy in RetentionPolicy.objects.all():
+            if policy.plant:
+                plant_keep[(policy.user_id, policy.plant)] = policy.keep_latest
+            else:
+                user_keep[policy.user_id] = policy.keep_latest
+
+        return user_keep, plant_keep, default_plant
+
+    @staticmethod
+    def expired_ids(user=None):
+        """Ids of ready datasets past their retention policy"""
+        user_keep, plant_keep, default_plant = RetentionService.policies()
+
+        datasets = EquipmentDataset.objects.filter(is_ready=True, marked_for_purge=False)
+        if user is not None:
+            datasets = datasets.filter(user=user)
+
+        newest_first = [F('uploaded_at').desc(), F('id').desc()]
+        ranked = datasets.annotate(
+            user_rank=Window(RowNumber(), partition_by=[F('user_id')], order_by=newest_first),
+            plant_rank=Window(RowNumber(), partition_by=[F('user_id'), F('plant')], order_by=newest_first)
+        ).values_list('id', 'user_id', 'plant', 'user_rank', 'plant_rank')
+
+        expired = []
+        for dataset_id, user_id, plant, user_rank, plant_rank in ranked:
+            keep = user_keep.get(user_id, user_keep[None])
+            if keep and user_rank > keep:
+                expired.append(dataset_id)
+                continue
+
+            if plant:
+                keep = plant_keep.get((user_id, plant), plant_keep.get((None, plant), default_plant))
+                if keep and plant_rank > keep:
+                    expired.append(dataset_id)
+        return expired
+
+    @staticmethod
+    def mark(user=None):
+        """
+        Hide datasets past their policy until the purge removes them
+        Returns: number of datasets marked
+        """
+        expired = RetentionService.expired_ids(user)
+        if not expired:
+            return 0
+        return EquipmentDataset.objects.filter(id__in=expired).update(
+            is_ready=False, marked_for_purge=True
+        )
+
+    @staticmethod
+    def pending(user=None):
+        """Datasets and record rows waiting to be purged (marked or past policy)"""
+        datasets = EquipmentDataset.objects.filter(marked_for_purge=True)
+        if user is not None:
+            datasets = datasets.filter(user=user)
+
+        ids = list(datasets.values_list('id', flat=True)) + RetentionService.expired_ids(user)
+        rows = EquipmentDataset.objects.filter(id__in=ids).aggregate(rows=Sum('total_equipment'))['rows']
+        return {'datasets': len(ids), 'rows': rows or 0}
+
+    @staticmethod
+    def purge(max_batches=None):
+        """
+        Delete marked datasets in bounded batches
+        Returns: {'datasets': n, 'rows': n} actually deleted
+        """
+        RetentionService.mark()
+
+        batch_size = getattr(settings, 'RETENTION_BATCH_DATASETS', 20)
+        deleted = {'datasets': 0, 'rows': 0}
+        batches = 0
+
+        while max_batches is None or batches < max_batches:
+            batch = list(
+                EquipmentDataset.objects.filter(marked_for_purge=True)
+                .order_by('id').values_list('id', flat=True)[:batch_size]
+            )
+            if not batch:
+                break
+
+            deleted['rows'] += RetentionService._delete_records(batch)
+            with transaction.atomic():
+                # records are gone, so the cascade only touches small tables
+                EquipmentDataset.objects.filter(id__in=batch).delete()
+            deleted['datasets'] += len(batch)
+            batches += 1
+
+        return deleted
+
+    @staticmethod
+    def _delete_records(dataset_ids):
+        """Set-based record delete, RETENTION_BATCH_ROWS rows per statement"""
+        chunk = getattr(settings, 'RETENTION_BATCH_ROWS', 50000)
+
+        # predictions point at records, remove them first (single DELETE)
+        PredictionResult.objects.filter(dataset_id__in=dataset_ids).delete()
+
+        opts = EquipmentRecord._meta
+        quote = connection.ops.quote_name
+        table = quote(opts.db_table)
+        pk = quote(opts.pk.column)
+        dataset_col = quote(opts.get_field('dataset').column)
+        placeholders = ', '.join(['%s'] * len(dataset_ids))
+        sql = (
+            f"DELETE FROM {table} WHERE {pk} IN ("
+            f"SELECT {pk} FROM {table} WHERE {dataset_col} IN ({placeholders}) LIMIT %s)"
+        )
+
+        total = 0
+        while True:
+            with transaction.atomic(), connection.cursor() as cursor:
+                cursor.execute(sql, [*dataset_ids, chunk])
+                removed = cursor.rowcount
+            total += removed
+            if removed < chunk:
+                return total
+
+    @classmethod
+    def start_background(cls):
+        """
+        Run purge() every RETENTION_INTERVAL seconds on a daemon thread
+        Only the process holding RETENTION_LOCK_FILE runs it, so one purger
+        per host however many server workers start; the lock goes with the
+        process. Returns: True if this process runs the thread
+        """
+        interval = getattr(settings, 'RETENTION_INTERVAL', 300)
+        if interval <= 0:
+            return False
+
+        with cls._lock:
+            if cls._thread is not None:
+                return True
+            if not cls._acquire_process_lock():
+                return False
+            cls._thread = threading.Thread(
+                target=cls._loop, args=(interval,), name='retention', daemon=True
+            )
+            cls._thread.start()
+        return True
+
+    @classmethod
+    def _acquire_process_lock(cls):
+        path = getattr(settings, 'RETENTION_LOCK_FILE', None)
+        if not path or fcntl is None:
+            return True
+        handle = open(path, 'a')
+        try:
+            fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            handle.close()
+            return False
+        # kept open: closing the file would release the lock
+        cls._lock_file = handle
+        return True
+
+    @staticmethod
+    def _loop(interval):
+        while True:
+            time.sleep(interval)
+            try:
+                close_old_connections()
+                RetentionService.purge()
+            except Exception:
+                logger.exception('Retention purge failed')
+            finally:
+                connection.close()
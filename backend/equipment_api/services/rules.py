@@ -0,0 +1,245 @@
+"""
+Rule expressions for alerts and root cause, compiled to NumPy predicates
+
+    pressure > 18 and temperature > 50 => critical "pump overheating"
+
+A condition combines comparisons (> >= < <= == !=) between column names
+and numbers with and / or / not and parentheses; true and false are
+literals. The level is critical, warning or info (info rules only feed
+root cause). Column names are the record measurements (flowrate,
+pressure, temperature) or a dataset's numeric parameter columns,
+case-insensitive. A comparison with a missing value is false.
+"""
+import re
+from functools import lru_cache
+
+import numpy as np
+
+from equipment_api.models import AlertRule
+
+
+class RuleSyntaxError(ValueError):
+    """An expression that does not parse"""
+
+
+_TOKEN = re.compile(r'''
+    \s*(?:
+        (?P<number>-?(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?)
+      | (?P<arrow>=>)
+      | (?P<op>>=|<=|==|!=|>|<)
+      | (?P<name>[A-Za-z_]\w*)
+      | (?P<string>"(?:[^"\\]|\\.)*"|'(?:[^'\\]|\\.)*')
+      | (?P<paren>[()])
+    )''', re.VERBOSE)
+
+_COMPARE = {
+    '>': np.greater,
+    '>=': np.greater_equal,
+    '<': np.less,
+    '<=': np.less_equal,
+    '==': np.equal,
+    '!=': np.not_equal,
+}
+
+_KEYWORDS = {'and', 'or', 'not', 'true', 'false'}
+
+
+class Rule:
+    """A compiled rule: predicate(columns, size) -> bool array"""
+
+    LEVELS = ['critical', 'warning', 'info']
+
+    def __init__(self, text, predicate, identifiers, level, message,
+                 parameter=None, threshold=None, user_defined=True):
+        self.text = text
+        self.predicate = predicate
+        # column names the condition reads, lowercase
+        self.identifiers = identifiers
+        self.level = level
+        self.message = message
+        # first column compared, and its limit for a single comparison
+        self.parameter = parameter
+        self.threshold = threshold
+        self.user_defined = user_defined
+
+    def matches(self, columns, size):
+        """Bool mask over size rows; columns maps lowercase names to arrays"""
+        return self.predicate(columns, size)
+
+    def describe(self, value=None):
+        """Message with {value} replaced by the first compared column's value"""
+        return self.message.replace('{value}', str(value))
+
+    @staticmethod
+    def for_limit(parameter, comparison, limit, level, message):
+        """Rule equivalent of one threshold limit, e.g. temperature > 130"""
+        op = '>' if comparison == 'above' else '<'
+        rule = parse_rule(f'{parameter} {op} {float(limit)!r} => {level} "{message}"')
+        return Rule(rule.text, rule.predicate, rule.identifiers, rule.level, rule.message,
+                    rule.parameter, rule.threshold, user_defined=False)
+
+    def __repr__(self):
+        return f'Rule({self.text!r})'
+
+
+@lru_cache(maxsize=1024)
+def parse_rule(text):
+    """Parse and compile one rule; compiled rules are cached by text"""
+    return _Parser(text).rule()
+
+
+def user_rules(user_id, levels=None):
+    """A user's enabled rules in order, compiled"""
+    rules = AlertRule.objects.filter(user_id=user_id, enabled=True).order_by('id')
+    compiled = [parse_rule(text) for text in rules.values_list('expression', flat=True)]
+    return [rule for rule in compiled if levels is None or rule.level in levels]
+
+
+def columns_for(rules):
+    """Every column name the rules read"""
+    return sorted({name for rule in rules for name in rule.identifiers})
+
+
+class _Parser:
+    """
+    Recursive descent over:
+        rule       := condition '=>' level [string]
+        condition  := conjunct ('or' conjunct)*
+        conjunct   := negation ('and' negation)*
+        negation   := 'not' negation | '(' condition ')' | 'true' | 'false' | comparison
+        comparison := operand op operand
+        operand    := name | number
+    """
+
+    def __init__(self, text):
+        self.text = text.strip()
+        self.tokens = self._tokenize(self.text)
+        self.position = 0
+        self.identifiers = []
+        self.comparisons = []
+
+    @staticmethod
+    def _tokenize(text):
+        tokens, position = [], 0
+        while position < len(text):
+            match = _TOKEN.match(text, position)
+            if not match or match.end() == position:
+                if not text[position:].strip():
+                    break
+                raise RuleSyntaxError(f'Unexpected character at {position}: {text[position:position + 10]!r}')
+            kind = match.lastgroup
+            tokens.append((kind, match.group(kind)))
+            position = match.end()
+        return tokens
+
+    def _peek(self):
+        return self.tokens[self.position] if self.position < len(self.tokens) else (None, None)
+
+    def _next(self, kind=None, value=None):
+        token = self._peek()
+        if token[0] is None or (kind and token[0] != kind) or (value and token[1] != value):
+            expected = value or kind or 'more input'
+            found = token[1] if token[0] else 'end of rule'
+            raise RuleSyntaxError(f'Expected {expected}, found {found!r}')
+        self.position += 1
+        return token
+
+    def _keyword(self, word):
+        kind, value = self._peek()
+        return kind == 'name' and value.lower() == word
+
+    def rule(self):
+        predicate = self.condition()
+        self._next('arrow')
+
+        kind, level = self._next('name')
+        level = level.lower()
+        if level not in Rule.LEVELS:
+            raise RuleSyntaxError(f"Level must be one of: {', '.join(Rule.LEVELS)}")
+
+        message = None
+        if self._peek()[0] == 'string':
+            raw = self._next('string')[1]
+            message = re.sub(r'\\(.)', r'\1', raw[1:-1])
+        if self._peek()[0] is not None:
+            raise RuleSyntaxError(f'Unexpected {self._peek()[1]!r} after the level')
+
+        condition_text = self.text.split('=>')[0].strip()
+        parameter = self.identifiers[0] if self.identifiers else None
+        threshold = None
+        if len(self.comparisons) == 1 and self.comparisons[0] is not None:
+            threshold = self.comparisons[0]
+
+        return Rule(
+            self.text, predicate, tuple(dict.fromkeys(self.identifiers)), level,
+            message if message is not None else condition_text,
+            parameter=parameter, threshold=threshold
+        )
+
+    def condition(self):
+        terms = [self.conjunct()]
+        while self._keyword('or'):
+            self.position += 1
+            terms.append(self.conjunct())
+        if len(terms) == 1:
+            return terms[0]
+        return lambda columns, size: np.logical_or.reduce([term(columns, size) for term in terms])
+
+    def conjunct(self):
+        terms = [self.negation()]
+        while self._keyword('and'):
+            self.position += 1
+            terms.append(self.negation())
+        if len(terms) == 1:
+            return terms[0]
+        return lambda columns, size: np.logical_and.reduce([term(columns, size) for term in terms])
+
+    def negation(self):
+        if self._keyword('not'):
+            self.position += 1
+            inner = self.negation()
+            return lambda columns, size: ~inner(columns, size)
+        if self._peek() == ('paren', '('):
+            self.position += 1
+            inner = self.condition()
+            self._next('paren', ')')
+            return inner
+        for literal, value in (('true', True), ('false', False)):
+            if self._keyword(literal):
+                self.position += 1
+                return lambda columns, size, value=value: np.full(size, value)
+        return self.comparison()
+
+    def comparison(self):
+        left, left_number = self.operand()
+        op = self._next('op')[1]
+        right, right_number = self.operand()
+        compare = _COMPARE[op]
+
+        # the limit of a simple "column op number" comparison
+        self.comparisons.append(right_number if left_number is None else left_number)
+
+        def predicate(columns, size):
+            a, b = left(columns, size), right(columns, size)
+            with np.errstate(invalid='ignore'):
+                result = compare(a, b)
+                if op == '!=':
+                    # NaN != x would be true, missing values never match
+                    result &= ~(np.isnan(a) | np.isnan(b))
+            return np.broadcast_to(result, (size,))
+        return predicate
+
+    def operand(self):
+        kind, value = self._next()
+        if kind == 'number':
+            number = float(value)
+            return (lambda columns, size: number), number
+        if kind == 'name' and value.lower() not in _KEYWORDS:
+            name = value.lower()
+            self.identifiers.append(name)
+
+            def column(columns, size):
+                values = columns.get(name)
+                return np.full(size, np.nan) if values is None else values
+            return column, None
+        raise RuleSyntaxError(f'Expected a column name or number, found {value!r}')
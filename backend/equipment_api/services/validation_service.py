@@ -2,6 +2,8 @@
 from equipment_api.models import DataValidationReport
 import pandas as pd
 
+from .columnar_store import load_columns, load_parameters
+
 
 class ValidationService:
     """Handle data quality validation"""
@@ -9,80 +11,67 @@ class ValidationService:
     @staticmethod
     def validate_dataset(dataset):
         """Perform comprehensive data quality checks"""
-        records = dataset.records.all()
-        total_records = records.count()
+        # Build the DataFrame straight from the stored columns
+        df = pd.DataFrame(load_columns(dataset, ['flowrate', 'pressure', 'temperature', 'equipment_name']))
+        total_records = len(df)
         
         if total_records == 0:
             return None
         
-        # Convert to DataFrame for analysis
-        data = list(records.values('flowrate', 'pressure', 'temperature', 'equipment_name'))
-        df = pd.DataFrame(data)
+        # core measurements plus every parameter column, checked together
+        numeric = pd.concat(
+            [df[['flowrate', 'pressure', 'temperature']], pd.DataFrame(load_parameters(dataset))],
+            axis=1
+        )
         
         # Check for missing values (shouldn't happen with our validation, but good to check)
-        missing_values = df.isnull().sum().sum()
+        missing = numeric.isnull().sum()
+        missing_values = int(missing.sum())
         
         # Check for duplicates
         duplicate_records = df.duplicated(subset=['equipment_name']).sum()
         
-        # Detect outliers using IQR method
-        outliers_count = 0
-        outlier_details = []
+        # Detect outliers using IQR method, one pass over all columns
+        quartiles = numeric.quantile([0.25, 0.75])
+        IQR = quartiles.loc[0.75] - quartiles.loc[0.25]
+        lower_bound = quartiles.loc[0.25] - 1.5 * IQR
+        upper_bound = quartiles.loc[0.75] + 1.5 * IQR
+        outlier_mask = numeric.lt(lower_bound) | numeric.gt(upper_bound)
+        outlier_counts = outlier_mask.sum()
+        outliers_count = int(outlier_counts.sum())
         
-        for column in ['flowrate', 'pressure', 'temperature']:
-            Q1 = df[column].quantile(0.25)
-            Q3 = df[column].quantile(0.75)
-            IQR = Q3 - Q1
-            lower_bound = Q1 - 1.5 * IQR
-            upper_bound = Q3 + 1.5 * IQR
-            
-            outliers = df[(df[column] < lower_bound) | (df[column] > upper_bound)]
-            outliers_count += len(outliers)
-            
-            if len(outliers) > 0:
-                outlier_details.append({
-                    'parameter': column,
-                    'count': len(outliers),
-                    'lower_bound': float(lower_bound),
-                    'upper_bound': float(upper_bound),
-                    'equipment': outliers['equipment_name'].tolist()[:5]  # First 5
-                })
+        names = df['equipment_name'].to_numpy()
+        outlier_details = [
+            {
+                'parameter': column,
+                'count': int(outlier_counts[column]),
+                'lower_bound': float(lower_bound[column]),
+                'upper_bound': float(upper_bound[column]),
+                'equipment': names[outlier_mask[column].to_numpy()][:5].tolist()  # First 5
+            }
+            for column in numeric.columns if outlier_counts[column] > 0
+        ]
         
         # Calculate quality score
         quality_score = 100
-        quality_score -= (missing_values / (total_records * 3)) * 20  # Max -20 for missing
+        quality_score -= (missing_values / (total_records * len(numeric.columns))) * 20  # Max -20 for missing
         quality_score -= (duplicate_records / total_records) * 30  # Max -30 for duplicates
         quality_score -= min((outliers_count / total_records) * 50, 50)  # Max -50 for outliers
         quality_score = max(0, quality_score)
         
+        statistics = numeric.agg(['min', 'max', 'mean', 'std'])
+        
         # Validation details
         validation_details = {
-            'missing_values_breakdown': {
-                'flowrate': int(df['flowrate'].isnull().sum()),
-                'pressure': int(df['pressure'].isnull().sum()),
-                'temperature': int(df['temperature'].isnull().sum())
-            },
+            'missing_values_breakdown': {column: int(count) for column, count in missing.items()},
             'duplicate_equipment': int(duplicate_records),
             'outliers': outlier_details,
             'statistics': {
-                'flowrate': {
-                    'min': float(df['flowrate'].min()),
-                    'max': float(df['flowrate'].max()),
-                    'mean': float(df['flowrate'].mean()),
-                    'std': float(df['flowrate'].std())
-                },
-                'pressure': {
-                    'min': float(df['pressure'].min()),
-                    'max': float(df['pressure'].max()),
-                    'mean': float(df['pressure'].mean()),
-                    'std': float(df['pressure'].std())
-                },
-                'temperature': {
-                    'min': float(df['temperature'].min()),
-                    'max': float(df['temperature'].max()),
-                    'mean': float(df['temperature'].mean()),
-                    'std': float(df['temperature'].std())
+                column: {
+                    stat: None if pd.isna(value) else float(value)
+                    for stat, value in statistics[column].items()
                 }
+                for column in numeric.columns
             }
         }
         
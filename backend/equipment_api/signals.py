@@ -0,0 +1,11 @@
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+
+from .models import EquipmentDataset
+from .services.columnar_store import ColumnarStore
+
+
+@receiver(post_delete, sender=EquipmentDataset)
+def discard_columnar_data(sender, instance, **kwargs):
+    """Remove a deleted dataset's Parquet parts"""
+    ColumnarStore.discard(instance.id)
@@ -1,3 +1,1535 @@
-from django.test import TestCase
+import functools
+import gzip
+import hashlib
+import importlib.util
+import io
+import json
+import math
+import os
+import random
+import re
+import shutil
+import tempfile
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from datetime import timedelta
+from multiprocessing import get_context
+from unittest import mock, skipIf
 
-# Create your tests here.
+import numpy as np
+import pandas as pd
+from django.contrib.auth.models import User
+from django.core.exceptions import ImproperlyConfigured
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from .benchmarks import (
+    IngestionBenchmark, SyntheticPlantData, _analyze_health_loop, _run_parse_case
+)
+from .models import (
+    AlertRule, ChunkedUpload, EquipmentDataset, EquipmentRecord, EquipmentThreshold, IngestionJob,
+    IngestionSpan, PredictionResult, RetentionPolicy
+)
+from .services.alert_service import AlertService
+from .services.analytics_cache import AnalyticsCache
+from .services.analytics_service import AnalyticsService
+from .services.chunked_upload import ChunkStream, ChunkedUploadService
+from .services.columnar_store import load_parameters
+from .services.csv_processor import CSVProcessor, pa_csv
+from .services.forecast_service import ForecastService
+from .services.ingestion_service import BulkRecordWriter, IngestionService
+from .services.job_queue import IngestionJobQueue
+from .services.parameters import ParameterColumns
+from .services.prediction_service import PredictionService
+from .services.profiling import IngestionProfiler
+from .services.retention_service import RetentionService
+from .services.rules import RuleSyntaxError, parse_rule
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+
+HEADER = 'Equipment Name,Type,Flowrate,Pressure,Temperature'
+
+
+def make_csv(rows=20, start=0, seed=0):
+    """Equipment CSV with rows random readings, names E<start>..."""
+    rng = random.Random(seed)
+    lines = [HEADER]
+    for i in range(start, start + rows):
+        lines.append(
+            f'E{i},{rng.choice(["Pump", "Valve", "Compressor"])},'
+            f'{rng.uniform(50, 250):.2f},{rng.uniform(2, 25):.2f},{rng.uniform(40, 140):.2f}'
+        )
+    return ('\n'.join(lines) + '\n').encode()
+
+
+class IngestionTestCase(TestCase):
+    """
+    Uploads go to a temporary MEDIA_ROOT and queued jobs are run inline
+    (no worker threads) with run_jobs()
+    """
+
+    def setUp(self):
+        media = tempfile.mkdtemp(prefix='equipment_test_')
+        self.addCleanup(shutil.rmtree, media, ignore_errors=True)
+        overrides = override_settings(
+            MEDIA_ROOT=media,
+            COLUMNAR_STORE_ROOT=f'{media}/columnar',
+            INGESTION_WORKERS=0,
+            RETENTION_INTERVAL=0
+        )
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+
+        self.user = User.objects.create_user('engineer', password='secret')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def upload(self, name, content, **data):
+        """POST a file to /api/upload/ and run the resulting job"""
+        response = self.client.post(
+            '/api/upload/', {'file': SimpleUploadedFile(name, content), **data}, format='multipart'
+        )
+        self.run_jobs()
+        return response
+
+    def ingest(self, content, name='readings.csv', user=None):
+        """Create a dataset directly, bypassing the queue"""
+        return IngestionService.ingest_upload(user or self.user, SimpleUploadedFile(name, content))
+
+    @staticmethod
+    def run_jobs():
+        while True:
+            job = IngestionJobQueue.claim_next()
+            if job is None:
+                return
+            IngestionJobQueue.run(job)
+
+
+class BulkRecordWriterTests(IngestionTestCase):
+
+    def test_rows_are_inserted_in_batches(self):
+        content = make_csv(250, seed=13)
+        df = CSVProcessor().validate_and_parse(SimpleUploadedFile('readings.csv', content))
+        dataset = EquipmentDataset.objects.create(user=self.user, filename='readings.csv', total_equipment=0)
+
+        with CaptureQueriesContext(connection) as queries:
+            written = BulkRecordWriter(dataset, batch_size=100).write(df)
+        # executemany is logged once per call, as '<n> times: INSERT ...'
+        inserts = [q['sql'] for q in queries.captured_queries if 'INSERT INTO' in q['sql']]
+        self.assertEqual(written, 250)
+        self.assertEqual([sql.split(' ')[0] for sql in inserts], ['100', '100', '50'])
+
+        records = list(dataset.records.order_by('id').values_list(
+            'equipment_name', 'equipment_type', 'flowrate', 'pressure', 'temperature', 'alert_level'
+        ))
+        expected = list(zip(
+            df['Equipment Name'], df['Type'].astype(str), df['Flowrate'], df['Pressure'],
+            df['Temperature'], ['normal'] * 250
+        ))
+        self.assertEqual(records, expected)
+
+    def test_copy_values_are_escaped(self):
+        encode = BulkRecordWriter._copy_value
+        self.assertEqual(encode(None), '\\N')
+        self.assertEqual(encode(1.5), '1.5')
+        self.assertEqual(encode(b'\x00\xff'), '\\\\x00ff')
+        self.assertEqual(encode('a\tb\nc\\d'), 'a\\tb\\nc\\\\d')
+
+
+class StreamingParseTests(IngestionTestCase):
+
+    def test_batches_match_a_whole_file_parse(self):
+        content = make_csv(1050, seed=14)
+        whole = CSVProcessor(engine='c').validate_and_parse(SimpleUploadedFile('readings.csv', content))
+
+        batches = list(CSVProcessor(engine='c').iter_batches(SimpleUploadedFile('readings.csv', content), 100))
+        self.assertEqual([len(batch) for batch in batches], [100] * 10 + [50])
+        pd.testing.assert_frame_equal(pd.concat(batches), whole)
+
+    def test_large_and_compressed_uploads_stream(self):
+        processor = CSVProcessor()
+        processor.STREAMING_THRESHOLD = 10000
+        self.assertFalse(processor.should_stream(SimpleUploadedFile('small.csv', make_csv(20))))
+        self.assertTrue(processor.should_stream(SimpleUploadedFile('large.csv', make_csv(1000))))
+        self.assertTrue(processor.should_stream(SimpleUploadedFile('small.csv.gz', gzip.compress(make_csv(20)))))
+
+    def test_streamed_ingest_matches_a_whole_file_ingest(self):
+        content = make_csv(1050, seed=15)
+        whole = self.ingest(content)
+
+        processor = CSVProcessor()
+        processor.STREAMING_THRESHOLD = 0
+        processor.CHUNK_ROWS = 100
+        streamed = IngestionService.ingest_upload(
+            self.user, SimpleUploadedFile('readings.csv', content), processor=processor
+        )
+
+        # written batch by batch
+        self.assertEqual(processor.profile.phases['insert']['calls'], 11)
+        self.assertEqual(streamed.records.count(), 1050)
+        for field in ['total_equipment', 'avg_flowrate', 'avg_pressure', 'avg_temperature', 'type_distribution']:
+            self.assertEqual(getattr(streamed, field), getattr(whole, field), field)
+
+    def test_missing_column_in_the_header(self):
+        content = b'Equipment Name,Type,Flowrate\nE1,Pump,1\n'
+        with self.assertRaisesMessage(ValueError, 'Missing required columns: Pressure, Temperature'):
+            list(CSVProcessor().iter_batches(SimpleUploadedFile('readings.csv', content), 100))
+
+
+class UploadJobTests(IngestionTestCase):
+
+    def test_upload_is_queued_and_ingested_by_a_job(self):
+        content = make_csv(30)
+        response = self.client.post(
+            '/api/upload/', {'file': SimpleUploadedFile('readings.csv', content)}, format='multipart'
+        )
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.data['status'], 'queued')
+
+        self.run_jobs()
+        job = self.client.get(f"/api/jobs/{response.data['id']}/").data
+        self.assertEqual(job['status'], 'completed', job['error'])
+        self.assertEqual(job['rows_persisted'], 30)
+
+        dataset = EquipmentDataset.objects.get(id=job['dataset'])
+        self.assertTrue(dataset.is_ready)
+        self.assertEqual(dataset.total_equipment, 30)
+        self.assertEqual(dataset.records.count(), 30)
+        self.assertEqual(dataset.content_hash, IngestionJob.objects.get(id=job['id']).content_hash)
+
+        df = CSVProcessor().validate_and_parse(SimpleUploadedFile('readings.csv', content))
+        self.assertAlmostEqual(dataset.avg_flowrate, round(df['Flowrate'].mean(), 2))
+
+    def test_missing_column_fails_the_job(self):
+        self.upload('readings.csv', b'Equipment Name,Type,Flowrate\nE1,Pump,1\n')
+
+        job = IngestionJob.objects.get()
+        self.assertEqual(job.status, 'failed')
+        self.assertIn('Missing required columns', job.error)
+        self.assertFalse(EquipmentDataset.objects.exists())
+    @override_settings(INGESTION_JOB_TIMEOUT=60)
+    def test_stale_running_job_is_requeued_and_rerun(self):
+        response = self.client.post(
+            '/api/upload/', {'file': SimpleUploadedFile('readings.csv', make_csv(30))}, format='multipart'
+        )
+        job = IngestionJobQueue.claim_next()
+        self.assertEqual(job.id, response.data['id'])
+        # a worker that staged part of the dataset, then died
+        partial = EquipmentDataset.objects.create(
+            user=self.user, filename='readings.csv', total_equipment=0, is_ready=False
+        )
+        self.assertEqual(IngestionJobQueue.requeue_stale(), 0)
+
+        long_ago = timezone.now() - timedelta(minutes=5)
+        IngestionJob.objects.filter(id=job.id).update(heartbeat_at=long_ago)
+        self.run_jobs()
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'completed', job.error)
+        partial.refresh_from_db()
+        self.assertTrue(partial.marked_for_purge)
+        self.assertEqual(EquipmentDataset.objects.filter(is_ready=True).get().id, job.dataset_id)
+
+    def test_jobs_of_other_users_are_hidden(self):
+        self.upload('readings.csv', make_csv())
+        job = IngestionJob.objects.get()
+
+        other = APIClient()
+        other.force_authenticate(User.objects.create_user('someone'))
+        self.assertEqual(other.get(f'/api/jobs/{job.id}/').status_code, 404)
+
+
+@override_settings(BATCH_UPLOAD_WORKERS=1)
+class BatchUploadTests(IngestionTestCase):
+    """Batch uploads parsed on a one-worker process pool"""
+
+    def batch(self, *files, **data):
+        response = self.client.post(
+            '/api/batch-upload/',
+            {'files': [SimpleUploadedFile(name, content) for name, content in files], **data},
+            format='multipart'
+        )
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_results_and_commits_follow_upload_order(self):
+        archive = io.BytesIO()
+        with zipfile.ZipFile(archive, 'w') as z:
+            z.writestr('plant/a.csv', make_csv(5, seed=2))
+            z.writestr('plant/readme.txt', 'not data')
+            z.writestr('b.csv', make_csv(6, seed=3))
+
+        data = self.batch(
+            ('first.csv', make_csv(30, seed=1)),
+            ('notes.txt', b'not a csv'),
+            ('broken.csv', b'Equipment Name,Type\nE1,Pump\n'),
+            ('plant.zip', archive.getvalue()),
+            ('last.csv', make_csv(8, seed=4)),
+        )
+
+        results = data['results']
+        self.assertEqual(
+            [(r['filename'], r['success']) for r in results],
+            [('first.csv', True), ('notes.txt', False), ('broken.csv', False),
+             ('a.csv', True), ('b.csv', True), ('last.csv', True)]
+        )
+        self.assertIn('Missing required columns', results[2]['error'])
+        self.assertEqual((data['successful'], data['failed'], data['total_rows']), (4, 2, 49))
+
+        committed = [r['dataset_id'] for r in results if r['success']]
+        self.assertEqual(committed, sorted(committed))
+        self.assertEqual(
+            list(EquipmentDataset.objects.order_by('id').values_list('filename', 'total_equipment')),
+            [('first.csv', 30), ('a.csv', 5), ('b.csv', 6), ('last.csv', 8)]
+        )
+
+    def test_repeated_files_are_deduplicated(self):
+        content = make_csv(12, seed=5)
+        first = self.batch(('readings.csv', content))['results'][0]
+        again = self.batch(('copy.csv', content), ('readings.csv.gz', gzip.compress(content)))['results']
+
+        self.assertEqual([r['dataset_id'] for r in again], [first['dataset_id']] * 2)
+        self.assertTrue(all(r['deduplicated'] for r in again))
+        self.assertEqual(EquipmentDataset.objects.count(), 1)
+
+    @override_settings(RETENTION_KEEP_PER_USER=2)
+    def test_retention_is_marked_after_the_commits(self):
+        self.batch(*[(f'{seed}.csv', make_csv(5, seed=seed)) for seed in range(3)])
+
+        self.assertEqual(
+            list(EquipmentDataset.objects.filter(marked_for_purge=True).values_list('filename', flat=True)),
+            ['0.csv']
+        )
+
+    @override_settings(CSV_BAD_VALUE_POLICY='drop')
+    def test_spawned_workers_get_resolved_settings(self):
+        # a spawned child imports Django afresh and would not see this
+        # override; the pipeline passes the resolved policy instead
+        spawn = functools.partial(ProcessPoolExecutor, mp_context=get_context('spawn'))
+        content = make_csv(10, seed=6).replace(b'\nE3,', b'\nE3,Pump,abc,1,2\nE3x,', 1)
+
+        with mock.patch('equipment_api.services.batch_ingestion.ProcessPoolExecutor', spawn):
+            result = self.batch(('readings.csv', content))['results'][0]
+
+        self.assertTrue(result['success'], result.get('error'))
+        self.assertEqual(result['rows'], 10)
+        self.assertEqual(result['coercion_report']['bad_rows'], 1)
+
+
+class ChunkedUploadTests(IngestionTestCase):
+
+    def start(self, content, chunk_size, filename='readings.csv'):
+        response = self.client.post(
+            '/api/uploads/', {'filename': filename, 'total_size': len(content), 'chunk_size': chunk_size},
+            format='json'
+        )
+        self.assertEqual(response.status_code, 201)
+        return response.data
+
+    def put(self, upload, index, data, checksum=None):
+        return self.client.put(
+            f"/api/uploads/{upload['id']}/chunks/{index}/", data=data,
+            content_type='application/octet-stream',
+            HTTP_X_CHUNK_CHECKSUM=hashlib.sha256(data).hexdigest() if checksum is None else checksum
+        )
+
+    def complete(self, upload):
+        return self.client.post(f"/api/uploads/{upload['id']}/complete/", {}, format='json')
+
+    @staticmethod
+    def chunks(content, size):
+        return [content[start:start + size] for start in range(0, len(content), size)]
+
+    def test_chunks_are_ingested_end_to_end(self):
+        content = make_csv(200, seed=16)
+        upload = self.start(content, 1000)
+        parts = self.chunks(content, 1000)
+        self.assertEqual(upload['total_chunks'], len(parts))
+
+        # any order
+        for index in reversed(range(len(parts))):
+            self.assertEqual(self.put(upload, index, parts[index]).status_code, 200)
+        response = self.complete(upload)
+        self.assertEqual(response.status_code, 202)
+        self.run_jobs()
+
+        job = IngestionJob.objects.get(id=response.data['id'])
+        self.assertEqual(job.status, 'completed', job.error)
+        self.assertEqual(job.content_hash, hashlib.sha256(content).hexdigest())
+        self.assertEqual(job.dataset.total_equipment, 200)
+        self.assertFalse(os.path.exists(ChunkedUploadService.spool_dir(ChunkedUpload.objects.get())))
+
+        # the same file again is de-duplicated by the worker
+        upload = self.start(content, 4096, filename='again.csv')
+        for index, part in enumerate(self.chunks(content, 4096)):
+            self.put(upload, index, part)
+        response = self.complete(upload)
+        self.run_jobs()
+        again = IngestionJob.objects.get(id=response.data['id'])
+        self.assertEqual((again.phase, again.dataset_id), ('deduplicated', job.dataset_id))
+        self.assertEqual(EquipmentDataset.objects.count(), 1)
+
+    def test_bad_chunks_are_rejected(self):
+        content = make_csv(50)
+        upload = self.start(content, 1000)
+        part = content[:1000]
+
+        response = self.put(upload, 0, part, checksum='0' * 64)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['error'], 'Checksum mismatch for chunk 0')
+        self.assertEqual(self.put(upload, 0, part[:-1]).status_code, 400)
+        self.assertEqual(self.put(upload, 0, part, checksum='').status_code, 400)
+
+        response = self.put(upload, upload['total_chunks'], part)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('Chunk index must be between 0 and', response.data['error'])
+
+        status = self.client.get(f"/api/uploads/{upload['id']}/").data
+        self.assertEqual(status['received_chunks'], [])
+
+    def test_resume_and_missing_chunks(self):
+        content = make_csv(100, seed=17)
+        upload = self.start(content, 1000)
+        parts = self.chunks(content, 1000)
+        for index in range(0, len(parts), 2):
+            self.put(upload, index, parts[index])
+
+        status = self.client.get(f"/api/uploads/{upload['id']}/").data
+        self.assertEqual(status['received_chunks'], list(range(0, len(parts), 2)))
+        response = self.complete(upload)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['error'], f'Missing chunks: {list(range(1, len(parts), 2))}')
+        self.assertFalse(IngestionJob.objects.exists())
+
+        # resume: send only what the server does not have
+        missing = set(range(len(parts))) - set(status['received_chunks'])
+        for index in sorted(missing):
+            self.put(upload, index, parts[index])
+        self.assertEqual(self.complete(upload).status_code, 202)
+
+    def test_finalize_only_once(self):
+        content = make_csv(20)
+        upload = self.start(content, len(content))
+        self.put(upload, 0, content)
+
+        self.assertEqual(self.complete(upload).status_code, 202)
+        response = self.complete(upload)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['error'], 'Upload is already finalized')
+        self.assertEqual(self.put(upload, 0, content).status_code, 400)
+        self.assertEqual(IngestionJob.objects.count(), 1)
+
+    def test_invalid_sessions(self):
+        for data in [
+            {'filename': 'readings.txt', 'total_size': 10},
+            {'filename': 'readings.csv', 'total_size': 0},
+            {'filename': 'readings.csv', 'total_size': 'many'},
+            {'filename': 'readings.csv', 'total_size': 10, 'chunk_size': 10 ** 12},
+        ]:
+            with self.subTest(data=data):
+                self.assertEqual(self.client.post('/api/uploads/', data, format='json').status_code, 400)
+
+        upload = self.start(make_csv(), 100)
+        other = APIClient()
+        other.force_authenticate(User.objects.create_user('someone'))
+        self.assertEqual(other.get(f"/api/uploads/{upload['id']}/").status_code, 404)
+
+    def test_chunk_stream_reads_across_parts(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        paths = []
+        for index, data in enumerate([b'abc', b'', b'defg', b'h']):
+            paths.append(os.path.join(directory, f'{index}.part'))
+            with open(paths[-1], 'wb') as f:
+                f.write(data)
+
+        stream = io.BufferedReader(ChunkStream(paths), buffer_size=2)
+        self.assertEqual(stream.read(), b'abcdefgh')
+        stream.seek(2)
+        self.assertEqual(stream.read(3), b'cde')
+        stream.seek(-2, io.SEEK_END)
+        self.assertEqual(stream.read(), b'gh')
+
+
+class CoercionPolicyTests(IngestionTestCase):
+    """Non-numeric measurement cells under each bad_value_policy"""
+
+    CONTENT = (
+        f'{HEADER}\n'
+        'E1,Pump,100,5,60\n'
+        'E2,Pump,abc,6,61\n'
+        'E3,Valve,300,7,xx\n'
+        'E4,Valve,200,8,62\n'
+    ).encode()
+
+    def test_reject_fails_with_a_report(self):
+        self.upload('readings.csv', self.CONTENT, bad_value_policy='reject')
+
+        job = IngestionJob.objects.get()
+        self.assertEqual(job.status, 'failed')
+        self.assertEqual(job.coercion_report['bad_cells'], 2)
+        self.assertEqual(job.coercion_report['bad_rows'], 2)
+        self.assertEqual(
+            [(sample['line'], sample['column']) for sample in job.coercion_report['samples']],
+            [(3, 'Flowrate'), (4, 'Temperature')]
+        )
+        self.assertFalse(EquipmentDataset.objects.exists())
+
+    def test_drop_skips_bad_rows(self):
+        self.upload('readings.csv', self.CONTENT, bad_value_policy='drop')
+
+        dataset = EquipmentDataset.objects.get()
+        self.assertEqual(dataset.total_equipment, 2)
+        self.assertEqual(list(dataset.records.values_list('equipment_name', flat=True)), ['E1', 'E4'])
+        self.assertEqual(IngestionJob.objects.get().coercion_report['bad_rows'], 2)
+
+    def test_impute_fills_the_column_mean(self):
+        self.upload('readings.csv', self.CONTENT, bad_value_policy='impute')
+
+        dataset = EquipmentDataset.objects.get()
+        self.assertEqual(dataset.total_equipment, 4)
+        records = {r.equipment_name: r for r in dataset.records.all()}
+        self.assertAlmostEqual(records['E2'].flowrate, 200.0)
+        self.assertAlmostEqual(records['E3'].temperature, 61.0)
+
+    def test_unknown_policy_is_a_400(self):
+        response = self.client.post(
+            '/api/upload/',
+            {'file': SimpleUploadedFile('readings.csv', self.CONTENT), 'bad_value_policy': 'guess'},
+            format='multipart'
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(IngestionJob.objects.exists())
+    def test_streamed_impute_uses_the_file_mean(self):
+        lines = [HEADER]
+        for i in range(500):
+            # rows 100-199 have no valid flowrate: a chunk with nothing to average
+            flowrate = 'bad' if 100 <= i < 200 or i % 37 == 0 else str(50 + i % 13)
+            lines.append(f'E{i},Pump,{flowrate},5,60')
+        content = ('\n'.join(lines) + '\n').encode()
+        valid = [float(line.split(',')[2]) for line in lines[1:] if ',bad,' not in line]
+
+        processor = CSVProcessor('impute', engine='c')
+        df = pd.concat(processor.iter_batches(SimpleUploadedFile('readings.csv', content), 100))
+
+        bad = df['Equipment Name'].isin([f'E{i}' for i in range(500) if 100 <= i < 200 or i % 37 == 0])
+        self.assertEqual(len(df), 500)
+        self.assertEqual(df.loc[bad, 'Flowrate'].nunique(), 1)
+        self.assertAlmostEqual(df.loc[bad, 'Flowrate'].iloc[0], sum(valid) / len(valid))
+        self.assertEqual(processor.report.bad_cells, bad.sum())
+
+    def test_impute_without_any_valid_value_fails(self):
+        content = f'{HEADER}\nE1,Pump,n/a,5,60\nE2,Pump,?,6,61\n'.encode()
+        self.upload('readings.csv', content, bad_value_policy='impute')
+
+        job = IngestionJob.objects.get()
+        self.assertEqual(job.status, 'failed')
+        self.assertIn('Cannot impute Flowrate: it has no numeric values', job.error)
+        self.assertFalse(EquipmentDataset.objects.exists())
+
+        with self.assertRaisesMessage(ValueError, 'Cannot impute Flowrate'):
+            list(CSVProcessor('impute').iter_batches(SimpleUploadedFile('readings.csv', content), 1))
+
+
+class DeduplicationTests(IngestionTestCase):
+
+    def test_plain_gzip_and_zip_copies_share_one_dataset(self):
+        content = make_csv()
+        archive = io.BytesIO()
+        with zipfile.ZipFile(archive, 'w', zipfile.ZIP_DEFLATED) as z:
+            z.writestr('readings.csv', content)
+
+        self.upload('readings.csv', content)
+        self.upload('readings.csv.gz', gzip.compress(content))
+        self.upload('readings.zip', archive.getvalue())
+
+        self.assertEqual(EquipmentDataset.objects.count(), 1)
+        dataset = EquipmentDataset.objects.get()
+        jobs = IngestionJob.objects.filter(parent__isnull=True)
+        self.assertEqual(jobs.count(), 3)
+        for job in jobs:
+            self.assertEqual(job.status, 'completed', job.error)
+            self.assertEqual(job.dataset_id, dataset.id)
+        self.assertEqual(jobs.get(filename='readings.csv.gz').phase, 'deduplicated')
+        # zip members are matched one by one
+        self.assertEqual(IngestionJob.objects.get(parent__isnull=False).phase, 'deduplicated')
+
+    def test_gzip_first_then_plain_is_deduplicated(self):
+        content = make_csv()
+        self.upload('readings.csv.gz', gzip.compress(content))
+        response = self.upload('readings.csv', content)
+
+        # the plain copy is matched in the request, against the decoded digest
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['phase'], 'deduplicated')
+        self.assertEqual(EquipmentDataset.objects.count(), 1)
+
+
+class SyntheticPlantDataTests(TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp(prefix='equipment_bench_')
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+
+    def generate(self, rows, chunk_rows=None, **options):
+        data = SyntheticPlantData(**options)
+        if chunk_rows:
+            data.CHUNK_ROWS = chunk_rows
+        path = os.path.join(self.directory, f'plant_{rows}.csv')
+        data.write(path, rows)
+        return path, pd.read_csv(path)
+
+    def test_row_count_and_columns(self):
+        path, df = self.generate(2500, chunk_rows=1000)
+        self.assertEqual(len(df), 2500)
+        self.assertEqual(list(df.columns), HEADER.split(','))
+        # names are numbered per type across chunks
+        self.assertTrue(df['Equipment Name'].is_unique)
+        for kind, group in df.groupby('Type'):
+            numbers = sorted(group['Equipment Name'].str.rsplit('-', n=1).str[1].astype(int))
+            self.assertEqual(numbers, list(range(1, len(group) + 1)))
+
+    def test_type_mix(self):
+        path, df = self.generate(20000, type_mix={'Pump': 3, 'Valve': 1}, outlier_rate=0)
+        shares = df['Type'].value_counts(normalize=True)
+        self.assertEqual(set(shares.index), {'Pump', 'Valve'})
+        self.assertAlmostEqual(shares['Pump'], 0.75, delta=0.02)
+
+        with self.assertRaises(ValueError):
+            SyntheticPlantData(type_mix={'Pump': 1, 'Turbine': 1})
+        self.assertEqual(SyntheticPlantData.parse_mix('Pump=0.5, Valve=0.5'), {'Pump': 0.5, 'Valve': 0.5})
+
+    def test_outlier_rate(self):
+        for rate in [0, 0.05]:
+            path, df = self.generate(20000, outlier_rate=rate, seed=3)
+            baselines = np.array([SyntheticPlantData.PROFILES[kind] for kind in df['Type']])
+            ratio = df[['Flowrate', 'Pressure', 'Temperature']].to_numpy() / baselines
+            # noise is 5%, outliers are pushed 1.5-3x away
+            outliers = (ratio > 1.4).any(axis=1)
+            self.assertAlmostEqual(outliers.mean(), rate, delta=0.01)
+
+    def test_same_seed_same_file(self):
+        first, _ = self.generate(500, seed=7)
+        with open(first, 'rb') as f:
+            content = f.read()
+        second, _ = self.generate(500, seed=7)
+        with open(second, 'rb') as f:
+            self.assertEqual(f.read(), content)
+
+    def test_generated_file_parses_and_results_are_appended(self):
+        path, df = self.generate(3000)
+        result = _run_parse_case(path, 'c')
+        self.assertEqual(result['engine'], 'c')
+        self.assertEqual(result['phases']['parse']['rows'], 3000)
+
+        output = os.path.join(self.directory, 'results.jsonl')
+        IngestionBenchmark.write_results([{'rows': 1}], output)
+        IngestionBenchmark.write_results([{'rows': 2}], output)
+        with open(output) as f:
+            self.assertEqual([json.loads(line)['rows'] for line in f], [1, 2])
+
+
+class RetentionTests(IngestionTestCase):
+
+    def make_datasets(self, count, plant=None):
+        datasets = [self.ingest(make_csv(10, seed=seed), f'{seed}.csv') for seed in range(count)]
+        if plant:
+            EquipmentDataset.objects.filter(id__in=[d.id for d in datasets]).update(plant=plant)
+        return datasets
+
+    @override_settings(RETENTION_KEEP_PER_USER=2)
+    def test_mark_hides_the_oldest_and_purge_deletes_them(self):
+        datasets = self.make_datasets(4)
+
+        self.assertEqual(RetentionService.mark(self.user), 2)
+        marked = EquipmentDataset.objects.filter(marked_for_purge=True)
+        self.assertEqual(set(marked.values_list('id', flat=True)), {datasets[0].id, datasets[1].id})
+        self.assertFalse(marked.filter(is_ready=True).exists())
+        self.assertEqual(RetentionService.pending(self.user), {'datasets': 2, 'rows': 20})
+
+        self.assertEqual(RetentionService.purge(), {'datasets': 2, 'rows': 20})
+        self.assertEqual(
+            set(EquipmentDataset.objects.values_list('id', flat=True)), {datasets[2].id, datasets[3].id}
+        )
+        self.assertEqual(EquipmentRecord.objects.count(), 20)
+
+    @override_settings(RETENTION_KEEP_PER_USER=0)
+    def test_plant_policy_keeps_the_latest_per_plant(self):
+        RetentionPolicy.objects.create(user=self.user, plant='North', keep_latest=1)
+        north = self.make_datasets(3, plant='North')
+        south = self.ingest(make_csv(10, seed=9), 'south.csv')
+
+        self.assertEqual(RetentionService.mark(self.user), 2)
+        kept = EquipmentDataset.objects.filter(marked_for_purge=False)
+        self.assertEqual(set(kept.values_list('id', flat=True)), {north[2].id, south.id})
+    @override_settings(
+        RETENTION_KEEP_PER_USER=1, RETENTION_BATCH_DATASETS=2, RETENTION_BATCH_ROWS=3
+    )
+    def test_purge_runs_in_bounded_batches(self):
+        datasets = self.make_datasets(6)
+        PredictionService.predict_trends(datasets[0])
+
+        self.assertEqual(RetentionService.purge(max_batches=2), {'datasets': 4, 'rows': 40})
+        self.assertEqual(RetentionService.purge(), {'datasets': 1, 'rows': 10})
+        self.assertEqual(list(EquipmentDataset.objects.values_list('id', flat=True)), [datasets[5].id])
+        self.assertFalse(PredictionResult.objects.exists())
+
+    @skipIf(fcntl is None, 'flock is not available on this platform')
+    @override_settings(RETENTION_INTERVAL=60)
+    def test_one_purger_per_lock_file(self):
+        path = os.path.join(tempfile.mkdtemp(), 'retention.lock')
+        self.addCleanup(shutil.rmtree, os.path.dirname(path))
+
+        with override_settings(RETENTION_LOCK_FILE=path), open(path, 'a') as held:
+            # another process (here: another open file) runs the purger
+            fcntl.flock(held, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            self.assertFalse(RetentionService.start_background())
+            self.assertIsNone(RetentionService._thread)
+
+            fcntl.flock(held, fcntl.LOCK_UN)
+            self.assertTrue(RetentionService._acquire_process_lock())
+            self.addCleanup(setattr, RetentionService, '_lock_file', None)
+            self.addCleanup(RetentionService._lock_file.close)
+            with self.assertRaises(OSError):
+                fcntl.flock(held, fcntl.LOCK_EX | fcntl.LOCK_NB)
+
+
+class AppendSummaryTests(IngestionTestCase):
+
+    def test_running_summary_matches_a_full_recompute(self):
+        first, second = make_csv(40, seed=1), make_csv(25, start=40, seed=2)
+        dataset = self.ingest(first)
+
+        response = self.client.post(
+            f'/api/datasets/{dataset.id}/append/',
+            {'file': SimpleUploadedFile('more.csv', second)}, format='multipart'
+        )
+        self.assertEqual(response.status_code, 202)
+        self.run_jobs()
+
+        dataset.refresh_from_db()
+        combined = first + second.split(b'\n', 1)[1]
+        expected = AnalyticsService().calculate_summary(
+            CSVProcessor().validate_and_parse(SimpleUploadedFile('all.csv', combined))
+        )
+        self.assertEqual(dataset.total_equipment, 65)
+        self.assertEqual(dataset.records.count(), 65)
+        for field in ['avg_flowrate', 'avg_pressure', 'avg_temperature']:
+            self.assertAlmostEqual(getattr(dataset, field), expected[field], places=2)
+        self.assertEqual(dataset.type_distribution, expected['type_distribution'])
+        self.assertEqual(dataset.version, 2)
+    def test_extra_columns_follow_the_dataset(self):
+        dataset = self.ingest(
+            f'{HEADER},Vibration,Zone\nE1,Pump,100,5,60,2.0,A\nE2,Valve,120,6,61,4.0,B\n'.encode()
+        )
+        # Vibration missing, Noise not part of the dataset
+        appended = IngestionService.append_upload(dataset, SimpleUploadedFile(
+            'more.csv', f'{HEADER},Noise,Zone\nE3,Pump,140,7,62,9.0,C\n'.encode()
+        ))
+
+        self.assertEqual(appended.parameter_columns, ['Vibration'])
+        self.assertEqual(appended.categorical_columns, ['Zone'])
+        self.assertEqual(appended.parameter_averages, {'Vibration': 3.0})
+        np.testing.assert_array_equal(load_parameters(appended)['Vibration'], [2.0, 4.0, np.nan])
+        self.assertEqual(
+            list(appended.records.order_by('id').values_list('parameters', flat=True)),
+            [{'Zone': 'A'}, {'Zone': 'B'}, {'Zone': 'C'}]
+        )
+
+    def test_failed_append_changes_nothing(self):
+        dataset = self.ingest(make_csv(10))
+        self.client.post(
+            f'/api/datasets/{dataset.id}/append/',
+            {'file': SimpleUploadedFile('more.csv', b'Equipment Name,Type\nE1,Pump\n')}, format='multipart'
+        )
+        self.run_jobs()
+
+        self.assertEqual(IngestionJob.objects.get().status, 'failed')
+        dataset.refresh_from_db()
+        self.assertEqual((dataset.version, dataset.total_equipment, dataset.records.count()), (1, 10, 10))
+
+    def test_only_the_owner_can_append(self):
+        dataset = self.ingest(make_csv(10), user=User.objects.create_user('someone'))
+        response = self.client.post(
+            f'/api/datasets/{dataset.id}/append/',
+            {'file': SimpleUploadedFile('more.csv', make_csv(5))}, format='multipart'
+        )
+        self.assertEqual(response.status_code, 404)
+        self.assertFalse(IngestionJob.objects.exists())
+
+
+class ParameterColumnsTests(IngestionTestCase):
+
+    def test_pack_unpack_round_trip(self):
+        df = pd.DataFrame({'Vibration': [1.5, np.nan, -2.0], 'Noise': [70.0, 71.0, np.nan]})
+        columns = ['Vibration', 'Noise', 'Humidity']  # Humidity is not in the batch
+        blobs = ParameterColumns.pack(df, columns)
+
+        self.assertEqual([len(blob) for blob in blobs], [24] * 3)
+        self.assertEqual(
+            [ParameterColumns.unpack(blob, columns) for blob in blobs[:2]],
+            [{'Vibration': 1.5, 'Noise': 70.0, 'Humidity': None}, {'Vibration': None, 'Noise': 71.0, 'Humidity': None}]
+        )
+        self.assertEqual(ParameterColumns.unpack(None, columns), {})
+
+        # a record without parameters (None) unpacks as a row of NaN
+        stacked = ParameterColumns.unpack_many(blobs + [None], len(columns))
+        np.testing.assert_array_equal(stacked, [
+            [1.5, 70.0, np.nan], [np.nan, 71.0, np.nan], [-2.0, np.nan, np.nan], [np.nan] * 3
+        ])
+        self.assertEqual(ParameterColumns.pack(df, []), [None] * 3)
+        self.assertEqual(ParameterColumns.unpack_many(blobs, 0).shape, (3, 0))
+
+    def test_discover_splits_numeric_and_categorical(self):
+        df = pd.DataFrame({
+            'Equipment Name': ['E1', 'E2'], 'Vibration': [1.0, 2.0],
+            'Noise': ['70', '71'], 'Zone': ['A', 'B']
+        })
+        self.assertEqual(ParameterColumns.discover(df, {'Equipment Name'}), (['Vibration', 'Noise'], ['Zone']))
+
+    def test_api_returns_the_uploaded_parameters(self):
+        content = (
+            f'{HEADER},Vibration,Zone\n'
+            'E1,Pump,100,5,60,2.5,A\n'
+            'E2,Valve,120,6,61,,B\n'
+            'E3,Pump,140,7,62,-1.5,C\n'
+        )
+        dataset = self.ingest(content.encode())
+
+        records = self.client.get(f'/api/datasets/{dataset.id}/').json()['records']
+        self.assertEqual(
+            [(record['equipment_name'], record['parameters']) for record in sorted(records, key=lambda r: r['id'])],
+            [
+                ('E1', {'Vibration': 2.5, 'Zone': 'A'}),
+                ('E2', {'Vibration': None, 'Zone': 'B'}),
+                ('E3', {'Vibration': -1.5, 'Zone': 'C'}),
+            ]
+        )
+
+        payload = self.client.get(f'/api/datasets/{dataset.id}/parameters/').json()
+        self.assertEqual(payload['parameter_columns'], ['Vibration'])
+        self.assertEqual(payload['parameter_averages'], {'Vibration': 0.5})
+        self.assertEqual(payload['ids'], sorted(record['id'] for record in records))
+        self.assertEqual(payload['values'], {'Vibration': [2.5, None, -1.5]})
+
+
+class ProfilingTests(IngestionTestCase):
+
+    def test_nested_spans_are_exclusive(self):
+        profile = IngestionProfiler()
+        clock = mock.patch('equipment_api.services.profiling.time.perf_counter', side_effect=[0.0, 1.0, 3.0, 10.0])
+        with clock:
+            with profile.span('parse', rows=5):
+                with profile.span('decode', bytes=64):
+                    pass
+
+        self.assertEqual(profile.phases['parse']['seconds'], 8.0)
+        self.assertEqual(profile.phases['decode']['seconds'], 2.0)
+        self.assertEqual((profile.phases['parse']['rows'], profile.phases['decode']['bytes']), (5, 64))
+
+    def test_merge_and_save(self):
+        profile, worker = IngestionProfiler(), IngestionProfiler()
+        profile.add('parse', 0.5, rows=10)
+        worker.add('parse', 0.25, rows=5, memory=2 * 1024 * 1024)
+        worker.add('insert', 1.0, rows=15, calls=3)
+        profile.merge(worker)
+
+        self.assertEqual(profile.as_dict(), {
+            'parse': {'wall_ms': 750.0, 'calls': 2, 'rows': 15, 'bytes': 0, 'memory_delta_mb': 2.0},
+            'insert': {'wall_ms': 1000.0, 'calls': 3, 'rows': 15, 'bytes': 0, 'memory_delta_mb': 0.0},
+        })
+        profile.save()
+        self.assertEqual(
+            list(IngestionSpan.objects.values_list('phase', 'wall_ms', 'calls', 'rows')),
+            [('parse', 750.0, 2, 15), ('insert', 1000.0, 3, 15)]
+        )
+        self.assertEqual(IngestionProfiler().save(), [])
+
+    def test_upload_job_records_its_phases(self):
+        content = make_csv(20)
+        self.upload('readings.csv', content)
+        job = IngestionJob.objects.get()
+        spans = {span.phase: span for span in job.spans.all()}
+
+        self.assertTrue({'decode', 'parse', 'coerce', 'summary', 'insert', 'finalize'} <= set(spans))
+        self.assertEqual(spans['decode'].bytes, len(content))
+        for phase in ('parse', 'coerce', 'insert'):
+            self.assertEqual(spans[phase].rows, 20, phase)
+        self.assertTrue(all(span.dataset_id == job.dataset_id for span in spans.values()))
+
+    def test_histogram(self):
+        for wall_ms in (0.5, 3, 3, 40, 70000):
+            IngestionSpan.objects.create(phase='parse', wall_ms=wall_ms)
+        IngestionSpan.objects.create(phase='insert', wall_ms=200)
+
+        histogram = IngestionProfiler.histogram()
+        parse = histogram['parse']
+        self.assertEqual(
+            (parse['count'], parse['p50_ms'], parse['p95_ms'], parse['max_ms']), (5, 3, 40, 70000)
+        )
+        self.assertEqual(
+            {label: n for label, n in parse['buckets'].items() if n},
+            {'<=1ms': 1, '<=5ms': 2, '<=50ms': 1, '>60000ms': 1}
+        )
+        self.assertEqual(histogram['insert']['buckets']['<=500ms'], 1)
+
+        # the endpoint only shows the user's own spans to non-staff
+        self.assertEqual(self.client.get('/api/ingestion/profile/').json(), {})
+
+    @override_settings(STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage')
+    def test_admin_shows_the_histogram_of_the_filtered_spans(self):
+        IngestionSpan.objects.create(phase='parse', wall_ms=3)
+        IngestionSpan.objects.create(phase='insert', wall_ms=200)
+        staff = User.objects.create_user('admin', is_staff=True, is_superuser=True)
+        self.client.force_login(staff)
+        response = self.client.get('/admin/equipment_api/ingestionspan/', {'phase__exact': 'parse'})
+        self.assertEqual(list(response.context['histogram']), ['parse'])
+
+
+class ParserEngineTests(TestCase):
+    """Pinned dtypes, the inferred fallback and the optional pyarrow parser"""
+
+    CONTENT = (
+        f'{HEADER}\n'
+        '007,Pump,100,5,60\n'
+        'E2,Valve,120,6,61\n'
+        'E3,Pump,140,7,62\n'
+        'E4,Valve,160,abc,63\n'
+        'E5,Pump,180,9,64\n'
+    ).encode()
+
+    @staticmethod
+    def frames(processor, content, chunk_rows=None):
+        return list(processor._read_frames(SimpleUploadedFile('readings.csv', content), chunk_rows))
+
+    def test_pinned_dtypes_apply(self):
+        content = self.CONTENT.replace(b'abc', b'8')
+        df, = self.frames(CSVProcessor(engine='c'), content)
+
+        self.assertEqual(df['Equipment Name'].tolist()[0], '007')
+        self.assertIsInstance(df['Type'].dtype, pd.CategoricalDtype)
+        self.assertEqual([str(df[col].dtype) for col in CSVProcessor.NUMERIC_COLUMNS], ['float64'] * 3)
+
+    def test_file_breaking_the_pins_falls_back_to_inferred(self):
+        whole, = self.frames(CSVProcessor(engine='c'), self.CONTENT)
+        self.assertEqual(whole['Pressure'].tolist()[3], 'abc')
+        self.assertEqual(whole['Equipment Name'].tolist()[0], '007')
+
+        # streamed, the fallback resumes after the batches already returned
+        batches = self.frames(CSVProcessor(engine='c'), self.CONTENT, chunk_rows=2)
+        streamed = pd.concat(batches)
+        self.assertEqual(streamed['Equipment Name'].tolist(), ['007', 'E2', 'E3', 'E4', 'E5'])
+        self.assertEqual(streamed.index.tolist(), list(range(5)))
+
+        processor = CSVProcessor(bad_value_policy='drop', engine='c')
+        rows = pd.concat(processor.iter_batches(SimpleUploadedFile('readings.csv', self.CONTENT), chunk_rows=2))
+        self.assertEqual(rows['Equipment Name'].tolist(), ['007', 'E2', 'E3', 'E5'])
+        self.assertEqual(processor.report.bad_rows, 1)
+
+    def test_resolve_engine_without_pyarrow(self):
+        with mock.patch('equipment_api.services.csv_processor.pa_csv', None):
+            self.assertEqual(CSVProcessor.resolve_engine('auto'), 'c')
+            self.assertEqual(CSVProcessor.resolve_engine('pyarrow'), 'c')
+            self.assertEqual(CSVProcessor(engine='pyarrow').engine, 'c')
+        self.assertEqual(CSVProcessor.resolve_engine('inferred'), 'inferred')
+        with self.assertRaisesMessage(ValueError, 'engine must be one of: auto, pyarrow, c, inferred'):
+            CSVProcessor.resolve_engine('polars')
+
+    @skipIf(pa_csv is None, 'pyarrow is not installed')
+    def test_pyarrow_parses_like_the_c_engine(self):
+        self.assertEqual(CSVProcessor.resolve_engine('auto'), 'pyarrow')
+        content = self.CONTENT.replace(b'abc', b'8')
+        for chunk_rows in (None, 2):
+            arrow = pd.concat(self.frames(CSVProcessor(engine='pyarrow'), content, chunk_rows))
+            c = pd.concat(self.frames(CSVProcessor(engine='c'), content, chunk_rows))
+            pd.testing.assert_frame_equal(
+                CSVProcessor.to_record_frame(arrow), CSVProcessor.to_record_frame(c), check_categorical=False
+            )
+
+        # non-numeric text falls back the same way
+        fallback, = self.frames(CSVProcessor(engine='pyarrow'), self.CONTENT)
+        self.assertEqual(fallback['Pressure'].tolist()[3], 'abc')
+
+
+class HealthAnalysisTests(IngestionTestCase):
+    """Vectorized health analysis against the per-record loop it replaced"""
+
+    def test_matches_the_loop(self):
+        dataset = self.ingest(make_csv(300, seed=5))
+        self.assertEqual(AnalyticsService().analyze_health(dataset), _analyze_health_loop(dataset))
+
+    def test_ties_and_clamped_scores_match_the_loop(self):
+        content = (
+            f'{HEADER}\n'
+            'E1,Pump,100,5,60\n'
+            'E2,Pump,100,5,60\n'
+            'E3,Valve,5000,90,900\n'
+            'E4,Valve,100,5,60\n'
+            'E5,Compressor,0,0,0\n'
+        )
+        dataset = self.ingest(content.encode())
+        analysis = AnalyticsService().analyze_health(dataset)
+
+        self.assertEqual(analysis, _analyze_health_loop(dataset))
+        # equal scores keep record order, scores below zero are an int 0
+        self.assertEqual([row['name'] for row in analysis], ['E3', 'E5', 'E1', 'E2', 'E4'])
+        self.assertIs(analysis[0]['health_score'], 0)
+
+    def test_smallest_breaks_ties_like_a_stable_sort(self):
+        key = np.array([3.0, 1.0, 2.0, 1.0, 1.0, np.inf, 2.0])
+        for k in range(len(key) + 2):
+            self.assertEqual(
+                AnalyticsService.smallest(key, k).tolist(), np.argsort(key, kind='stable')[:k].tolist()
+            )
+
+
+class HealthQueryTests(IngestionTestCase):
+    """Top-K pages of the vectorized health analysis against the per-record loop"""
+
+    def setUp(self):
+        super().setUp()
+        self.dataset = self.ingest(make_csv(300, seed=5))
+        self.baseline = _analyze_health_loop(self.dataset)
+
+    def test_pages_match_the_baseline(self):
+        service = AnalyticsService()
+        for limit, offset in [(10, 0), (25, 10), (7, 290), (50, 299), (None, 0)]:
+            stop = None if limit is None else offset + limit
+            total, rows = service.query_health(self.dataset, limit=limit, offset=offset)
+            self.assertEqual(total, 300)
+            self.assertEqual(rows, self.baseline[offset:stop])
+
+    def test_power_index_and_status_filter(self):
+        by_power = sorted(self.baseline, key=lambda row: -row['power_index'])
+        total, rows = AnalyticsService().query_health(self.dataset, order_by='power_index', limit=15, offset=5)
+        self.assertEqual(rows, by_power[5:20])
+
+        risky = [row for row in self.baseline if row['status'] in ('Warning', 'Critical')]
+        total, rows = AnalyticsService().query_health(
+            self.dataset, status=['Warning', 'Critical'], limit=5, fields=['id', 'status']
+        )
+        self.assertEqual(total, len(risky))
+        self.assertEqual(rows, [{'id': row['id'], 'status': row['status']} for row in risky[:5]])
+
+    def test_endpoint_pages_and_total_header(self):
+        response = self.client.get(f'/api/datasets/{self.dataset.id}/health_analysis/?limit=10&offset=20')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['X-Total-Count'], '300')
+        self.assertEqual(response.data, self.baseline[20:30])
+
+        response = self.client.get(f'/api/datasets/{self.dataset.id}/health_analysis/?order_by=name')
+        self.assertEqual(response.status_code, 400)
+
+
+def check_record(record, thresholds):
+    """The per-record threshold check vectorized in AlertService, kept as the reference"""
+    for threshold in thresholds:
+        value = getattr(record, threshold.parameter)
+        name = threshold.parameter.title()
+        if threshold.critical_threshold and value > threshold.critical_threshold:
+            return threshold.parameter, threshold.critical_threshold, 'critical', f'{name} critically high: {value}'
+        if threshold.warning_threshold and value > threshold.warning_threshold:
+            return threshold.parameter, threshold.warning_threshold, 'warning', f'{name} warning: {value}'
+        if threshold.min_value and value < threshold.min_value:
+            return threshold.parameter, threshold.min_value, 'warning', f'{name} below minimum: {value}'
+        if threshold.max_value and value > threshold.max_value:
+            return threshold.parameter, threshold.max_value, 'warning', f'{name} above maximum: {value}'
+    return None
+
+
+class ThresholdEvaluationTests(IngestionTestCase):
+    """Vectorized threshold masks against the per-record check"""
+
+    RANGES = {'flowrate': (50, 250), 'pressure': (2, 25), 'temperature': (40, 140)}
+
+    def expected(self, dataset):
+        thresholds = AlertService.thresholds_for(self.user.id)
+        alerts, levels = [], {}
+        for record in dataset.records.order_by('id'):
+            alert = check_record(record, thresholds)
+            levels[record.id] = alert[2] if alert else 'normal'
+            if alert:
+                alerts.append((record.id, record.equipment_name, getattr(record, alert[0])) + alert)
+        return alerts, levels
+
+    def test_random_thresholds_match_the_loop(self):
+        dataset = self.ingest(make_csv(300, seed=7))
+        rng = random.Random(11)
+        for _ in range(10):
+            EquipmentThreshold.objects.filter(user=self.user).delete()
+            for parameter in rng.sample(AlertService.MEASUREMENTS, rng.randint(1, 3)):
+                # each limit unset, zero (also unset) or somewhere in make_csv's range
+                low, high = self.RANGES[parameter]
+                limits = [rng.choice([None, 0, rng.uniform(low, high)]) for _ in range(4)]
+                EquipmentThreshold.objects.create(
+                    user=self.user, parameter=parameter, critical_threshold=limits[0],
+                    warning_threshold=limits[1], min_value=limits[2], max_value=limits[3]
+                )
+
+            alerts, levels = self.expected(dataset)
+            self.assertEqual([
+                (alert['record_id'], alert['equipment_name'], alert['value'], alert['parameter'],
+                 alert['threshold'], alert['level'], alert['message'])
+                for alert in AlertService.check_alerts(dataset, self.user)
+            ], alerts)
+            # records that stopped matching are back to normal
+            self.assertEqual(dict(dataset.records.values_list('id', 'alert_level')), levels)
+            self.assertEqual(
+                set(dataset.records.filter(has_alert=True).values_list('id', flat=True)),
+                {record_id for record_id, level in levels.items() if level != 'normal'}
+            )
+
+    def test_missing_values_never_match(self):
+        EquipmentThreshold.objects.create(
+            user=self.user, parameter='temperature', critical_threshold=100, min_value=10
+        )
+        rules = AlertService.rules_for(self.user.id)
+        fired = AlertService.evaluate({'temperature': np.array([np.nan, 150.0, 5.0, 50.0])}, rules, 4)
+        self.assertEqual(AlertService.levels(rules, fired).tolist(), ['normal', 'critical', 'warning', 'normal'])
+
+
+class AlertReevaluationTests(IngestionTestCase):
+    """Incremental re-checks after a threshold change agree with a full re-check"""
+
+    def set_threshold(self, parameter, **limits):
+        response = self.client.post('/api/thresholds/set/', {'parameter': parameter, **limits}, format='json')
+        self.assertEqual(response.status_code, 200)
+        return response.data['records_reclassified']
+
+    def assert_matches_full_recheck(self):
+        levels = dict(EquipmentRecord.objects.values_list('id', 'alert_level'))
+        self.assertEqual(AlertService.recheck_user(self.user), 0)
+        self.assertEqual(dict(EquipmentRecord.objects.values_list('id', 'alert_level')), levels)
+
+    def test_threshold_changes(self):
+        self.ingest(make_csv(200, seed=3))
+        self.ingest(make_csv(150, seed=4), 'second.csv')
+
+        changed = self.set_threshold('temperature', warning_threshold=100, critical_threshold=120)
+        self.assertGreater(changed, 0)
+        self.assert_matches_full_recheck()
+
+        # tighter, looser, then a limit removed and a minimum added
+        self.set_threshold('temperature', warning_threshold=90, critical_threshold=110)
+        self.assert_matches_full_recheck()
+        self.set_threshold('temperature', warning_threshold=95, critical_threshold=130)
+        self.assert_matches_full_recheck()
+        self.set_threshold('temperature', critical_threshold=125, min_value=50)
+        self.assert_matches_full_recheck()
+
+        # a second parameter: precedence follows threshold order
+        self.set_threshold('pressure', critical_threshold=20)
+        self.assert_matches_full_recheck()
+        self.assertTrue(EquipmentRecord.objects.filter(alert_level='critical').exists())
+        self.assertTrue(EquipmentRecord.objects.filter(alert_level='warning').exists())
+    def test_levels_are_stored_at_ingest(self):
+        self.set_threshold('flowrate', warning_threshold=150, critical_threshold=220)
+        dataset = self.ingest(make_csv(100, seed=6))
+
+        thresholds = AlertService.thresholds_for(self.user.id)
+        expected = {
+            record.id: (check_record(record, thresholds) or (None, None, 'normal'))[2]
+            for record in dataset.records.all()
+        }
+        self.assertEqual(dict(dataset.records.values_list('id', 'alert_level')), expected)
+        self.assertEqual(set(expected.values()), {'normal', 'warning', 'critical'})
+        self.assert_matches_full_recheck()
+
+
+class AlertSummaryTests(IngestionTestCase):
+    """The single-aggregate alert summary against one count per level"""
+
+    def per_level(self, dataset):
+        records = EquipmentRecord.objects.filter(dataset=dataset)
+        total = records.count()
+        critical = records.filter(alert_level='critical').count()
+        warning = records.filter(alert_level='warning').count()
+        return {
+            'total_equipment': total,
+            'critical_alerts': critical,
+            'warning_alerts': warning,
+            'normal': records.filter(alert_level='normal').count(),
+            'alert_percentage': (critical + warning) / total * 100 if total else 0
+        }
+
+    def summary(self, dataset):
+        with self.assertNumQueries(1):
+            return AlertService.get_alert_summary(dataset)
+
+    def test_matches_per_level_counts(self):
+        dataset = self.ingest(make_csv(200, seed=8))
+        self.ingest(make_csv(50, seed=9), 'other.csv')
+        self.assertEqual(self.summary(dataset), self.per_level(dataset))
+        self.assertEqual(self.summary(dataset)['alert_percentage'], 0)
+
+        for limits in [{'warning_threshold': 100, 'critical_threshold': 130}, {'critical_threshold': 90}]:
+            response = self.client.post(
+                '/api/thresholds/set/', {'parameter': 'temperature', **limits}, format='json'
+            )
+            self.assertEqual(response.status_code, 200)
+            expected = self.per_level(dataset)
+            self.assertEqual(self.summary(dataset), expected)
+            self.assertGreater(expected['critical_alerts'], 0)
+            # the alerts endpoint reports the summary after the change, not a cached one
+            self.assertEqual(self.client.get(f'/api/datasets/{dataset.id}/alerts/').data['summary'], expected)
+
+    def test_empty_dataset(self):
+        dataset = EquipmentDataset.objects.create(user=self.user, filename='empty.csv', total_equipment=0)
+        self.assertEqual(self.summary(dataset), {
+            'total_equipment': 0, 'critical_alerts': 0, 'warning_alerts': 0, 'normal': 0, 'alert_percentage': 0
+        })
+
+
+class AnalyticsCacheTests(IngestionTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.dataset = self.ingest(make_csv(10))
+        self.calls = 0
+        AnalyticsCache.cache().clear()
+
+    def compute(self):
+        self.calls += 1
+        return {'rows': list(range(100))}
+
+    def counts(self):
+        stats = AnalyticsCache.stats()['health']
+        return stats['hits'], stats['misses'], stats['oversized']
+
+    def test_counters_survive_eviction(self):
+        hits, misses, oversized = self.counts()
+        first = AnalyticsCache.get_or_compute('health', self.dataset, self.compute)
+        self.assertEqual(AnalyticsCache.get_or_compute('health', self.dataset, self.compute), first)
+        self.assertEqual(self.calls, 1)
+
+        AnalyticsCache.cache().clear()
+        self.assertEqual(self.counts(), (hits + 1, misses + 1, oversized))
+        AnalyticsCache.get_or_compute('health', self.dataset, self.compute)
+        self.assertEqual(self.calls, 2)
+        self.assertEqual(self.counts(), (hits + 1, misses + 2, oversized))
+
+    @override_settings(ANALYTICS_CACHE_MAX_ITEM_BYTES=64)
+    def test_oversized_results_are_not_stored(self):
+        hits, misses, oversized = self.counts()
+        AnalyticsCache.get_or_compute('health', self.dataset, self.compute)
+        AnalyticsCache.get_or_compute('health', self.dataset, self.compute)
+
+        self.assertEqual(self.calls, 2)
+        self.assertEqual(self.counts(), (hits, misses + 2, oversized + 2))
+
+    def test_unknown_backend_is_improperly_configured(self):
+        # a fresh copy of the settings module, the live one stays untouched
+        spec = importlib.util.find_spec('backend.settings')
+        settings_module = importlib.util.module_from_spec(spec)
+        with mock.patch.dict(os.environ, {'ANALYTICS_CACHE_BACKEND': 'redis'}):
+            with self.assertRaisesMessage(ImproperlyConfigured, "must be one of: locmem, file, got 'redis'"):
+                spec.loader.exec_module(settings_module)
+
+
+def evaluate_row(text, row):
+    """Reference evaluation of a rule's condition for one row, in plain Python"""
+    condition = text.split('=>')[0]
+    operations = {
+        '>': float.__gt__, '>=': float.__ge__, '<': float.__lt__,
+        '<=': float.__le__, '==': float.__eq__, '!=': float.__ne__,
+    }
+
+    def value(operand):
+        try:
+            return float(operand)
+        except ValueError:
+            return float(row.get(operand.lower(), math.nan))
+
+    def compare(left, op, right):
+        a, b = value(left), value(right)
+        return not (math.isnan(a) or math.isnan(b)) and operations[op](a, b)
+
+    operand = r'([A-Za-z_]\w*|-?[\d.]+)'
+    python = re.sub(
+        operand + r'\s*(>=|<=|==|!=|>|<)\s*' + operand,
+        lambda match: f'compare({match.group(1)!r}, {match.group(2)!r}, {match.group(3)!r})',
+        condition
+    )
+    python = re.sub(r'\btrue\b', 'True', re.sub(r'\bfalse\b', 'False', python))
+    return eval(python, {'compare': compare})
+
+
+class RuleParserTests(TestCase):
+
+    def matches(self, text, **columns):
+        size = len(next(iter(columns.values())))
+        arrays = {name: np.array(values, dtype='float64') for name, values in columns.items()}
+        return parse_rule(text).matches(arrays, size).tolist()
+
+    def test_parse(self):
+        rule = parse_rule('Pressure > 18 and temperature >= 50 => Critical "pump {value} overheating"')
+        self.assertEqual(rule.level, 'critical')
+        self.assertEqual(rule.identifiers, ('pressure', 'temperature'))
+        self.assertEqual(rule.parameter, 'pressure')
+        self.assertIsNone(rule.threshold)
+        self.assertEqual(rule.describe(20), 'pump 20 overheating')
+
+        rule = parse_rule('temperature < -5.5e1 => info')
+        self.assertEqual((rule.parameter, rule.threshold), ('temperature', -55.0))
+        self.assertEqual(rule.message, 'temperature < -5.5e1')
+
+    def test_precedence(self):
+        # not > and > or
+        columns = dict(a=[0, 0, 1, 1, 0], b=[0, 1, 0, 1, 1], c=[1, 1, 0, 0, 0])
+        self.assertEqual(
+            self.matches('a > 0 or b > 0 and c > 0 => info', **columns),
+            [False, True, True, True, False]
+        )
+        self.assertEqual(
+            self.matches('(a > 0 or b > 0) and c > 0 => info', **columns),
+            [False, True, False, False, False]
+        )
+        self.assertEqual(
+            self.matches('not a > 0 and b > 0 => info', **columns),
+            [False, True, False, False, True]
+        )
+        self.assertEqual(self.matches('false or not false => info', **columns), [True] * 5)
+
+    def test_syntax_errors(self):
+        for text in [
+            '', 'pressure > 18', 'pressure > 18 =>', 'pressure > 18 => urgent',
+            'pressure 18 => info', '(pressure > 18 => info', 'pressure > 18 => info extra',
+            'pressure > 18 and => info', 'and > 1 => info', 'pressure > $ => info',
+        ]:
+            with self.subTest(text=text), self.assertRaises(RuleSyntaxError):
+                parse_rule(text)
+
+    def test_missing_values_never_match(self):
+        columns = dict(pressure=[20, math.nan, 10], temperature=[math.nan, 60, 60])
+        self.assertEqual(self.matches('pressure > 15 => info', **columns), [True, False, False])
+        self.assertEqual(self.matches('pressure != 10 => info', **columns), [True, False, False])
+        self.assertEqual(self.matches('pressure == pressure => info', **columns), [True, False, True])
+        self.assertEqual(self.matches('not pressure > 15 => info', **columns), [False, True, True])
+        self.assertEqual(
+            self.matches('pressure > 15 or temperature > 50 => info', **columns), [True, True, True]
+        )
+        # a column the dataset does not have reads as missing
+        self.assertEqual(self.matches('vibration < 1 => info', **columns), [False, False, False])
+
+    def test_compiled_matches_row_by_row(self):
+        rng = random.Random(11)
+        names = ['flowrate', 'pressure', 'temperature', 'vibration']
+
+        def condition(depth):
+            if depth == 0 or rng.random() < 0.3:
+                left = rng.choice(names)
+                right = rng.choice(names) if rng.random() < 0.2 else f'{rng.uniform(-5, 5):.1f}'
+                return f"{left} {rng.choice(['>', '>=', '<', '<=', '==', '!='])} {right}"
+            if rng.random() < 0.2:
+                return f'not {condition(depth - 1)}'
+            joined = f" {rng.choice(['and', 'or'])} ".join(condition(depth - 1) for _ in range(2))
+            return f'({joined})' if rng.random() < 0.5 else joined
+
+        size = 200
+        columns = {
+            name: np.array([
+                math.nan if rng.random() < 0.15 else float(rng.randint(-5, 5)) for _ in range(size)
+            ])
+            for name in names
+        }
+        rows = [{name: columns[name][i] for name in names} for i in range(size)]
+        for _ in range(150):
+            text = f'{condition(3)} => warning'
+            with self.subTest(rule=text):
+                compiled = parse_rule(text).matches(columns, size).tolist()
+                self.assertEqual(compiled, [evaluate_row(text, row) for row in rows])
+
+
+class AlertRuleEndpointTests(IngestionTestCase):
+
+    def post_rule(self, expression):
+        return self.client.post('/api/rules/', {'expression': expression}, format='json')
+
+    def test_invalid_expression_is_a_400(self):
+        for expression in ['', 'pressure >> 18 => critical', 'pressure > 18 => urgent']:
+            with self.subTest(expression=expression):
+                response = self.post_rule(expression)
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('error', response.data)
+        self.assertFalse(AlertRule.objects.exists())
+
+    def test_unknown_column_is_a_400(self):
+        response = self.post_rule('pressure > 18 and vibration > 3 => warning')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['error'], 'Unknown column: vibration')
+        self.assertFalse(AlertRule.objects.exists())
+
+    def test_parameter_column_of_an_upload_is_accepted(self):
+        content = (
+            f'{HEADER},Vibration\n'
+            'E1,Pump,100,5,60,2.5\n'
+            'E2,Pump,120,6,61,4.5\n'
+        ).encode()
+        self.ingest(content)
+
+        response = self.post_rule('pressure > 5 and Vibration > 3 => warning "shaking"')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['records_reclassified'], 1)
+        self.assertEqual(
+            dict(EquipmentRecord.objects.values_list('equipment_name', 'alert_level')),
+            {'E1': 'normal', 'E2': 'warning'}
+        )
+
+
+class RootCauseEndpointTests(IngestionTestCase):
+
+    def post(self, data):
+        return self.client.post('/api/datasets/root_causes/', data, format='json')
+
+    def test_bad_ids_are_a_400(self):
+        for data in [{'dataset_id': 'abc'}, {'dataset_id': [1]}, {'record_ids': ['x']}, {}]:
+            with self.subTest(data=data):
+                response = self.post(data)
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('error', response.data)
+
+    def test_dataset_root_causes(self):
+        dataset = self.ingest(make_csv(50, seed=12))
+        self.client.post('/api/thresholds/set/', {'parameter': 'temperature', 'warning_threshold': 100}, format='json')
+        alerting = dataset.records.exclude(alert_level='normal').count()
+        self.assertGreater(alerting, 0)
+
+        response = self.post({'dataset_id': str(dataset.id)})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['count'], alerting)
+        self.assertEqual(self.post({'dataset_id': dataset.id + 1}).status_code, 404)
+
+
+class PredictionUpsertTests(IngestionTestCase):
+
+    def test_repeat_prediction_is_a_pure_read(self):
+        dataset = self.ingest(make_csv(60, seed=6))
+        first = PredictionService.predict_trends(dataset)
+        self.assertEqual(len(first), 180)
+        self.assertEqual(PredictionResult.objects.count(), 180)
+
+        with CaptureQueriesContext(connection) as queries:
+            again = PredictionService.predict_trends(dataset)
+        self.assertEqual(again, first)
+        writes = [q['sql'] for q in queries.captured_queries if not q['sql'].lstrip().upper().startswith('SELECT')]
+        self.assertEqual(writes, [])
+        self.assertEqual(PredictionResult.objects.count(), 180)
+
+    def test_stale_rows_are_updated_in_place(self):
+        dataset = self.ingest(make_csv(60, seed=7))
+        first = PredictionService.predict_trends(dataset)
+        stored = PredictionResult.objects.order_by('id').first()
+        PredictionResult.objects.filter(id=stored.id).update(trend='decreasing', predicted_value=-1)
+
+        self.assertEqual(PredictionService.predict_trends(dataset), first)
+        self.assertEqual(PredictionResult.objects.count(), 180)
+        self.assertEqual(PredictionResult.objects.get(id=stored.id).trend, stored.trend)
+
+    def test_appended_records_get_one_row_each(self):
+        dataset = self.ingest(make_csv(30, seed=8))
+        PredictionService.predict_trends(dataset)
+        dataset = IngestionService.append_upload(dataset, SimpleUploadedFile('more.csv', make_csv(10, 30, seed=9)))
+
+        predictions = PredictionService.predict_trends(dataset)
+        self.assertEqual(len(predictions), 120)
+        self.assertEqual(PredictionResult.objects.count(), 120)
+
+
+class ForecastServiceTests(IngestionTestCase):
+    """Trend fits, prediction intervals and the forecasts endpoint"""
+
+    def history(self, uploads):
+        """One upload per day, the last one today; uploads: list of {name: temperature}"""
+        now = timezone.now()
+        for day, readings in enumerate(uploads):
+            lines = [HEADER] + [f'{name},Pump,100,5,{value}' for name, value in readings.items()]
+            dataset = self.ingest('\n'.join(lines).encode(), f'day{day}.csv')
+            EquipmentDataset.objects.filter(id=dataset.id).update(
+                uploaded_at=now - timedelta(days=len(uploads) - 1 - day)
+            )
+
+    def test_fit_and_interval_of_a_known_series(self):
+        days = np.array([0.0, 1.0, 2.0, 3.0, 4.0])
+        values = np.array([[1.0, 3.0, 2.0, 5.0, 4.0], [10.0, 8.0, 6.0, 4.0, 2.0]])
+        fit = ForecastService.fit(days, values)
+
+        slope, intercept = np.polyfit(days, values[0], 1)
+        self.assertAlmostEqual(fit['slope'][0], slope)
+        self.assertAlmostEqual(fit['level'][0], intercept + slope * 2)
+        self.assertAlmostEqual(fit['slope'][1], -2)
+        self.assertAlmostEqual(fit['rss'][1], 0)
+
+        forecast, half_width, slope_width = ForecastService.interval(fit, 6.0)
+        rss = np.sum((values[0] - (intercept + slope * days)) ** 2)
+        variance = rss / 3
+        # t quantile for 3 degrees of freedom; sxx = 10 around the centre 2
+        self.assertAlmostEqual(forecast[0], intercept + slope * 6)
+        self.assertAlmostEqual(half_width[0], 3.182 * math.sqrt(variance * (1 + 1 / 5 + 16 / 10)))
+        self.assertAlmostEqual(slope_width[0], 3.182 * math.sqrt(variance / 10))
+        self.assertAlmostEqual(forecast[1], -2)
+        self.assertAlmostEqual(half_width[1], 0)
+
+    def test_forecasts_with_missing_uploads(self):
+        self.history([
+            {'P1': 60, 'P2': 50},
+            {'P1': 62, 'P2': 49},
+            {'P1': 64, 'P3': 30},
+            {'P1': 66, 'P2': 47, 'P3': 31, 'P4': 70},
+        ])
+        forecasts = {
+            row['equipment_name']: row
+            for row in ForecastService.forecast(self.user, parameters=['temperature'], horizon_days=7)
+        }
+
+        # P1 rises 2 a day without noise: the interval collapses onto the line
+        p1 = forecasts['P1']
+        self.assertEqual((p1['observations'], p1['trend']), (4, 'increasing'))
+        self.assertAlmostEqual(p1['slope_per_day'], 2, places=3)
+        for key in ('forecast', 'lower', 'upper'):
+            self.assertAlmostEqual(p1[key], 80, places=3)
+
+        # P2 skipped the third upload; the fit uses the days it was seen
+        p2 = forecasts['P2']
+        self.assertEqual((p2['observations'], p2['trend'], p2['last_value']), (3, 'decreasing', 47))
+        self.assertAlmostEqual(p2['forecast'], 40, places=3)
+        self.assertEqual((p2['first_seen'], p2['last_seen']), (p1['first_seen'], p1['last_seen']))
+
+        # two readings give a line but no interval or trend, one gives neither
+        p3 = forecasts['P3']
+        self.assertEqual((p3['observations'], p3['trend'], p3['lower'], p3['upper']), (2, None, None, None))
+        self.assertAlmostEqual(p3['forecast'], 38, places=3)
+        p4 = forecasts['P4']
+        self.assertEqual((p4['observations'], p4['slope_per_day'], p4['forecast'], p4['trend']), (1, None, None, None))
+
+        pressure, = ForecastService.forecast(self.user, parameters=['pressure'], equipment='P1')
+        self.assertEqual((pressure['equipment_name'], pressure['parameter']), ('P1', 'pressure'))
+        self.assertAlmostEqual(pressure['slope_per_day'], 0)
+
+    def test_invalid_arguments(self):
+        with self.assertRaisesMessage(ValueError, 'Unknown parameter: humidity'):
+            ForecastService.forecast(self.user, parameters=['humidity'])
+        for horizon_days in (-1, math.inf, math.nan, ForecastService.MAX_HORIZON_DAYS + 1):
+            with self.assertRaisesMessage(ValueError, 'horizon_days must be between 0 and 3650'):
+                ForecastService.forecast(self.user, horizon_days=horizon_days)
+        self.assertEqual(ForecastService.forecast(self.user), [])
+
+    def test_endpoint_rejects_bad_horizons(self):
+        self.history([{'P1': 60}, {'P1': 62}, {'P1': 64}])
+        for value in ('inf', '-inf', 'nan', '1e9', '-1', 'abc', '3651'):
+            response = self.client.get('/api/forecasts/', {'horizon_days': value})
+            self.assertEqual(response.status_code, 400, value)
+            self.assertIn(response.data['error'], [
+                'horizon_days must be a number', 'horizon_days must be between 0 and 3650'
+            ])
+
+        response = self.client.get('/api/forecasts/', {'horizon_days': '3650', 'parameter': 'temperature'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['forecasts']), 1)
@@ -0,0 +1,36 @@
+import hashlib
+
+from django.core.files.uploadhandler import FileUploadHandler
+
+
+class ContentHashUploadHandler(FileUploadHandler):
+    """
+    Computes a sha256 digest of every uploaded file as it streams in.
+    Must run before Django's storage handlers; it passes each chunk on
+    untouched and leaves file creation to them.
+    Digests land on request.content_digests as {field_name: [hex, ...]},
+    in the same order as request.FILES.getlist(field_name).
+    They cover the bytes as sent, which is the content hash only for
+    plain CSVs; compressed uploads are hashed again once decoded
+    (CompressionService.content_digest).
+    """
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.digest = hashlib.sha256()
+
+    def receive_data_chunk(self, raw_data, start):
+        self.digest.update(raw_data)
+        return raw_data
+
+    def file_complete(self, file_size):
+        digests = getattr(self.request, 'content_digests', None)
+        if digests is None:
+            digests = self.request.content_digests = {}
+        digests.setdefault(self.field_name, []).append(self.digest.hexdigest())
+        return None
+
+
+def get_content_digests(request, field_name):
+    """Digests recorded by ContentHashUploadHandler for one form field"""
+    return getattr(request, 'content_digests', {}).get(field_name, [])
@@ -13,10 +13,20 @@ urlpatterns = [
     
     # Basic upload
     path('upload/', views.upload_csv, name='upload'),
+    path('jobs/<int:job_id>/', views.job_status, name='job-status'),
+    path('datasets/<int:dataset_id>/append/', views.append_csv, name='append-csv'),
+    
+    # Resumable chunked upload
+    path('uploads/', views.chunked_upload_init, name='chunked-upload-init'),
+    path('uploads/<int:upload_id>/', views.chunked_upload_status, name='chunked-upload-status'),
+    path('uploads/<int:upload_id>/chunks/<int:index>/', views.chunked_upload_chunk, name='chunked-upload-chunk'),
+    path('uploads/<int:upload_id>/complete/', views.chunked_upload_complete, name='chunked-upload-complete'),
     
     # Advanced features - Alerts
     path('thresholds/', advanced_views.get_thresholds, name='get-thresholds'),
     path('thresholds/set/', advanced_views.set_thresholds, name='set-thresholds'),
+    path('rules/', advanced_views.alert_rules, name='alert-rules'),
+    path('rules/<int:rule_id>/', advanced_views.delete_alert_rule, name='delete-alert-rule'),
     path('datasets/<int:dataset_id>/alerts/', advanced_views.get_alerts, name='get-alerts'),
     
     # Comparison
@@ -28,6 +38,7 @@ urlpatterns = [
     
     # Predictions
     path('datasets/<int:dataset_id>/predictions/', advanced_views.get_predictions, name='get-predictions'),
+    path('forecasts/', advanced_views.get_forecasts, name='get-forecasts'),
     
     # Collaboration
     path('datasets/<int:dataset_id>/share/', advanced_views.share_dataset, name='share-dataset'),
@@ -40,6 +51,15 @@ urlpatterns = [
     # Batch upload
     path('batch-upload/', advanced_views.batch_upload, name='batch-upload'),
     
+    # Retention
+    path('retention/', advanced_views.retention_status, name='retention-status'),
+    
+    # Ingestion profiling
+    path('ingestion/profile/', advanced_views.ingestion_profile, name='ingestion-profile'),
+    
+    # Analytics cache monitoring
+    path('analytics/cache/', advanced_views.analytics_cache_stats, name='analytics-cache-stats'),
+    
     # Router URLs
     path('', include(router.urls)),
 ]
@@ -5,14 +5,24 @@ from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.authtoken.models import Token
 from django.contrib.auth import authenticate
 from django.http import HttpResponse
-from .models import EquipmentDataset, EquipmentRecord
+from django.shortcuts import get_object_or_404
+from .models import EquipmentDataset, EquipmentRecord, IngestionJob, ChunkedUpload
 from .serializers import (
     EquipmentDatasetSerializer, 
+    IngestionJobSerializer,
+    ChunkedUploadSerializer,
     UserRegistrationSerializer, 
     UserLoginSerializer
 )
-from .services.csv_processor import CSVProcessor
 from .services.analytics_service import AnalyticsService
+from .services.analytics_cache import AnalyticsCache
+from .services.job_queue import IngestionJobQueue
+from .services.chunked_upload import ChunkedUploadService
+from .services.compression import CompressionService
+from .services.columnar_store import load_columns, load_parameters
+from .services.csv_processor import CSVProcessor
+from .services.rules import user_rules
+from .upload_handlers import get_content_digests
 from .services.pdf_service import PDFService
 from .services.excel_service import ExcelExportService
 
@@ -74,57 +84,35 @@ def upload_csv(request):
     
     csv_file = request.FILES['file']
     
-    # validate file extension
-    if not csv_file.name.endswith('.csv'):
+    # validate file extension (the codec itself is detected from the content)
+    if not CompressionService.is_supported(csv_file.name):
         return Response(
-            {'error': 'File must be a CSV'}, 
+            {'error': 'File must be a CSV (optionally .gz, .zst or .zip)'}, 
             status=status.HTTP_400_BAD_REQUEST
         )
     
+    # optional override of CSV_BAD_VALUE_POLICY for non-numeric cells
+    bad_value_policy = request.data.get('bad_value_policy', '')
+    if bad_value_policy:
+        try:
+            CSVProcessor.check_policy(bad_value_policy)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    
     try:
-        # process CSV
-        processor = CSVProcessor()
-        df = processor.validate_and_parse(csv_file)
-        
-        # calculate summary stats
-        analytics = AnalyticsService()
-        summary = analytics.calculate_summary(df)
-        
-        # create dataset record
-        dataset = EquipmentDataset.objects.create(
-            user=request.user,
-            filename=csv_file.name,
-            total_equipment=summary['total_equipment'],
-            avg_flowrate=summary['avg_flowrate'],
-            avg_pressure=summary['avg_pressure'],
-            avg_temperature=summary['avg_temperature'],
-            type_distribution=summary['type_distribution']
-        )
-        
-        # create individual equipment records
-        for _, row in df.iterrows():
-            EquipmentRecord.objects.create(
-                dataset=dataset,
-                equipment_name=row['Equipment Name'],
-                equipment_type=row['Type'],
-                flowrate=row['Flowrate'],
-                pressure=row['Pressure'],
-                temperature=row['Temperature']
-            )
+        # parsing and persistence happen on the ingestion worker pool
+        # digest computed by ContentHashUploadHandler while the file streamed in
+        digests = get_content_digests(request, 'file')
+        content_hash = digests[0] if digests else ''
         
-        # keep only last 20 datasets per user
-        user_datasets = EquipmentDataset.objects.filter(user=request.user).order_by('-uploaded_at')
-        if user_datasets.count() > 20:
-            # delete oldest datasets
-            datasets_to_delete = user_datasets[20:]
-            for old_dataset in datasets_to_delete:
-                old_dataset.delete()
+        job = IngestionJobQueue.enqueue(request.user, csv_file, content_hash, bad_value_policy)
         
-        serializer = EquipmentDatasetSerializer(dataset)
-        return Response(serializer.data, status=status.HTTP_201_CREATED)
+        # duplicates of an existing dataset complete immediately
+        serializer = IngestionJobSerializer(job)
+        if job.status == 'completed':
+            return Response(serializer.data, status=status.HTTP_200_OK)
+        return Response(serializer.data, status=status.HTTP_202_ACCEPTED)
         
-    except ValueError as e:
-        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
     except Exception as e:
         return Response(
             {'error': f'Error processing file: {str(e)}'}, 
@@ -132,6 +120,104 @@ def upload_csv(request):
         )
 
 
+@api_view(['POST'])
+def append_csv(request, dataset_id):
+    """Append an uploaded CSV's rows to an existing dataset"""
+    dataset = get_object_or_404(EquipmentDataset, id=dataset_id, user=request.user, is_ready=True)
+    
+    if 'file' not in request.FILES:
+        return Response(
+            {'error': 'No file provided'}, 
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    
+    csv_file = request.FILES['file']
+    if not CompressionService.is_supported(csv_file.name):
+        return Response(
+            {'error': 'File must be a CSV (optionally .gz, .zst or .zip)'}, 
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    
+    bad_value_policy = request.data.get('bad_value_policy', '')
+    if bad_value_policy:
+        try:
+            CSVProcessor.check_policy(bad_value_policy)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    
+    # summary stats are updated from running totals, existing rows are not rescanned
+    job = IngestionJobQueue.enqueue_append(dataset, csv_file, bad_value_policy)
+    serializer = IngestionJobSerializer(job)
+    return Response(serializer.data, status=status.HTTP_202_ACCEPTED)
+
+
+@api_view(['GET'])
+def job_status(request, job_id):
+    """Get progress of a background ingestion job"""
+    job = get_object_or_404(IngestionJob, id=job_id, user=request.user)
+    serializer = IngestionJobSerializer(job)
+    return Response(serializer.data)
+
+
+@api_view(['POST'])
+def chunked_upload_init(request):
+    """Start a resumable chunked upload"""
+    try:
+        upload = ChunkedUploadService.create(
+            request.user,
+            request.data.get('filename'),
+            request.data.get('total_size') or 0,
+            request.data.get('chunk_size')
+        )
+    except (TypeError, ValueError) as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    
+    serializer = ChunkedUploadSerializer(upload)
+    return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+
+@api_view(['GET'])
+def chunked_upload_status(request, upload_id):
+    """Get acknowledged chunks so a client can resume"""
+    upload = get_object_or_404(ChunkedUpload, id=upload_id, user=request.user)
+    serializer = ChunkedUploadSerializer(upload)
+    return Response(serializer.data)
+
+
+@api_view(['PUT'])
+def chunked_upload_chunk(request, upload_id, index):
+    """Store one numbered chunk, body is the raw bytes"""
+    upload = get_object_or_404(ChunkedUpload, id=upload_id, user=request.user)
+    checksum = request.headers.get('X-Chunk-Checksum', '')
+    
+    try:
+        # read the body as a stream so chunks never sit in memory whole
+        ChunkedUploadService.store_chunk(upload, index, request.stream, checksum)
+    except ValueError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    
+    return Response({'index': index, 'received': True})
+
+
+@api_view(['POST'])
+def chunked_upload_complete(request, upload_id):
+    """Finalize a chunked upload and queue it for ingestion"""
+    upload = get_object_or_404(ChunkedUpload, id=upload_id, user=request.user)
+    bad_value_policy = request.data.get('bad_value_policy', '')
+    
+    try:
+        if bad_value_policy:
+            CSVProcessor.check_policy(bad_value_policy)
+        ChunkedUploadService.finalize(upload)
+    except ValueError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    
+    # hashed and de-duplicated by the worker, not in this request
+    job = IngestionJobQueue.enqueue_chunked(upload, bad_value_policy)
+    serializer = IngestionJobSerializer(job)
+    return Response(serializer.data, status=status.HTTP_202_ACCEPTED)
+
+
 class EquipmentDatasetViewSet(viewsets.ReadOnlyModelViewSet):
     """ViewSet for listing and retrieving datasets"""
     serializer_class = EquipmentDatasetSerializer
@@ -139,7 +225,7 @@ class EquipmentDatasetViewSet(viewsets.ReadOnlyModelViewSet):
     
     def get_queryset(self):
         # return only user's datasets
-        return EquipmentDataset.objects.filter(user=self.request.user)
+        return EquipmentDataset.objects.filter(user=self.request.user, is_ready=True)
     
     @action(detail=True, methods=['get'])
     def pdf(self, request, pk=None):
@@ -165,9 +251,27 @@ class EquipmentDatasetViewSet(viewsets.ReadOnlyModelViewSet):
         """Get formatted data for charts"""
         dataset = self.get_object()
         analytics = AnalyticsService()
-        chart_data = analytics.prepare_chart_data(dataset)
+        chart_data = AnalyticsCache.get_or_compute(
+            'chart_data', dataset, lambda: analytics.prepare_chart_data(dataset)
+        )
         return Response(chart_data)
     
+    @action(detail=True, methods=['get'])
+    def parameters(self, request, pk=None):
+        """Dynamic parameter columns as arrays, decoded in one pass"""
+        dataset = self.get_object()
+        columns = load_parameters(dataset)
+        return Response({
+            'parameter_columns': dataset.parameter_columns,
+            'parameter_averages': dataset.parameter_averages,
+            # record ids, aligned with every values array
+            'ids': load_columns(dataset, ['id'])['id'].tolist(),
+            'values': {
+                name: [None if value != value else value for value in values.tolist()]
+                for name, values in columns.items()
+            }
+        })
+    
     @action(detail=True, methods=['get'])
     def export_excel(self, request, pk=None):
         """Export dataset to Excel format"""
@@ -191,18 +295,38 @@ class EquipmentDatasetViewSet(viewsets.ReadOnlyModelViewSet):
             )
     @action(detail=True, methods=['get'])
     def health_analysis(self, request, pk=None):
-        """Get health and efficiency analysis"""
-        dataset = self.get_object()
-        analytics = AnalyticsService()
-        analysis = analytics.analyze_health(dataset)
-        return Response(analysis)
-    @action(detail=True, methods=['get'])
-    def health_analysis(self, request, pk=None):
-        """Get health and efficiency analysis"""
+        """
+        Get health and efficiency analysis
+        Query params: limit, offset, order_by (health_score | power_index),
+        status and fields (comma separated); the total is in X-Total-Count
+        """
         dataset = self.get_object()
-        analytics = AnalyticsService()
-        analysis = analytics.analyze_health(dataset)
-        return Response(analysis)
+        params = request.query_params
+        split = lambda name: [value for value in params.get(name, '').split(',') if value] or None
+        
+        try:
+            limit = int(params['limit']) if params.get('limit') else None
+            offset = int(params.get('offset') or 0)
+            if (limit is not None and limit < 0) or offset < 0:
+                raise ValueError('limit and offset must not be negative')
+            analytics = AnalyticsService()
+            # per-record arrays are cached, pages are cut from them per request
+            health = AnalyticsCache.get_or_compute('health', dataset, lambda: analytics.health_arrays(dataset))
+            total, analysis = analytics.query_health(
+                dataset,
+                order_by=params.get('order_by') or 'health_score',
+                limit=limit,
+                offset=offset,
+                status=split('status'),
+                fields=split('fields'),
+                health=health
+            )
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        
+        response = Response(analysis)
+        response['X-Total-Count'] = total
+        return response
 
     @action(detail=False, methods=['post'])
     def root_cause(self, request):
@@ -225,9 +349,46 @@ class EquipmentDatasetViewSet(viewsets.ReadOnlyModelViewSet):
         record = MockRecord(data)
         
         analytics = AnalyticsService()
-        causes = analytics.analyze_root_cause(record)
+        causes = analytics.analyze_root_cause(record, user_rules(request.user.id))
         
         return Response({'causes': causes})
+    
+    @action(detail=False, methods=['post'])
+    def root_causes(self, request):
+        """
+        Root causes for many records in one call
+        Body: {'dataset_id': n} for every alerting record of a dataset, or
+        {'record_ids': [...]} for specific records of the user's datasets
+        """
+        analytics = AnalyticsService()
+        rules = user_rules(request.user.id)
+        dataset_id = request.data.get('dataset_id')
+        record_ids = request.data.get('record_ids')
+        
+        if dataset_id is not None:
+            try:
+                dataset_id = int(dataset_id)
+            except (TypeError, ValueError):
+                return Response({'error': 'dataset_id must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+            dataset = get_object_or_404(EquipmentDataset, id=dataset_id, user=request.user, is_ready=True)
+            results = AnalyticsCache.get_or_compute(
+                'root_causes', dataset,
+                lambda: analytics.diagnose(dataset.records.exclude(alert_level='normal'), rules),
+                user=request.user
+            )
+        elif isinstance(record_ids, list):
+            try:
+                record_ids = [int(record_id) for record_id in record_ids]
+            except (TypeError, ValueError):
+                return Response({'error': 'record_ids must be integers'}, status=status.HTTP_400_BAD_REQUEST)
+            records = EquipmentRecord.objects.filter(
+                id__in=record_ids, dataset__user=request.user, dataset__is_ready=True
+            )
+            results = analytics.diagnose(records, rules)
+        else:
+            return Response({'error': 'dataset_id or record_ids required'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        return Response({'count': len(results), 'results': results})
 
     @action(detail=True, methods=['post'])
     def chat(self, request, pk=None):
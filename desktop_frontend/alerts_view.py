@@ -12,6 +12,7 @@ class AlertsView(QWidget):
         self.main_window = main_window
         self.api_client = api_client
         self.dataset_id = None
+        self.causes = {}  # record id -> root causes, fetched in one batch
         self.thresholds = {'flowrate': {}, 'pressure': {}, 'temperature': {}}
         self.init_ui()
         
@@ -225,6 +226,13 @@ class AlertsView(QWidget):
             self.populate_list(data['alerts'])
         except Exception as e:
             print(f"Error loading alerts: {e}")
+            
+        try:
+            diagnoses = self.api_client.get_root_causes(dataset_id)
+            self.causes = {item['id']: item['causes'] for item in diagnoses['results']}
+        except Exception as e:
+            self.causes = {}
+            print(f"Error loading root causes: {e}")
 
     def populate_summary(self, summary):
         self.stat_cards['Critical'].setText(str(summary['critical_alerts']))
@@ -316,8 +324,10 @@ class AlertsView(QWidget):
         }
         
         try:
-            response = self.api_client.get_root_cause(params)
-            causes = response['causes']
+            # already fetched with the alerts, single call only as a fallback
+            causes = self.causes.get(alert.get('record_id'))
+            if causes is None:
+                causes = self.api_client.get_root_cause(params)['causes']
             
             text = "\n- ".join(causes)
             QMessageBox.information(self, "AI Root Cause Analysis", 
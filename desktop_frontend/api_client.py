@@ -1,12 +1,22 @@
+import hashlib
+import os
+import time
+
 import requests
 
 
 class APIClient:
     """HTTP client for backend API communication"""
     
+    # files above this size use the resumable chunked upload
+    CHUNKED_UPLOAD_THRESHOLD = 32 * 1024 * 1024
+    CHUNK_SIZE = 8 * 1024 * 1024
+    
     def __init__(self, base_url='http://localhost:8000/api'):
         self.base_url = base_url
         self.token = None
+        # (path, size, mtime) -> upload id, so a failed upload can resume
+        self.pending_uploads = {}
     
     def set_token(self, token):
         """Set auth token"""
@@ -37,6 +47,9 @@ class APIClient:
     
     def upload_csv(self, file_path):
         """Upload CSV file"""
+        if os.path.getsize(file_path) > self.CHUNKED_UPLOAD_THRESHOLD:
+            return self.upload_csv_resumable(file_path)
+        
         url = f'{self.base_url}/upload/'
         headers = {}
         if self.token:
@@ -47,8 +60,122 @@ class APIClient:
             response = requests.post(url, files=files, headers=headers)
         
         response.raise_for_status()
+        
+        # ingestion runs in the background, wait for the dataset
+        job = self.wait_for_job(response.json()['id'])
+        return self.get_dataset(job['dataset'])
+    
+    def append_csv(self, dataset_id, file_path):
+        """Append a CSV's rows (e.g. the next shift) to an existing dataset"""
+        url = f'{self.base_url}/datasets/{dataset_id}/append/'
+        headers = {}
+        if self.token:
+            headers['Authorization'] = f'Token {self.token}'
+        
+        with open(file_path, 'rb') as f:
+            files = {'file': f}
+            response = requests.post(url, files=files, headers=headers)
+        
+        response.raise_for_status()
+        
+        job = self.wait_for_job(response.json()['id'])
+        return self.get_dataset(job['dataset'])
+    
+    def upload_csv_resumable(self, file_path, chunk_size=None, retries=3):
+        """
+        Upload a large CSV in checksummed chunks.
+        Calling again after a failure continues from the last chunk the
+        server acknowledged instead of starting over.
+        """
+        size = os.path.getsize(file_path)
+        key = (os.path.abspath(file_path), size, os.path.getmtime(file_path))
+        
+        upload = None
+        if key in self.pending_uploads:
+            try:
+                upload = self.get_chunked_upload(self.pending_uploads[key])
+            except requests.HTTPError:
+                upload = None
+            if upload and upload['status'] != 'uploading':
+                upload = None
+        
+        if upload is None:
+            upload = self._init_chunked_upload(
+                os.path.basename(file_path), size, chunk_size or self.CHUNK_SIZE
+            )
+            self.pending_uploads[key] = upload['id']
+        
+        received = set(upload['received_chunks'])
+        with open(file_path, 'rb') as f:
+            for index in range(upload['total_chunks']):
+                if index in received:
+                    continue
+                f.seek(index * upload['chunk_size'])
+                data = f.read(upload['chunk_size'])
+                self._put_chunk(upload['id'], index, data, retries)
+        
+        job = self._complete_chunked_upload(upload['id'])
+        self.pending_uploads.pop(key, None)
+        
+        job = self.wait_for_job(job['id'])
+        return self.get_dataset(job['dataset'])
+    
+    def get_chunked_upload(self, upload_id):
+        """Get chunked upload status, including acknowledged chunks"""
+        url = f'{self.base_url}/uploads/{upload_id}/'
+        response = requests.get(url, headers=self._get_headers())
+        response.raise_for_status()
+        return response.json()
+    
+    def _init_chunked_upload(self, filename, total_size, chunk_size):
+        url = f'{self.base_url}/uploads/'
+        data = {'filename': filename, 'total_size': total_size, 'chunk_size': chunk_size}
+        response = requests.post(url, json=data, headers=self._get_headers())
+        response.raise_for_status()
+        return response.json()
+    
+    def _put_chunk(self, upload_id, index, data, retries):
+        url = f'{self.base_url}/uploads/{upload_id}/chunks/{index}/'
+        headers = self._get_headers()
+        headers['Content-Type'] = 'application/octet-stream'
+        headers['X-Chunk-Checksum'] = hashlib.sha256(data).hexdigest()
+        
+        for attempt in range(retries + 1):
+            try:
+                response = requests.put(url, data=data, headers=headers)
+                response.raise_for_status()
+                return response.json()
+            except requests.ConnectionError:
+                if attempt == retries:
+                    raise
+                time.sleep(2 ** attempt)
+    
+    def _complete_chunked_upload(self, upload_id):
+        url = f'{self.base_url}/uploads/{upload_id}/complete/'
+        response = requests.post(url, headers=self._get_headers())
+        response.raise_for_status()
+        return response.json()
+    
+    def get_job(self, job_id):
+        """Get background ingestion job status"""
+        url = f'{self.base_url}/jobs/{job_id}/'
+        response = requests.get(url, headers=self._get_headers())
+        response.raise_for_status()
         return response.json()
     
+    def wait_for_job(self, job_id, interval=1.0, timeout=3600):
+        """Poll an ingestion job until it completes or fails"""
+        deadline = time.time() + timeout
+        while True:
+            job = self.get_job(job_id)
+            if job['status'] == 'completed':
+                return job
+            if job['status'] == 'failed':
+                raise Exception(job['error'] or 'Ingestion failed')
+            if time.time() > deadline:
+                raise Exception('Timed out waiting for upload to be processed')
+            time.sleep(interval)
+    
     def get_datasets(self):
         """Get list of datasets"""
         url = f'{self.base_url}/datasets/'
@@ -101,10 +228,17 @@ class APIClient:
         response.raise_for_status()
         return response.json()
 
-    def get_health_analysis(self, dataset_id):
-        """Get health analysis for a dataset"""
+    def get_health_analysis(self, dataset_id, **params):
+        """
+        Get health analysis for a dataset
+        params: limit, offset, order_by, status, fields (lists are comma joined)
+        """
         url = f'{self.base_url}/datasets/{dataset_id}/health_analysis/'
-        response = requests.get(url, headers=self._get_headers())
+        params = {
+            key: ','.join(value) if isinstance(value, (list, tuple)) else value
+            for key, value in params.items()
+        }
+        response = requests.get(url, params=params, headers=self._get_headers())
         response.raise_for_status()
         return response.json()
 
@@ -150,6 +284,23 @@ class APIClient:
             for f in open_files:
                 f.close()
 
+    def get_forecasts(self, **params):
+        """
+        Per-equipment forecasts across all uploads
+        params: parameter, horizon_days, equipment, plant, unit, section
+        """
+        url = f'{self.base_url}/forecasts/'
+        response = requests.get(url, params=params, headers=self._get_headers())
+        response.raise_for_status()
+        return response.json()
+
+    def get_root_causes(self, dataset_id):
+        """Root causes for every alerting record of a dataset, in one call"""
+        url = f'{self.base_url}/datasets/root_causes/'
+        response = requests.post(url, json={'dataset_id': dataset_id}, headers=self._get_headers())
+        response.raise_for_status()
+        return response.json()
+
     def get_root_cause(self, params):
         """Get AI Root Cause Analysis"""
         url = f'{self.base_url}/datasets/root_cause/'
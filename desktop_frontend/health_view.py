@@ -117,9 +117,15 @@ class HealthView(QWidget):
             return
             
         try:
-            data = self.api_client.get_health_analysis(self.dataset_id)
-            self.populate_heatmap(data)
-            self.populate_efficiency(data)
+            # heatmap needs status and score only, efficiency only the top 10
+            heatmap = self.api_client.get_health_analysis(
+                self.dataset_id, fields=['id', 'name', 'health_score', 'status']
+            )
+            top_power = self.api_client.get_health_analysis(
+                self.dataset_id, order_by='power_index', limit=10, fields=['id', 'name', 'power_index']
+            )
+            self.populate_heatmap(heatmap)
+            self.populate_efficiency(top_power)
         except Exception as e:
             print(f"Error loading health data: {e}")
 
@@ -176,8 +182,8 @@ class HealthView(QWidget):
                 row += 1
 
     def populate_efficiency(self, data):
-        # Sort by power index desc
-        sorted_data = sorted(data, key=lambda x: x['power_index'], reverse=True)[:10]
+        # already sorted by power index desc and limited by the server
+        sorted_data = data
         
         self.eff_table.setRowCount(len(sorted_data))
         for i, item in enumerate(sorted_data):
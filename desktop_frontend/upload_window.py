@@ -527,7 +527,7 @@ class UploadWindow(QMainWindow):
             self, 
             'Select CSV File', 
             '', 
-            'CSV Files (*.csv)'
+            'CSV Files (*.csv *.csv.gz *.gz *.csv.zst *.zst *.zip)'
         )
         
         if not file_path:
@@ -549,7 +549,7 @@ class UploadWindow(QMainWindow):
             self, 
             'Select Multiple CSV Files', 
             '', 
-            'CSV Files (*.csv)'
+            'CSV Files (*.csv *.csv.gz *.gz *.csv.zst *.zst *.zip)'
         )
         
         if not file_paths:
@@ -5,6 +5,7 @@ import './AlertsComponent.css';
 function AlertsComponent({ datasetId }) {
   const [alerts, setAlerts] = useState([]);
   const [summary, setSummary] = useState(null);
+  const [causes, setCauses] = useState({});
   const [thresholds, setThresholds] = useState({
     flowrate: { warning: '', critical: '' },
     pressure: { warning: '', critical: '' },
@@ -27,6 +28,17 @@ function AlertsComponent({ datasetId }) {
     } catch (error) {
       console.error('Error fetching alerts:', error);
     }
+    try {
+      // every alerting record's diagnosis in one call
+      const response = await api.post('/datasets/root_causes/', { dataset_id: datasetId });
+      const byRecord = {};
+      response.data.results.forEach(item => {
+        byRecord[item.id] = item.causes;
+      });
+      setCauses(byRecord);
+    } catch (error) {
+      console.error('Error fetching root causes:', error);
+    }
   };
 
   const fetchThresholds = async () => {
@@ -157,9 +169,12 @@ function AlertsComponent({ datasetId }) {
     };
 
     try {
-      const response = await api.post('/datasets/root_cause/', payload);
-      const causes = response.data.causes.join('\n- ');
-      window.alert(`AI Root Cause Analysis:\n\nPotential Causes:\n- ${causes}`);
+      let found = causes[alertItem.record_id];
+      if (!found) {
+        const response = await api.post('/datasets/root_cause/', payload);
+        found = response.data.causes;
+      }
+      window.alert(`AI Root Cause Analysis:\n\nPotential Causes:\n- ${found.join('\n- ')}`);
     } catch (error) {
       console.error(error);
       window.alert("Failed to analyze root cause.");
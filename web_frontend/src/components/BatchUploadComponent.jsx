@@ -14,7 +14,7 @@ function BatchUploadComponent({ onUploadComplete }) {
 
   const handleDrop = (e) => {
     e.preventDefault();
-    const droppedFiles = Array.from(e.dataTransfer.files).filter(f => f.name.endsWith('.csv'));
+    const droppedFiles = Array.from(e.dataTransfer.files).filter(f => /\.(csv|gz|zst|zip)$/i.test(f.name));
     setFiles(droppedFiles);
   };
 
@@ -62,7 +62,7 @@ function BatchUploadComponent({ onUploadComplete }) {
         <input
           type="file"
           multiple
-          accept=".csv"
+          accept=".csv,.gz,.zst,.zip"
           onChange={handleFileSelect}
           id="batch-file-input"
         />
@@ -4,6 +4,7 @@ import './HealthDashboard.css';
 
 function HealthDashboard({ datasetId }) {
   const [healthData, setHealthData] = useState([]);
+  const [powerSorted, setPowerSorted] = useState([]);
   const [loading, setLoading] = useState(true);
 
   useEffect(() => {
@@ -15,8 +16,17 @@ function HealthDashboard({ datasetId }) {
   const fetchHealthAnalysis = async () => {
     setLoading(true);
     try {
-      const response = await api.get(`/datasets/${datasetId}/health_analysis/`);
-      setHealthData(response.data);
+      const [heatmap, topPower] = await Promise.all([
+        api.get(`/datasets/${datasetId}/health_analysis/`, {
+          params: { fields: 'id,name,health_score,status,flowrate,pressure,temperature' },
+        }),
+        // top energy consumers, selected server side
+        api.get(`/datasets/${datasetId}/health_analysis/`, {
+          params: { order_by: 'power_index', limit: 10, fields: 'id,name,type,power_index' },
+        }),
+      ]);
+      setHealthData(heatmap.data);
+      setPowerSorted(topPower.data);
     } catch (error) {
       console.error('Error fetching health analysis:', error);
     }
@@ -31,9 +41,6 @@ function HealthDashboard({ datasetId }) {
   const warningItems = healthData.filter(i => i.status === 'Warning');
   const goodItems = healthData.filter(i => i.status === 'Good');
 
-  // Sort by power index descending for "Efficiency" list
-  const powerSorted = [...healthData].sort((a, b) => b.power_index - a.power_index).slice(0, 10);
-
   return (
     <div className="health-dashboard">
       <div className="health-header">
@@ -67,7 +67,7 @@ function UploadComponent({ onUploadSuccess }) {
       >
         <input
           type="file"
-          accept=".csv"
+          accept=".csv,.gz,.zst,.zip"
           onChange={handleFileChange}
           id="file-input"
           style={{ display: 'none' }}
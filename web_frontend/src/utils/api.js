@@ -34,15 +34,116 @@ export const login = (username, password) => {
 };
 
 // dataset functions
-export const uploadCSV = (file) => {
+export const getJob = (id) => {
+  return api.get(`/jobs/${id}/`);
+};
+
+// poll a background ingestion job until it finishes
+export const waitForJob = async (id, interval = 1000) => {
+  for (;;) {
+    const { data: job } = await getJob(id);
+    if (job.status === 'completed') {
+      return job;
+    }
+    if (job.status === 'failed') {
+      const error = new Error(job.error || 'Ingestion failed');
+      error.response = { data: { error: job.error || 'Ingestion failed' } };
+      throw error;
+    }
+    await new Promise((resolve) => setTimeout(resolve, interval));
+  }
+};
+
+// files above this size use the resumable chunked upload
+const CHUNKED_UPLOAD_THRESHOLD = 32 * 1024 * 1024;
+const CHUNK_SIZE = 8 * 1024 * 1024;
+
+// file key -> upload id, so a retried upload resumes where it stopped
+const pendingUploads = new Map();
+
+const sha256Hex = async (buffer) => {
+  const digest = await crypto.subtle.digest('SHA-256', buffer);
+  return Array.from(new Uint8Array(digest))
+    .map((b) => b.toString(16).padStart(2, '0'))
+    .join('');
+};
+
+export const uploadCSVChunked = async (file) => {
+  const key = `${file.name}:${file.size}:${file.lastModified}`;
+  let upload = null;
+
+  if (pendingUploads.has(key)) {
+    try {
+      const { data } = await api.get(`/uploads/${pendingUploads.get(key)}/`);
+      upload = data.status === 'uploading' ? data : null;
+    } catch (err) {
+      upload = null;
+    }
+  }
+
+  if (!upload) {
+    const { data } = await api.post('/uploads/', {
+      filename: file.name,
+      total_size: file.size,
+      chunk_size: CHUNK_SIZE,
+    });
+    upload = data;
+    pendingUploads.set(key, upload.id);
+  }
+
+  const received = new Set(upload.received_chunks);
+  for (let index = 0; index < upload.total_chunks; index++) {
+    if (received.has(index)) {
+      continue;
+    }
+    const start = index * upload.chunk_size;
+    const buffer = await file.slice(start, start + upload.chunk_size).arrayBuffer();
+    await api.put(`/uploads/${upload.id}/chunks/${index}/`, buffer, {
+      headers: {
+        'Content-Type': 'application/octet-stream',
+        'X-Chunk-Checksum': await sha256Hex(buffer),
+      },
+    });
+  }
+
+  const response = await api.post(`/uploads/${upload.id}/complete/`);
+  pendingUploads.delete(key);
+
+  const job = await waitForJob(response.data.id);
+  return getDataset(job.dataset);
+};
+
+export const uploadCSV = async (file) => {
+  if (file.size > CHUNKED_UPLOAD_THRESHOLD) {
+    return uploadCSVChunked(file);
+  }
+
+  const formData = new FormData();
+  formData.append('file', file);
+
+  const response = await api.post('/upload/', formData, {
+    headers: {
+      'Content-Type': 'multipart/form-data',
+    },
+  });
+
+  // upload returns 202 with a job, resolve once the dataset is ready
+  const job = await waitForJob(response.data.id);
+  return getDataset(job.dataset);
+};
+
+export const appendCSV = async (datasetId, file) => {
   const formData = new FormData();
   formData.append('file', file);
 
-  return api.post('/upload/', formData, {
+  const response = await api.post(`/datasets/${datasetId}/append/`, formData, {
     headers: {
       'Content-Type': 'multipart/form-data',
     },
   });
+
+  const job = await waitForJob(response.data.id);
+  return getDataset(job.dataset);
 };
 
 export const getDatasets = () => {